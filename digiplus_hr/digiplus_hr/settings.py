@@ -114,6 +114,23 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache partagé : Redis si CACHE_REDIS_URL est fourni, sinon mémoire locale du processus
+CACHE_REDIS_URL = config('CACHE_REDIS_URL', default=None)
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 CORS_ALLOW_CREDENTIALS = True
 
 CORS_ALLOWED_ORIGINS = [
@@ -149,6 +166,7 @@ CORS_ALLOW_HEADERS = [
     "user-agent",
     "x-csrftoken",
     "x-requested-with",
+    "idempotency-key",
 ]
 
 # En production, mettez False et spécifiez les origines
@@ -167,6 +185,59 @@ PORTAL_URL = config('PORTAL_URL', default='[minsante-rh.vercel.app]')
 # Durée de validité de l'OTP (en minutes)
 OTP_EXPIRY_MINUTES = 5
 
+# Nombre maximal de demandes de congé par décision groupée
+CONGES_DECISION_LOT_MAX = config('CONGES_DECISION_LOT_MAX', default=1000, cast=int)
+# Refuser une demande de congé annuel qui dépasse le solde du registre des congés
+CONGES_CONTROLE_SOLDE = config('CONGES_CONTROLE_SOLDE', default=False, cast=bool)
+
+# Badgeage : nombre maximal de scans par lot rejoué depuis une borne
+BADGEAGE_LOT_TAILLE_MAX = config('BADGEAGE_LOT_TAILLE_MAX', default=500, cast=int)
+
+# Durée de vie (secondes) de la résolution code QR -> employé en cache
+CODEQR_CACHE_TIMEOUT = config('CODEQR_CACHE_TIMEOUT', default=300, cast=int)
+
+# Jetons QR compacts signés (HMAC) ; SECRET_KEY par défaut
+CODEQR_SIGNING_KEY = config('CODEQR_SIGNING_KEY', default=None)
+# Accepter encore les codes longs générés avant les jetons compacts
+CODEQR_CODES_HISTORIQUES_ACCEPTES = config('CODEQR_CODES_HISTORIQUES_ACCEPTES', default=True, cast=bool)
+# Nombre de processus pour la pré-génération des images QR (défaut : nb de CPU)
+QR_PREGENERATION_WORKERS = config('QR_PREGENERATION_WORKERS', default=0, cast=int) or None
+# Taille des lots de codes lus par requête lors des exports de badges
+CODEQR_EXPORT_TAILLE_LOT = config('CODEQR_EXPORT_TAILLE_LOT', default=100, cast=int)
+# Fenêtre (secondes) pendant laquelle un scan identique est refusé ; 0 pour désactiver
+BADGEAGE_ANTIREBOND_SECONDES = config('BADGEAGE_ANTIREBOND_SECONDES', default=3, cast=int)
+# Durée de conservation (secondes) des réponses rejouables par Idempotency-Key
+BADGEAGE_IDEMPOTENCE_TTL = config('BADGEAGE_IDEMPOTENCE_TTL', default=86400, cast=int)
+# Jours ouvrés (0 = lundi) et heure de fermeture des journées sans départ
+PRESENCE_JOURS_OUVRES = tuple(int(j) for j in config('PRESENCE_JOURS_OUVRES', default='0,1,2,3,4').split(','))
+PRESENCE_HEURE_CLOTURE = config('PRESENCE_HEURE_CLOTURE', default='18:00')
+# Horaire par défaut des employés sans HoraireTravail (vide : pas de détection de retard)
+PRESENCE_HEURE_DEBUT = config('PRESENCE_HEURE_DEBUT', default='')
+# Minutes de tolérance après l'heure de début avant de compter un retard
+PRESENCE_TOLERANCE_MINUTES = config('PRESENCE_TOLERANCE_MINUTES', default=0, cast=int)
+# Lignes lues par aller-retour base lors des exports CSV/XLSX
+EXPORT_TAILLE_LOT = config('EXPORT_TAILLE_LOT', default=2000, cast=int)
+# Inclure le COUNT(*) dans les listes paginées par curseur (surchargé par ?total=)
+PAGINATION_CURSEUR_TOTAL = config('PAGINATION_CURSEUR_TOTAL', default=False, cast=bool)
+# Durée de vie maximale (secondes) des statistiques du tableau de bord admin en cache
+DASHBOARD_CACHE_TTL = config('DASHBOARD_CACHE_TTL', default=300, cast=int)
+# Fenêtre (millisecondes) de regroupement des compteurs temps réel envoyés aux admins ; 0 : envoi immédiat
+DASHBOARD_COMPTEURS_FENETRE_MS = config('DASHBOARD_COMPTEURS_FENETRE_MS', default=1000, cast=int)
+# Durée de vie (secondes) des tendances de présence calculées, par jeu de paramètres
+ANALYTIQUE_CACHE_TTL = config('ANALYTIQUE_CACHE_TTL', default=600, cast=int)
+# Vider la file des notifications temps réel dans un thread après chaque validation ; False si la commande diffuser_notifications tourne
+NOTIFICATIONS_DIFFUSION_EN_PROCESSUS = config('NOTIFICATIONS_DIFFUSION_EN_PROCESSUS', default=True, cast=bool)
+# Durée (secondes) de réservation d'un lot de notifications par un diffuseur avant qu'il redevienne disponible
+NOTIFICATIONS_RESERVATION_SECONDES = config('NOTIFICATIONS_RESERVATION_SECONDES', default=30, cast=int)
+# Durée de vie (secondes) du compteur de notifications non lues en cache ; recompté en base à expiration
+NOTIFICATIONS_NON_LUES_TTL = config('NOTIFICATIONS_NON_LUES_TTL', default=3600, cast=int)
+# Nombre maximal de notifications marquées lues par requête (par ids)
+NOTIFICATIONS_LECTURE_LOT_MAX = config('NOTIFICATIONS_LECTURE_LOT_MAX', default=1000, cast=int)
+# Âge (jours) au-delà duquel la commande purger_notifications supprime les notifications lues
+NOTIFICATIONS_RETENTION_JOURS = config('NOTIFICATIONS_RETENTION_JOURS', default=180, cast=int)
+# Nombre de rendus SVG gardés en mémoire par processus
+CODEQR_SVG_LRU_TAILLE = config('CODEQR_SVG_LRU_TAILLE', default=512, cast=int)
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
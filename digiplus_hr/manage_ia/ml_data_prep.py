@@ -4,6 +4,7 @@ from dataclasses import dataclass
 from datetime import date
 from typing import TYPE_CHECKING, Iterable
 
+from manage_users.calendrier import calendrier_de, est_jour_ouvre, masque_ouvres
 from manage_users.models import DemandeConge, Employe, Presence
 
 if TYPE_CHECKING:
@@ -55,6 +56,9 @@ def build_training_dataframe(config: FeatureConfig | None = None):
             continue
 
         leave_ranges = _approved_leave_ranges(employe)
+        working_days = masque_ouvres(
+            [item["date"] for item in presences], calendrier_de(employe.id)
+        )
         birth_date = employe.date_naissance
         hire_date = employe.date_embauche
         department_name = (
@@ -81,6 +85,7 @@ def build_training_dataframe(config: FeatureConfig | None = None):
                     "department": department_name,
                     "target_date": current_date,
                     "day_of_week": current_date.weekday(),
+                    "is_working_day": int(working_days[idx]),
                     "month": current_date.month,
                     "age_days": _safe_days_between(birth_date, current_date),
                     "tenure_days": _safe_days_between(hire_date, current_date),
@@ -124,6 +129,7 @@ def build_inference_row(employe: Employe, target_date: date, config: FeatureConf
             else "inconnu"
         ),
         "day_of_week": target_date.weekday(),
+        "is_working_day": int(est_jour_ouvre(target_date, calendrier_de(employe.id))),
         "month": target_date.month,
         "age_days": _safe_days_between(employe.date_naissance, target_date),
         "tenure_days": _safe_days_between(employe.date_embauche, target_date),
@@ -27,6 +27,7 @@ def train_absence_model() -> dict:
     feature_columns = [
         "department",
         "day_of_week",
+        "is_working_day",
         "month",
         "age_days",
         "tenure_days",
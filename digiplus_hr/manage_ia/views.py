@@ -1,4 +1,7 @@
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from drf_spectacular.utils import extend_schema
 from rest_framework import status
 from rest_framework.parsers import FormParser, MultiPartParser
@@ -6,6 +9,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from manage_users.analytique import tendances_presence
 from manage_users.models import Employe
 
 from .ml_inference import absence_inference_service
@@ -77,11 +81,25 @@ class AdminTrendsView(APIView):
         if not getattr(request.user, "is_staff", False) and not getattr(request.user, "role", "") in ["admin", "manager"]:
             return Response({"detail": "Non autorise."}, status=status.HTTP_403_FORBIDDEN)
 
+        fin = timezone.localdate()
+        debut = fin - timedelta(days=30)
+        (indicateurs,) = tendances_presence(debut, fin)
         users_data = {
             "total_employees": User.objects.count(),
             "active_employees": User.objects.filter(is_active=True).count(),
-            "recent_absenteeism_rate": "12%",
-            "average_delay_minutes": 15,
+            "period": f"{debut} - {fin}",
+            "recent_absenteeism_rate": indicateurs["taux_absenteisme"],
+            "recent_tardiness_rate": indicateurs["taux_retard"],
+            "average_worked_minutes": indicateurs["minutes_travail_moyennes"],
+            "average_pause_minutes": indicateurs["minutes_pauses_moyennes"],
+            "by_department": [
+                {
+                    "department": ligne["groupe_nom"] or "inconnu",
+                    "absenteeism_rate": ligne["taux_absenteisme"],
+                    "tardiness_rate": ligne["taux_retard"],
+                }
+                for ligne in tendances_presence(debut, fin, groupe="departement")
+            ],
         }
         result = analyze_performance_trends(users_data)
         return Response(result, status=status.HTTP_200_OK)
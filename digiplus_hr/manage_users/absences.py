@@ -0,0 +1,88 @@
+"""
+Chevauchements de congés et calendrier des absences d'une équipe.
+
+Une demande en attente ou approuvée occupe sa période [date_debut, date_fin].
+`demandes_chevauchant` filtre celles qui recoupent une plage : sur PostgreSQL
+par l'opérateur de plages && (index GiST partiel mu_conge_periode_gist_idx,
+migration 0024), ailleurs par l'index B-tree (employe, date_debut, date_fin).
+Le refus des chevauchements (DemandeCongeSerializer) se fait sous verrou de
+l'employé ; sur PostgreSQL, la contrainte d'exclusion CONTRAINTE_CHEVAUCHEMENT
+le garantit pour toute écriture.
+
+`calendrier_equipe` lit en une requête les demandes du département qui
+recoupent la plage, triées par début, puis balaye les jours une seule fois :
+chaque demande entre dans l'ensemble des absents à son premier jour et en
+sort au lendemain du dernier. Coût : O(demandes + jours + taille du résultat),
+sans requête par jour.
+"""
+import datetime
+from collections import defaultdict
+
+from django.db import connections
+from django.db.models import F, Func, Value
+
+from .calendrier import est_jour_ouvre
+from .models import DemandeConge
+
+STATUTS_ACTIFS = ('en_attente', 'approuve')
+# Contrainte d'exclusion PostgreSQL (migration 0026) : deux demandes actives d'un employé ne se recouvrent pas
+CONTRAINTE_CHEVAUCHEMENT = 'mu_conge_sans_chevauchement'
+
+
+def demandes_chevauchant(debut, fin, statuts=STATUTS_ACTIFS, demandes=None):
+    """Demandes de `demandes` (toutes par défaut) au statut dans `statuts` qui recoupent [debut, fin]."""
+    demandes = (DemandeConge.objects.all() if demandes is None else demandes).filter(statut__in=statuts)
+    if connections[demandes.db].vendor == 'postgresql':
+        from django.contrib.postgres.fields import DateRangeField
+        from django.db.backends.postgresql.psycopg_any import DateRange
+
+        periode = Func(F('date_debut'), F('date_fin'), Value('[]'), function='daterange', output_field=DateRangeField())
+        return demandes.annotate(periode=periode).filter(periode__overlap=DateRange(debut, fin, '[]'))
+    return demandes.filter(date_debut__lte=fin, date_fin__gte=debut)
+
+
+def chevauchements(employe_id, debut, fin, exclure_id=None):
+    """Demandes actives de l'employé qui recoupent [debut, fin], hors `exclure_id`."""
+    demandes = demandes_chevauchant(debut, fin, demandes=DemandeConge.objects.filter(employe_id=employe_id))
+    if exclure_id is not None:
+        demandes = demandes.exclude(pk=exclure_id)
+    return demandes.order_by('date_debut', 'id')
+
+
+def calendrier_equipe(departement_id, debut, fin, statuts=STATUTS_ACTIFS, calendrier_id=None):
+    """[{'date', 'ouvre', 'absents'}] pour chaque jour de [debut, fin]."""
+    demandes = demandes_chevauchant(
+        debut, fin, statuts, DemandeConge.objects.filter(employe__poste__departement_id=departement_id),
+    ).order_by('date_debut', 'employe__matricule', 'id').values(
+        'id', 'employe_id', 'employe__matricule', 'employe__user__first_name', 'employe__user__last_name',
+        'type_conge', 'statut', 'date_debut', 'date_fin',
+    )
+
+    un_jour = datetime.timedelta(days=1)
+    entrees = defaultdict(list)
+    sorties = defaultdict(list)
+    for demande in demandes:
+        absent = {
+            'demande_id': demande['id'],
+            'employe_id': demande['employe_id'],
+            'matricule': demande['employe__matricule'],
+            'nom': f"{demande['employe__user__first_name']} {demande['employe__user__last_name']}".strip(),
+            'type_conge': demande['type_conge'],
+            'statut': demande['statut'],
+            'date_debut': demande['date_debut'],
+            'date_fin': demande['date_fin'],
+        }
+        entrees[max(demande['date_debut'], debut)].append(absent)
+        sorties[demande['date_fin'] + un_jour].append(demande['id'])
+
+    en_cours = {}
+    jours = []
+    jour = debut
+    while jour <= fin:
+        for demande_id in sorties.get(jour, ()):
+            del en_cours[demande_id]
+        for absent in entrees.get(jour, ()):
+            en_cours[absent['demande_id']] = absent
+        jours.append({'date': jour, 'ouvre': est_jour_ouvre(jour, calendrier_id), 'absents': list(en_cours.values())})
+        jour += un_jour
+    return jours
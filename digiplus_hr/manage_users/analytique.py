@@ -0,0 +1,99 @@
+"""
+Tendances de présence par période (jour, semaine, mois), éventuellement
+ventilées par département ou par poste.
+
+Un seul GROUP BY sur Presence : troncature de la date et agrégats
+conditionnels calculés par la base ; seuls les taux sont dérivés ensuite. Le
+résultat est mis en cache par jeu de paramètres pour ANALYTIQUE_CACHE_TTL
+secondes.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, Q
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+from .models import Presence
+from .rapports import STATUTS_JOUR_TRAVAIL
+
+CACHE_PREFIXE = 'analytique:presences:'
+
+PAS = {
+    'jour': TruncDay,
+    'semaine': TruncWeek,
+    'mois': TruncMonth,
+}
+
+GROUPES = {
+    'departement': ('employe__poste__departement_id', 'employe__poste__departement__nom'),
+    'poste': ('employe__poste_id', 'employe__poste__titre'),
+}
+
+STATUTS_ARRIVEE = ('present', 'retard')
+
+
+def _taux(numerateur, denominateur):
+    return round(numerateur / denominateur, 4) if denominateur else None
+
+
+def _minutes(valeur):
+    return round(valeur, 1) if valeur is not None else None
+
+
+def calculer_tendances(debut, fin, pas=None, groupe=None, departement_id=None):
+    """Indicateurs par période (toute la plage si `pas` est None) et par groupe."""
+    presences = Presence.objects.filter(date__range=(debut, fin))
+    if departement_id:
+        presences = presences.filter(employe__poste__departement_id=departement_id)
+
+    dimensions = {}
+    if pas:
+        dimensions['periode'] = PAS[pas]('date')
+    if groupe:
+        champ_id, champ_nom = GROUPES[groupe]
+        dimensions['groupe_id'] = F(champ_id)
+        dimensions['groupe_nom'] = F(champ_nom)
+
+    arrivee = Q(statut__in=STATUTS_ARRIVEE)
+    agregats = {
+        'jours_travail': Count('id', filter=Q(statut__in=STATUTS_JOUR_TRAVAIL)),
+        'jours_present': Count('id', filter=Q(statut='present')),
+        'jours_retard': Count('id', filter=Q(statut='retard')),
+        'jours_absent': Count('id', filter=Q(statut='absent')),
+        'minutes_travail_moyennes': Avg('duree_travail_minutes', filter=arrivee),
+        'minutes_pauses_moyennes': Avg('duree_pauses_minutes', filter=arrivee),
+    }
+    if dimensions:
+        lignes = (
+            presences.order_by()
+            .values(**dimensions)
+            .annotate(**agregats)
+            .order_by(*dimensions)
+        )
+    else:
+        lignes = [presences.aggregate(**agregats)]
+
+    resultats = []
+    for ligne in lignes:
+        ligne = dict(ligne)
+        if 'periode' in ligne and hasattr(ligne['periode'], 'date'):
+            ligne['periode'] = ligne['periode'].date()
+        ligne['taux_absenteisme'] = _taux(ligne['jours_absent'], ligne['jours_travail'])
+        ligne['taux_retard'] = _taux(ligne['jours_retard'], ligne['jours_present'] + ligne['jours_retard'])
+        ligne['minutes_travail_moyennes'] = _minutes(ligne['minutes_travail_moyennes'])
+        ligne['minutes_pauses_moyennes'] = _minutes(ligne['minutes_pauses_moyennes'])
+        resultats.append(ligne)
+    return resultats
+
+
+def tendances_presence(debut, fin, pas=None, groupe=None, departement_id=None):
+    """calculer_tendances servi depuis le cache, clé dérivée des paramètres."""
+    parametres = json.dumps([str(debut), str(fin), pas, groupe, departement_id])
+    cle = CACHE_PREFIXE + hashlib.sha1(parametres.encode('utf-8')).hexdigest()
+    resultats = cache.get(cle)
+    if resultats is None:
+        resultats = calculer_tendances(debut, fin, pas, groupe, departement_id)
+        cache.set(cle, resultats, getattr(settings, 'ANALYTIQUE_CACHE_TTL', 600))
+    return resultats
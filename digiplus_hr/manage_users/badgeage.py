@@ -0,0 +1,317 @@
+"""
+Machine à états du badgeage journalier.
+
+L'état d'une journée (arrivée, départ, pause en cours, cumul des pauses) est
+porté par la ligne Presence de l'employé : le scanner la verrouille, valide la
+transition puis l'écrit, sans relire les Badgeage du jour.
+"""
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Badgeage, CodeQR, Employe, Presence
+from .compteurs import etat_live, signaler_presences
+from .horaires import horaire_de, statut_arrivee
+from .qr_utils import jeton_recevable
+from .rapports import appliquer_deltas
+
+# Décalage d'horloge toléré entre une borne et le serveur
+DERIVE_HORLOGE_MAX = datetime.timedelta(minutes=5)
+
+PRESENCE_CHAMPS_ETAT = [
+    'statut', 'heure_arrivee', 'heure_depart', 'duree_travail_minutes',
+    'nb_pauses', 'duree_pauses_minutes', 'pause_en_cours_depuis', 'updated_at',
+]
+
+
+IDEMPOTENCE_PREFIX = 'badgeage:idempotence:'
+ANTIREBOND_PREFIX = 'badgeage:antirebond:'
+IDEMPOTENCE_EN_COURS = 'en_cours'
+
+
+class BadgeageRefuse(Exception):
+    """Transition refusée : le message est renvoyé tel quel par l'API."""
+
+
+# ------------------------------
+# Idempotence et anti-rebond
+# ------------------------------
+
+def _cle_idempotence(utilisateur_id, cle):
+    empreinte = hashlib.sha256(cle.encode('utf-8')).hexdigest()
+    return f"{IDEMPOTENCE_PREFIX}{utilisateur_id}:{empreinte}"
+
+
+def empreinte_requete(data):
+    """Empreinte du corps d'une requête, mémorisée avec sa clé d'idempotence."""
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    contenu = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(contenu.encode('utf-8')).hexdigest()
+
+
+def reserver_idempotence(utilisateur_id, cle, empreinte):
+    """Réserver une clé d'idempotence pour une requête d'empreinte `empreinte`.
+
+    Retourne None si la clé est neuve (la requête doit être exécutée), sinon
+    le couple mémorisé (empreinte, valeur), valeur étant IDEMPOTENCE_EN_COURS
+    ou (status, data) à rejouer.
+    """
+    cle_cache = _cle_idempotence(utilisateur_id, cle)
+    if cache.add(cle_cache, (empreinte, IDEMPOTENCE_EN_COURS), getattr(settings, 'BADGEAGE_IDEMPOTENCE_TTL', 86400)):
+        return None
+    return cache.get(cle_cache, (empreinte, IDEMPOTENCE_EN_COURS))
+
+
+def enregistrer_idempotence(utilisateur_id, cle, empreinte, status_code, data):
+    cache.set(
+        _cle_idempotence(utilisateur_id, cle),
+        (empreinte, (status_code, data)),
+        getattr(settings, 'BADGEAGE_IDEMPOTENCE_TTL', 86400),
+    )
+
+
+def liberer_idempotence(utilisateur_id, cle):
+    cache.delete(_cle_idempotence(utilisateur_id, cle))
+
+
+def _cle_antirebond(badge_type, user_id):
+    return f"{ANTIREBOND_PREFIX}user:{user_id}:{badge_type}"
+
+
+def reserver_antirebond(badge_type, user_id):
+    """Retourner False si un scan identique est déjà passé dans la fenêtre anti-rebond.
+
+    La fenêtre (BADGEAGE_ANTIREBOND_SECONDES, 0 pour désactiver) est posée
+    atomiquement pour l'utilisateur pointé, une fois le scan autorisé et le
+    code résolu : deux scans concurrents ne peuvent pas tous deux la
+    franchir, et un tiers ne peut pas consommer celle d'un autre employé.
+    """
+    fenetre = getattr(settings, 'BADGEAGE_ANTIREBOND_SECONDES', 0)
+    if not fenetre:
+        return True
+    return cache.add(_cle_antirebond(badge_type, user_id), 1, fenetre)
+
+
+def liberer_antirebond(badge_type, user_id):
+    cache.delete(_cle_antirebond(badge_type, user_id))
+
+
+def valider_badgeage(presence, badge_type):
+    """Lever BadgeageRefuse si `badge_type` n'est pas permis dans l'état courant."""
+    has_arrivee = presence.heure_arrivee is not None
+    has_depart = presence.heure_depart is not None
+    pause_in_progress = presence.pause_en_cours_depuis is not None
+
+    if badge_type == 'arrivee':
+        if has_depart:
+            raise BadgeageRefuse("Déjà pointé 'depart' aujourd'hui.")
+        if has_arrivee:
+            raise BadgeageRefuse("Déjà pointé 'arrivee' aujourd'hui.")
+
+    if badge_type == 'pause_debut':
+        if not has_arrivee:
+            raise BadgeageRefuse("Impossible de commencer une pause avant l'arrivée.")
+        if has_depart:
+            raise BadgeageRefuse("Impossible de commencer une pause après le départ.")
+        if pause_in_progress:
+            raise BadgeageRefuse("Une pause est déjà en cours.")
+
+    if badge_type == 'pause_fin':
+        if not has_arrivee:
+            raise BadgeageRefuse("Impossible de terminer une pause avant l'arrivée.")
+        if has_depart:
+            raise BadgeageRefuse("Impossible de terminer une pause après le départ.")
+        if not pause_in_progress:
+            raise BadgeageRefuse("Aucune pause en cours à terminer.")
+
+    if badge_type == 'depart':
+        if not has_arrivee:
+            raise BadgeageRefuse("Impossible de pointer le départ avant l'arrivée.")
+        if has_depart:
+            raise BadgeageRefuse("Déjà pointé 'depart' aujourd'hui.")
+        if pause_in_progress:
+            raise BadgeageRefuse("Impossible de pointer le départ pendant une pause (terminez la pause).")
+
+
+def appliquer_badgeage(presence, badge_type, moment, horaire=None):
+    """Valider puis appliquer un badgeage à `presence` (en mémoire, sans save).
+
+    `horaire` (horaires.horaire_de) classe l'arrivée en present ou retard.
+    Les heures sont stockées en heure locale, comme la date de la journée.
+    """
+    valider_badgeage(presence, badge_type)
+    heure = timezone.localtime(moment).time()
+
+    if badge_type == 'arrivee':
+        presence.heure_arrivee = heure
+        presence.statut = statut_arrivee(horaire, moment)
+
+    if badge_type == 'pause_debut':
+        presence.nb_pauses = (presence.nb_pauses or 0) + 1
+        presence.pause_en_cours_depuis = moment
+
+    if badge_type == 'pause_fin':
+        delta = moment - presence.pause_en_cours_depuis
+        added_minutes = max(0, int(delta.total_seconds() // 60))
+        presence.duree_pauses_minutes = (presence.duree_pauses_minutes or 0) + added_minutes
+        presence.pause_en_cours_depuis = None
+
+    if badge_type == 'depart':
+        presence.heure_depart = heure
+        arrivee_dt = timezone.make_aware(datetime.datetime.combine(presence.date, presence.heure_arrivee))
+        depart_dt = timezone.make_aware(datetime.datetime.combine(presence.date, presence.heure_depart))
+        total_minutes = max(0, int((depart_dt - arrivee_dt).total_seconds() // 60))
+        pauses_minutes = int(presence.duree_pauses_minutes or 0)
+        presence.duree_travail_minutes = max(0, total_minutes - pauses_minutes)
+        if presence.statut != 'retard':
+            presence.statut = 'present'
+
+    return presence
+
+
+def _peut_pointer_pour(utilisateur, target_user_id):
+    if getattr(utilisateur, 'is_employe', False) and int(target_user_id) != int(utilisateur.id):
+        return False
+    if getattr(utilisateur, 'is_admin', False) or getattr(utilisateur, 'is_superadmin', False):
+        return True
+    return int(target_user_id) == int(utilisateur.id)
+
+
+def ingerer_lot(scans, utilisateur):
+    """Rejouer un lot de badgeages horodatés par une borne.
+
+    `scans` est une liste de couples (index, données validées par
+    BadgeageLotItemSerializer). Chaque scan passe par la même machine à états
+    que le scanner, dans l'ordre chronologique de l'appareil. Les Badgeage
+    acceptés sont écrits en un bulk_create et chaque Presence touchée n'est
+    écrite qu'une fois (les journées manquantes sont d'abord insérées sans
+    conflit possible avec le scanner). Retourne un résultat par scan.
+    """
+    resultats = []
+
+    # Résolution des employés : une requête pour les QR, une pour les user_id
+    codes = {data['code_unique'] for _, data in scans if data.get('code_unique') and jeton_recevable(data['code_unique'])}
+    par_code = {
+        code: (employe_id, user_id)
+        for code, employe_id, user_id in CodeQR.objects.filter(code_unique__in=codes, actif=True)
+        .values_list('code_unique', 'employe_id', 'employe__user_id')
+    }
+    user_ids = {data['user_id'] for _, data in scans if not data.get('code_unique') and data.get('user_id')}
+    par_user = {
+        user_id: (employe_id, user_id)
+        for user_id, employe_id in Employe.objects.filter(user_id__in=user_ids).values_list('user_id', 'id')
+    }
+
+    limite = timezone.now() + DERIVE_HORLOGE_MAX
+    a_traiter = []
+    for index, data in scans:
+        if data.get('code_unique'):
+            cible = par_code.get(data['code_unique'])
+            erreur = 'QR code invalide ou inactif.'
+        else:
+            cible = par_user.get(data['user_id'])
+            erreur = 'Profil employé non trouvé.'
+        if cible is None:
+            resultats.append({'index': index, 'statut': 'rejete', 'error': erreur})
+            continue
+        if not _peut_pointer_pour(utilisateur, cible[1]):
+            resultats.append({'index': index, 'statut': 'rejete', 'error': "Vous n'êtes pas autorisé à pointer pour cet utilisateur."})
+            continue
+        if data['horodatage'] > limite:
+            resultats.append({'index': index, 'statut': 'rejete', 'error': 'Horodatage dans le futur.'})
+            continue
+        a_traiter.append((index, cible[0], data))
+
+    if not a_traiter:
+        return resultats
+
+    # Rejouer dans l'ordre de l'appareil (tri stable : l'ordre du lot départage)
+    a_traiter.sort(key=lambda item: item[2]['horodatage'])
+
+    with transaction.atomic():
+        employe_ids = {employe_id for _, employe_id, _ in a_traiter}
+        dates = {timezone.localdate(data['horodatage']) for _, _, data in a_traiter}
+        presences = {
+            (p.employe_id, p.date): p
+            for p in Presence.objects.select_for_update().filter(employe_id__in=employe_ids, date__in=dates)
+        }
+
+        # Journées sans ligne : depuis un état vierge, seul un scan d'arrivée peut
+        # être accepté. Ces lignes sont insérées vierges en ignorant les conflits
+        # (le scanner a pu créer la même entre-temps), puis relues verrouillées.
+        manquantes = {
+            (employe_id, timezone.localdate(data['horodatage']))
+            for _, employe_id, data in a_traiter if data['type'] == 'arrivee'
+        } - presences.keys()
+        if manquantes:
+            Presence.objects.bulk_create(
+                [Presence(employe_id=employe_id, date=jour, statut='absent') for employe_id, jour in manquantes],
+                ignore_conflicts=True,
+            )
+            for presence in Presence.objects.select_for_update().filter(
+                employe_id__in={employe_id for employe_id, _ in manquantes},
+                date__in={jour for _, jour in manquantes},
+            ):
+                cle = (presence.employe_id, presence.date)
+                if cle in manquantes:
+                    # Insérée ici ou par un scan concurrent : référence inconnue,
+                    # les agrégats touchés seront recalculés par appliquer_deltas
+                    del presence._etat_initial
+                    presences[cle] = presence
+
+        nouveaux_badgeages = []
+        acceptes = []
+        modifiees = {}
+        etats_avant = {}
+        for index, employe_id, data in a_traiter:
+            moment = data['horodatage']
+            jour = timezone.localdate(moment)
+            presence = presences.get((employe_id, jour))
+            if presence is None:
+                # Aucune arrivée pour cette journée : tous ses scans seront refusés
+                presence = Presence(employe_id=employe_id, date=jour, statut='absent')
+                presences[(employe_id, jour)] = presence
+            etats_avant.setdefault((employe_id, jour), etat_live(presence))
+            try:
+                appliquer_badgeage(presence, data['type'], moment, horaire_de(employe_id, jour))
+            except BadgeageRefuse as exc:
+                resultats.append({'index': index, 'statut': 'rejete', 'error': str(exc)})
+                continue
+
+            modifiees[(employe_id, jour)] = presence
+            nouveaux_badgeages.append(Badgeage(
+                employe_id=employe_id,
+                type=data['type'],
+                datetime=moment,
+                date=jour,
+                localisation_latitude=data.get('latitude'),
+                localisation_longitude=data.get('longitude'),
+                device_info=data.get('device_info'),
+            ))
+            acceptes.append(index)
+
+        Badgeage.objects.bulk_create(nouveaux_badgeages)
+
+        maintenant = timezone.now()
+        for presence in modifiees.values():
+            presence.updated_at = maintenant
+        Presence.objects.bulk_update(modifiees.values(), PRESENCE_CHAMPS_ETAT)
+        # bulk_create/bulk_update n'émettent pas post_save : deltas explicites
+        appliquer_deltas(list(modifiees.values()))
+
+        aujourd_hui = timezone.localdate()
+        signaler_presences(
+            (etats_avant[cle], etat_live(presence))
+            for cle, presence in modifiees.items() if presence.date == aujourd_hui
+        )
+
+    for index, badgeage in zip(acceptes, nouveaux_badgeages):
+        resultats.append({'index': index, 'statut': 'accepte', 'badgeage_id': badgeage.pk})
+    return resultats
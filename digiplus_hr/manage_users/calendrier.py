@@ -0,0 +1,157 @@
+"""
+Calendrier des jours ouvrés : jours de repos par site et jours fériés.
+
+Pour chaque (calendrier, année), une table d'un octet par jour (1 = ouvré) et
+ses sommes cumulées sont calculées une fois par processus : « jours ouvrés
+entre A et B » se réduit à une soustraction par année couverte, et
+`masque_ouvres` indexe la même table pour un tableau de dates (numpy).
+
+Le calendrier d'un employé est celui du département de son poste, sinon le
+calendrier `par_defaut`, sinon PRESENCE_JOURS_OUVRES sans jour férié propre.
+Comme pour les horaires, un jeton de version dans le cache partagé signale
+toute modification aux autres processus.
+"""
+import datetime
+import threading
+import uuid
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_CLE = 'calendrier:version'
+
+_lock = threading.Lock()
+_etat = {'version': None, 'calendriers': {}, 'employes': {}, 'annees': {}}
+
+
+def invalider_calendriers():
+    cache.set(VERSION_CLE, uuid.uuid4().hex, None)
+
+
+def _version_courante():
+    version = cache.get(VERSION_CLE)
+    if version is None:
+        cache.add(VERSION_CLE, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_CLE)
+    return version
+
+
+class AnneeCalendrier:
+    """Jours ouvrés d'une année : `ouvres[i]` vaut 1 si le i-ème jour est ouvré,
+    `cumul[i]` compte les jours ouvrés avant lui."""
+    __slots__ = ('annee', 'premier', 'ouvres', 'cumul')
+
+    def __init__(self, annee, repos, feries):
+        self.annee = annee
+        self.premier = datetime.date(annee, 1, 1)
+        nb_jours = (datetime.date(annee + 1, 1, 1) - self.premier).days
+        premier_jour = self.premier.weekday()
+        ouvres = bytearray(
+            0 if (premier_jour + i) % 7 in repos else 1 for i in range(nb_jours)
+        )
+        for jour in feries:
+            if jour.year == annee:
+                ouvres[(jour - self.premier).days] = 0
+        self.ouvres = bytes(ouvres)
+        cumul = array('H', [0])
+        for valeur in self.ouvres:
+            cumul.append(cumul[-1] + valeur)
+        self.cumul = cumul
+
+    def est_ouvre(self, jour):
+        return bool(self.ouvres[(jour - self.premier).days])
+
+    def ouvres_entre(self, debut, fin):
+        return self.cumul[(fin - self.premier).days + 1] - self.cumul[(debut - self.premier).days]
+
+
+def _charger():
+    """{calendrier_id: (repos, feries)} (None = calendrier par défaut) et {employe_id: calendrier_id}."""
+    from .models import CalendrierTravail, Employe, JourFerie
+
+    feries = {}
+    for calendrier_id, jour in JourFerie.objects.values_list('calendrier_id', 'date'):
+        feries.setdefault(calendrier_id, set()).add(jour)
+    communs = frozenset(feries.pop(None, ()))
+
+    ouvres_defaut = getattr(settings, 'PRESENCE_JOURS_OUVRES', (0, 1, 2, 3, 4))
+    calendriers = {None: (frozenset(set(range(7)) - set(ouvres_defaut)), communs)}
+    for calendrier in CalendrierTravail.objects.all():
+        definition = (calendrier.repos(), communs | feries.get(calendrier.id, set()))
+        calendriers[calendrier.id] = definition
+        if calendrier.par_defaut:
+            calendriers[None] = definition
+
+    employes = dict(
+        Employe.objects.filter(poste__departement__calendrier__isnull=False)
+        .values_list('id', 'poste__departement__calendrier_id')
+    )
+    return calendriers, employes
+
+
+def _a_jour():
+    version = _version_courante()
+    if _etat['version'] != version:
+        calendriers, employes = _charger()
+        with _lock:
+            _etat.update(version=version, calendriers=calendriers, employes=employes, annees={})
+    return _etat
+
+
+def calendrier_de(employe_id):
+    """Identifiant du calendrier de l'employé (None : calendrier par défaut)."""
+    return _a_jour()['employes'].get(employe_id)
+
+
+def calendriers_de(employe_ids):
+    """{employe_id: calendrier_id} en une seule vérification de version."""
+    employes = _a_jour()['employes']
+    return {employe_id: employes.get(employe_id) for employe_id in employe_ids}
+
+
+def annee_calendrier(annee, calendrier_id=None):
+    etat = _a_jour()
+    cle = (calendrier_id, annee)
+    table = etat['annees'].get(cle)
+    if table is None:
+        repos, feries = etat['calendriers'].get(calendrier_id, etat['calendriers'][None])
+        table = AnneeCalendrier(annee, repos, feries)
+        with _lock:
+            etat['annees'][cle] = table
+    return table
+
+
+def est_jour_ouvre(jour, calendrier_id=None):
+    return annee_calendrier(jour.year, calendrier_id).est_ouvre(jour)
+
+
+def jours_ouvres_entre(debut, fin, calendrier_id=None):
+    """Nombre de jours ouvrés de `debut` à `fin` inclus."""
+    if debut > fin:
+        return 0
+    total = 0
+    for annee in range(debut.year, fin.year + 1):
+        table = annee_calendrier(annee, calendrier_id)
+        total += table.ouvres_entre(
+            max(debut, table.premier),
+            min(fin, datetime.date(annee, 12, 31)),
+        )
+    return total
+
+
+def masque_ouvres(dates, calendrier_id=None):
+    """Tableau numpy de booléens : True pour chaque date ouvrée de `dates`."""
+    import numpy as np
+
+    jours = np.asarray(dates, dtype='datetime64[D]')
+    masque = np.zeros(jours.shape, dtype=bool)
+    if not jours.size:
+        return masque
+    annees = jours.astype('datetime64[Y]')
+    for annee in np.unique(annees):
+        table = annee_calendrier(int(annee.astype(int)) + 1970, calendrier_id)
+        selection = annees == annee
+        index = (jours[selection] - np.datetime64(table.premier, 'D')).astype(np.int64)
+        masque[selection] = np.frombuffer(table.ouvres, dtype=np.uint8)[index].astype(bool)
+    return masque
@@ -0,0 +1,125 @@
+"""
+Compteurs temps réel du tableau de bord : présents, en pause, partis (jour
+courant) et demandes de congé en attente.
+
+Le scanner et le cycle des demandes de congé signalent leurs transitions ;
+les deltas validés (transaction.on_commit) sont cumulés par processus pendant
+DASHBOARD_COMPTEURS_FENETRE_MS puis envoyés en un seul message au groupe
+`admins`. Le client charge l'état initial (compteurs_instantanes, GET
+dashboard/compteurs/) puis applique les deltas reçus sur la WebSocket.
+"""
+import logging
+import threading
+from collections import Counter
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import DemandeConge, Presence
+
+logger = logging.getLogger(__name__)
+
+GROUPE = 'admins'
+COMPTEURS = ('presents', 'en_pause', 'partis', 'conges_en_attente')
+
+_lock = threading.Lock()
+_tampon = Counter()
+_minuteur = [None]
+
+
+def etat_live(presence):
+    """Compteur où figure la présence (None : pas encore arrivé)."""
+    if presence.heure_depart is not None:
+        return 'partis'
+    if presence.pause_en_cours_depuis is not None:
+        return 'en_pause'
+    if presence.heure_arrivee is not None:
+        return 'presents'
+    return None
+
+
+def compteurs_instantanes():
+    """Valeurs absolues des compteurs (une requête par table)."""
+    valeurs = Presence.objects.filter(date=timezone.localdate()).aggregate(
+        presents=Count('id', filter=Q(heure_arrivee__isnull=False, heure_depart__isnull=True, pause_en_cours_depuis__isnull=True)),
+        en_pause=Count('id', filter=Q(heure_depart__isnull=True, pause_en_cours_depuis__isnull=False)),
+        partis=Count('id', filter=Q(heure_depart__isnull=False)),
+    )
+    valeurs['conges_en_attente'] = DemandeConge.objects.filter(statut='en_attente').count()
+    return valeurs
+
+
+def signaler_presences(transitions):
+    """Publier les transitions (avant, apres) d'états etat_live des présences du jour."""
+    delta = Counter()
+    for avant, apres in transitions:
+        if avant == apres:
+            continue
+        if avant:
+            delta[avant] -= 1
+        if apres:
+            delta[apres] += 1
+    publier(delta)
+
+
+def signaler_conge(statut_avant, statut_apres):
+    delta = Counter()
+    if statut_avant == 'en_attente':
+        delta['conges_en_attente'] -= 1
+    if statut_apres == 'en_attente':
+        delta['conges_en_attente'] += 1
+    publier(delta)
+
+
+def publier(delta):
+    """Ajouter `delta` au prochain envoi, une fois la transaction courante validée."""
+    delta = {cle: valeur for cle, valeur in delta.items() if valeur}
+    if delta:
+        transaction.on_commit(lambda: _cumuler(delta))
+
+
+def _cumuler(delta):
+    fenetre = getattr(settings, 'DASHBOARD_COMPTEURS_FENETRE_MS', 1000) / 1000
+    with _lock:
+        _tampon.update(delta)
+        if fenetre <= 0:
+            a_planifier = False
+        elif _minuteur[0] is None:
+            _minuteur[0] = threading.Timer(fenetre, vider)
+            _minuteur[0].daemon = True
+            a_planifier = True
+        else:
+            return
+    if a_planifier:
+        _minuteur[0].start()
+    else:
+        vider()
+
+
+def vider():
+    """Envoyer les deltas cumulés au groupe admins."""
+    with _lock:
+        delta = {cle: valeur for cle, valeur in _tampon.items() if valeur}
+        _tampon.clear()
+        _minuteur[0] = None
+    if not delta:
+        return
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            GROUPE,
+            {
+                'type': 'dashboard_compteurs',
+                'content': {
+                    'type': 'compteurs',
+                    'date': timezone.localdate().isoformat(),
+                    'delta': delta,
+                },
+            },
+        )
+    except Exception:
+        # Ne pas faire échouer le badgeage si Channels n'est pas joignable
+        logger.warning("Envoi des compteurs du tableau de bord impossible", exc_info=True)
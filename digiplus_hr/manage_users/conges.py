@@ -0,0 +1,96 @@
+"""
+Décisions groupées sur les demandes de congé.
+
+DemandeConge.approuver / rejeter traitent une demande à la fois (save,
+Notification, audit et envoi Channels chacun). `decider_demandes` applique la
+même décision à N demandes en une transaction : un bulk_update des statuts,
+un bulk_create des notifications, des audits et des messages temps réel
+(outbox, voir diffusion.py), envoyés par groupe après validation.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from .compteurs import publier
+from .diffusion import mettre_en_file_lot
+from .models import DemandeConge, DemandeCongeAudit, Notification
+from .non_lues import ajuster_non_lues
+from .soldes import imputer_demandes
+
+TITRES = {
+    'approuve': 'Congé approuvé',
+    'rejete': 'Congé rejeté',
+}
+VERBES = {
+    'approuve': 'approuvée',
+    'rejete': 'rejetée',
+}
+
+
+def _message(demande, decision, raison=''):
+    message = f'Votre demande de congé du {demande.date_debut} au {demande.date_fin} a été {VERBES[decision]}.'
+    if decision == 'rejete' and raison:
+        message += f'\n\nRaison: {raison}'
+    return message
+
+
+def decider_demandes(demande_ids, decision, admin=None, raison=''):
+    """Approuver ou rejeter en bloc les demandes en attente ; retourne (traitees, ignorees)."""
+    demande_ids = list(dict.fromkeys(demande_ids))
+    with transaction.atomic():
+        demandes = list(
+            DemandeConge.objects.select_for_update(of=('self',))
+            .select_related('employe')
+            .filter(id__in=demande_ids, statut='en_attente')
+            .order_by('id')
+        )
+        maintenant = timezone.now()
+        for demande in demandes:
+            demande.statut = decision
+            demande.updated_at = maintenant
+            demande._statut_initial = decision
+        DemandeConge.objects.bulk_update(demandes, ['statut', 'updated_at'])
+        # bulk_update n'émet pas post_save : imputation au registre des congés explicite
+        if decision == 'approuve':
+            imputer_demandes(demandes)
+
+        Notification.objects.bulk_create([
+            Notification(
+                demande_conge=demande, destinataire_id=demande.employe.user_id,
+                titre=TITRES[decision], message=_message(demande, decision, raison),
+            )
+            for demande in demandes
+        ])
+        # bulk_create n'émet pas post_save : compteurs de non lues explicites
+        ajuster_non_lues(Counter(demande.employe.user_id for demande in demandes))
+        if admin is not None:
+            DemandeCongeAudit.objects.bulk_create([
+                DemandeCongeAudit(demande_conge=demande, admin=admin, action=decision, raison=raison)
+                for demande in demandes
+            ])
+
+        # bulk_update n'émet pas post_save : compteur des demandes en attente explicite
+        publier(Counter(conges_en_attente=-len(demandes)))
+        envois = [
+            (f"user_{demande.employe.user_id}", {
+                "titre": TITRES[decision],
+                "message": _message(demande, decision, raison),
+                "demande_id": demande.id,
+                "statut": decision,
+            })
+            for demande in demandes
+        ]
+        if envois:
+            envois.append(("admins", {
+                "titre": "Décision groupée",
+                "message": f"{len(demandes)} demande(s) de congé {VERBES[decision]}(s).",
+                "demande_ids": [demande.id for demande in demandes],
+                "statut": decision,
+            }))
+            mettre_en_file_lot(envois)
+
+    traitees = [demande.id for demande in demandes]
+    deja_traitees = set(traitees)
+    return traitees, [demande_id for demande_id in demande_ids if demande_id not in deja_traitees]
+
@@ -1,4 +1,5 @@
 import json
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.contrib.auth.models import AnonymousUser
 
@@ -18,6 +19,10 @@ class NotificationConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
             await self.accept()
+            # État initial du compteur de non lues ; les mises à jour suivent par send_notifications
+            from .non_lues import non_lues
+            nombre = await database_sync_to_async(non_lues)(user.id)
+            await self.send(text_data=json.dumps({"type": "non_lues", "non_lues": nombre}))
         else:
             await self.close()
 
@@ -27,3 +32,11 @@ class NotificationConsumer(AsyncWebsocketConsumer):
 
     async def send_notification(self, event):
         await self.send(text_data=json.dumps(event["content"]))
+
+    async def send_notifications(self, event):
+        # Lot regroupé par le diffuseur (diffusion.py) : une trame par notification
+        for content in event["contents"]:
+            await self.send(text_data=json.dumps(content))
+
+    async def dashboard_compteurs(self, event):
+        await self.send(text_data=json.dumps(event["content"]))
@@ -0,0 +1,167 @@
+"""
+Diffusion des notifications temps réel par outbox.
+
+Les vues et méthodes métier n'appellent plus group_send : `mettre_en_file`
+écrit une NotificationSortante dans leur transaction. Le diffuseur la publie
+après validation, indépendamment de la latence (ou de l'indisponibilité) de
+la couche Channels :
+
+- `vider_file` réserve un lot de lignes disponibles, envoie un seul message
+  `send_notifications` par groupe (le consumer le déplie), supprime les lignes
+  acquittées et replanifie les autres avec un délai croissant ;
+- la commande `diffuser_notifications` l'exécute en boucle ; à défaut, chaque
+  validation réveille un vidage dans un thread du processus
+  (NOTIFICATIONS_DIFFUSION_EN_PROCESSUS).
+
+Livraison au moins une fois : une ligne réservée mais non acquittée (arrêt du
+diffuseur) redevient disponible à l'expiration de la réservation.
+"""
+import asyncio
+import datetime
+import logging
+import threading
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import NotificationSortante
+
+logger = logging.getLogger(__name__)
+
+TAILLE_LOT = 500
+DELAI_MAX_SECONDES = 300
+
+_reveil_lock = threading.Lock()
+_reveil = {'en_cours': False, 'a_refaire': False}
+
+
+def _duree_reservation():
+    return datetime.timedelta(seconds=getattr(settings, 'NOTIFICATIONS_RESERVATION_SECONDES', 30))
+
+
+def mettre_en_file(groupe, contenu):
+    """Enregistrer un message pour `groupe` ; envoyé après validation de la transaction courante."""
+    notification = NotificationSortante.objects.create(groupe=groupe, contenu=contenu)
+    _planifier_reveil()
+    return notification
+
+
+def mettre_en_file_lot(messages):
+    """Variante en masse de mettre_en_file : `messages` est une liste de (groupe, contenu)."""
+    lignes = NotificationSortante.objects.bulk_create([
+        NotificationSortante(groupe=groupe, contenu=contenu) for groupe, contenu in messages
+    ])
+    if lignes:
+        _planifier_reveil()
+    return lignes
+
+
+def _planifier_reveil():
+    if getattr(settings, 'NOTIFICATIONS_DIFFUSION_EN_PROCESSUS', True):
+        transaction.on_commit(reveiller)
+
+
+def reveiller():
+    """Vider la file dans un thread ; un seul vidage à la fois par processus."""
+    with _reveil_lock:
+        if _reveil['en_cours']:
+            _reveil['a_refaire'] = True
+            return
+        _reveil['en_cours'] = True
+    threading.Thread(target=_vider_en_arriere_plan, daemon=True).start()
+
+
+def _vider_en_arriere_plan():
+    try:
+        while True:
+            try:
+                async_to_sync(vider_file)()
+            except Exception:
+                logger.warning("Vidage de la file des notifications impossible", exc_info=True)
+            with _reveil_lock:
+                if not _reveil['a_refaire']:
+                    _reveil['en_cours'] = False
+                    return
+                _reveil['a_refaire'] = False
+    finally:
+        from django.db import connection
+        connection.close()
+
+
+def _reserver(taille):
+    maintenant = timezone.now()
+    with transaction.atomic():
+        lignes = list(
+            NotificationSortante.objects.select_for_update(skip_locked=True)
+            .filter(disponible_a__lte=maintenant)
+            .order_by('disponible_a', 'id')[:taille]
+        )
+        if lignes:
+            NotificationSortante.objects.filter(pk__in=[ligne.pk for ligne in lignes]).update(
+                disponible_a=maintenant + _duree_reservation(),
+            )
+    return lignes
+
+
+def _acquitter(envoyees, echecs):
+    """Supprimer les lignes envoyées ; replanifier les échecs {groupe: (lignes, erreur)}."""
+    NotificationSortante.objects.filter(pk__in=envoyees).delete()
+    maintenant = timezone.now()
+    a_replanifier = []
+    for lignes, erreur in echecs.values():
+        for ligne in lignes:
+            ligne.tentatives += 1
+            ligne.derniere_erreur = erreur[:1000]
+            ligne.disponible_a = maintenant + datetime.timedelta(seconds=min(2 ** ligne.tentatives, DELAI_MAX_SECONDES))
+            a_replanifier.append(ligne)
+    NotificationSortante.objects.bulk_update(a_replanifier, ['tentatives', 'derniere_erreur', 'disponible_a'])
+
+
+async def vider_file(taille=TAILLE_LOT):
+    """Envoyer un lot de la file ; retourne (envoyées, en échec)."""
+    lignes = await sync_to_async(_reserver)(taille)
+    if not lignes:
+        return 0, 0
+
+    par_groupe = defaultdict(list)
+    for ligne in lignes:
+        par_groupe[ligne.groupe].append(ligne)
+
+    channel_layer = get_channel_layer()
+    resultats = await asyncio.gather(
+        *(
+            channel_layer.group_send(groupe, {
+                "type": "send_notifications",
+                "contents": [ligne.contenu for ligne in lignes_groupe],
+            })
+            for groupe, lignes_groupe in par_groupe.items()
+        ),
+        return_exceptions=True,
+    )
+
+    envoyees = []
+    echecs = {}
+    for (groupe, lignes_groupe), resultat in zip(par_groupe.items(), resultats):
+        if isinstance(resultat, Exception):
+            echecs[groupe] = (lignes_groupe, repr(resultat))
+        else:
+            envoyees.extend(ligne.pk for ligne in lignes_groupe)
+    await sync_to_async(_acquitter)(envoyees, echecs)
+    return len(envoyees), sum(len(lignes_groupe) for lignes_groupe, _ in echecs.values())
+
+
+def etat_file():
+    """Profondeur de la file : messages en attente, en échec, âge du plus ancien."""
+    etat = NotificationSortante.objects.aggregate(
+        en_attente=Count('id'),
+        en_echec=Count('id', filter=Q(tentatives__gt=0)),
+        plus_ancien=Min('created_at'),
+    )
+    plus_ancien = etat.pop('plus_ancien')
+    etat['age_max_secondes'] = int((timezone.now() - plus_ancien).total_seconds()) if plus_ancien else 0
+    return etat
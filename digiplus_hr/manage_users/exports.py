@@ -0,0 +1,330 @@
+"""
+Exports en flux continu (StreamingHttpResponse).
+
+Les générateurs de ce module produisent des morceaux d'octets au fil de
+l'itération : la mémoire reste bornée par un élément (un badge, un lot de
+lignes) quel que soit le volume exporté.
+"""
+import csv
+import io
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+from PIL import Image
+
+
+class _FluxSortie(io.RawIOBase):
+    """Fichier en écriture seule dont on vide le contenu après chaque élément.
+
+    Sans `tell`/`seek`, zipfile passe en mode non positionnable et écrit des
+    descripteurs de données : l'archive peut être émise au fil de l'eau.
+    """
+
+    def __init__(self):
+        self._morceaux = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._morceaux.append(bytes(data))
+        return len(data)
+
+    def vider(self):
+        data = b''.join(self._morceaux)
+        self._morceaux = []
+        return data
+
+
+def flux_zip(fichiers):
+    """Archive ZIP émise fichier par fichier.
+
+    `fichiers` itère sur des couples (nom, contenu) ; `contenu` est un bytes
+    ou un itérable de morceaux, écrit et émis au fil de l'eau. Les PNG, déjà
+    compressés, sont stockés tels quels ; le reste est compressé.
+    """
+    sortie = _FluxSortie()
+    with zipfile.ZipFile(sortie, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for nom, contenu in fichiers:
+            if isinstance(contenu, bytes):
+                compression = zipfile.ZIP_STORED if nom.endswith('.png') else zipfile.ZIP_DEFLATED
+                archive.writestr(nom, contenu, compress_type=compression)
+            else:
+                with archive.open(nom, mode='w', force_zip64=True) as fichier:
+                    for morceau in contenu:
+                        fichier.write(morceau)
+                        donnees = sortie.vider()
+                        if donnees:
+                            yield donnees
+            morceau = sortie.vider()
+            if morceau:
+                yield morceau
+    yield sortie.vider()
+
+
+# ------------------------------
+# Tableaux (CSV / XLSX)
+# ------------------------------
+
+LIGNES_PAR_MORCEAU = 500
+
+
+def _par_paquets(lignes, taille=LIGNES_PAR_MORCEAU):
+    paquet = []
+    for ligne in lignes:
+        paquet.append(ligne)
+        if len(paquet) >= taille:
+            yield paquet
+            paquet = []
+    if paquet:
+        yield paquet
+
+
+def _texte_cellule(valeur):
+    if valeur is None:
+        return ''
+    if hasattr(valeur, 'isoformat'):
+        return valeur.isoformat()
+    return str(valeur)
+
+
+def flux_csv(entetes, lignes):
+    """CSV (UTF-8 avec BOM pour Excel) émis par paquets de lignes."""
+    tampon = io.StringIO()
+    ecrivain = csv.writer(tampon, delimiter=';')
+
+    def vider():
+        texte = tampon.getvalue()
+        tampon.seek(0)
+        tampon.truncate(0)
+        return texte.encode('utf-8')
+
+    ecrivain.writerow(entetes)
+    yield b'\xef\xbb\xbf' + vider()
+    for paquet in _par_paquets(lignes):
+        ecrivain.writerows([_texte_cellule(v) for v in ligne] for ligne in paquet)
+        yield vider()
+
+
+def _lettre_colonne(index):
+    lettres = ''
+    index += 1
+    while index:
+        index, reste = divmod(index - 1, 26)
+        lettres = chr(65 + reste) + lettres
+    return lettres
+
+
+def _ligne_xlsx(numero, valeurs):
+    cellules = []
+    for index, valeur in enumerate(valeurs):
+        ref = f"{_lettre_colonne(index)}{numero}"
+        if valeur is None:
+            continue
+        if isinstance(valeur, (int, float)) and not isinstance(valeur, bool):
+            cellules.append(f'<c r="{ref}"><v>{valeur}</v></c>')
+        else:
+            cellules.append(f'<c r="{ref}" t="inlineStr"><is><t>{escape(_texte_cellule(valeur))}</t></is></c>')
+    return f'<row r="{numero}">{"".join(cellules)}</row>'
+
+
+def _feuille_xlsx(entetes, lignes):
+    yield (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+        + _ligne_xlsx(1, entetes)
+    ).encode('utf-8')
+    numero = 1
+    for paquet in _par_paquets(lignes):
+        morceau = []
+        for ligne in paquet:
+            numero += 1
+            morceau.append(_ligne_xlsx(numero, ligne))
+        yield ''.join(morceau).encode('utf-8')
+    yield b'</sheetData></worksheet>'
+
+
+def flux_xlsx(entetes, lignes, feuille='Export'):
+    """Classeur XLSX minimal (une feuille, chaînes en ligne) émis en flux."""
+    fichiers = [
+        ('[Content_Types].xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '</Types>'
+        ).encode('utf-8')),
+        ('_rels/.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ).encode('utf-8')),
+        ('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(feuille)}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        ).encode('utf-8')),
+        ('xl/_rels/workbook.xml.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            'Target="worksheets/sheet1.xml"/>'
+            '</Relationships>'
+        ).encode('utf-8')),
+        ('xl/worksheets/sheet1.xml', _feuille_xlsx(entetes, lignes)),
+    ]
+    return flux_zip(fichiers)
+
+
+# ------------------------------
+# Planche de badges PDF
+# ------------------------------
+
+PAGE_LARGEUR = 595
+PAGE_HAUTEUR = 842
+MARGE = 36
+COLONNES = 3
+LIGNES = 4
+TAILLE_QR = 130
+
+
+def _texte_pdf(valeur):
+    texte = str(valeur or '').encode('latin-1', 'replace').decode('latin-1')
+    return texte.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _image_pdf(png):
+    """Convertir un PNG en XObject PDF monochrome compressé (Flate)."""
+    with Image.open(io.BytesIO(png)) as image:
+        image = image.convert('1')
+        largeur, hauteur = image.size
+        donnees = zlib.compress(image.tobytes())
+    entete = (
+        f"<< /Type /XObject /Subtype /Image /Width {largeur} /Height {hauteur} "
+        f"/ColorSpace /DeviceGray /BitsPerComponent 1 /Filter /FlateDecode "
+        f"/Length {len(donnees)} >>\nstream\n"
+    ).encode('latin-1')
+    return entete + donnees + b"\nendstream"
+
+
+class _EcrivainPdf:
+    """Écriture séquentielle d'objets PDF ; seule la table des positions reste en mémoire."""
+
+    def __init__(self):
+        self.position = 0
+        self.positions = {}
+        self.prochain = 1
+
+    def reserver(self):
+        numero = self.prochain
+        self.prochain += 1
+        return numero
+
+    def objet(self, numero, corps):
+        if isinstance(corps, str):
+            corps = corps.encode('latin-1')
+        self.positions[numero] = self.position
+        return self._emettre(f"{numero} 0 obj\n".encode('latin-1') + corps + b"\nendobj\n")
+
+    def _emettre(self, data):
+        self.position += len(data)
+        return data
+
+    def entete(self):
+        return self._emettre(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def fin(self, catalogue):
+        debut_xref = self.position
+        lignes = [f"xref\n0 {self.prochain}\n", "0000000000 65535 f \n"]
+        for numero in range(1, self.prochain):
+            lignes.append(f"{self.positions[numero]:010d} 00000 n \n")
+        lignes.append(
+            f"trailer\n<< /Size {self.prochain} /Root {catalogue} 0 R >>\n"
+            f"startxref\n{debut_xref}\n%%EOF\n"
+        )
+        return self._emettre(''.join(lignes).encode('latin-1'))
+
+
+def flux_pdf_badges(badges, titre='Badges'):
+    """Planche de badges PDF (A4, 3 x 4 par page) émise page par page.
+
+    `badges` itère sur des triplets (nom, matricule, png).
+    """
+    pdf = _EcrivainPdf()
+    catalogue = pdf.reserver()
+    pages_numero = pdf.reserver()
+    police = pdf.reserver()
+    pages = []
+
+    yield pdf.entete()
+    yield pdf.objet(police, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    par_page = COLONNES * LIGNES
+    largeur_case = (PAGE_LARGEUR - 2 * MARGE) / COLONNES
+    hauteur_case = (PAGE_HAUTEUR - 2 * MARGE - 20) / LIGNES
+
+    def emettre_page(lot):
+        contenu = [
+            "BT /F1 11 Tf",
+            f"1 0 0 1 {MARGE} {PAGE_HAUTEUR - MARGE} Tm ({_texte_pdf(titre)}) Tj",
+            "ET",
+        ]
+        images = {}
+        morceaux = []
+        for position, (nom, matricule, png) in enumerate(lot):
+            numero_image = pdf.reserver()
+            images[f"Im{position}"] = numero_image
+            morceaux.append(pdf.objet(numero_image, _image_pdf(png)))
+
+            colonne = position % COLONNES
+            ligne = position // COLONNES
+            x = MARGE + colonne * largeur_case + (largeur_case - TAILLE_QR) / 2
+            y = PAGE_HAUTEUR - MARGE - 20 - (ligne + 1) * hauteur_case + 40
+            contenu.append(f"q {TAILLE_QR} 0 0 {TAILLE_QR} {x:.1f} {y:.1f} cm /Im{position} Do Q")
+            contenu.append(
+                f"BT /F1 9 Tf 1 0 0 1 {x:.1f} {y - 14:.1f} Tm ({_texte_pdf(nom)}) Tj "
+                f"1 0 0 1 {x:.1f} {y - 26:.1f} Tm ({_texte_pdf(matricule)}) Tj ET"
+            )
+
+        flux = zlib.compress("\n".join(contenu).encode('latin-1'))
+        numero_contenu = pdf.reserver()
+        morceaux.append(pdf.objet(
+            numero_contenu,
+            f"<< /Length {len(flux)} /Filter /FlateDecode >>\nstream\n".encode('latin-1') + flux + b"\nendstream",
+        ))
+
+        numero_page = pdf.reserver()
+        xobjects = ' '.join(f"/{nom} {numero} 0 R" for nom, numero in images.items())
+        morceaux.append(pdf.objet(
+            numero_page,
+            f"<< /Type /Page /Parent {pages_numero} 0 R /MediaBox [0 0 {PAGE_LARGEUR} {PAGE_HAUTEUR}] "
+            f"/Contents {numero_contenu} 0 R "
+            f"/Resources << /Font << /F1 {police} 0 R >> /XObject << {xobjects} >> >> >>",
+        ))
+        pages.append(numero_page)
+        return b''.join(morceaux)
+
+    lot = []
+    for badge in badges:
+        lot.append(badge)
+        if len(lot) == par_page:
+            yield emettre_page(lot)
+            lot = []
+    if lot or not pages:
+        yield emettre_page(lot)
+
+    kids = ' '.join(f"{numero} 0 R" for numero in pages)
+    yield pdf.objet(pages_numero, f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    yield pdf.objet(catalogue, f"<< /Type /Catalog /Pages {pages_numero} 0 R >>")
+    yield pdf.fin(catalogue)
@@ -0,0 +1,106 @@
+"""
+Horaires de travail et détection des retards au badgeage.
+
+La table employé -> horaires est chargée une fois par processus puis servie
+depuis la mémoire : le scanner classe une arrivée (present / retard) sans
+requête supplémentaire. Toute modification d'un horaire, d'un employé ou d'un
+contrat change un jeton de version dans le cache partagé ; chaque processus
+recharge sa table au premier appel qui constate le changement.
+"""
+import datetime
+import threading
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+VERSION_CLE = 'horaires:version'
+
+Horaire = namedtuple('Horaire', ['heure_debut', 'tolerance_minutes', 'jours'])
+
+_lock = threading.Lock()
+_table = {'version': None, 'par_employe': {}}
+
+
+def invalider_horaires():
+    cache.set(VERSION_CLE, uuid.uuid4().hex, None)
+
+
+def _version_courante():
+    version = cache.get(VERSION_CLE)
+    if version is None:
+        cache.add(VERSION_CLE, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_CLE)
+    return version
+
+
+def _horaire(horaire_travail):
+    return Horaire(horaire_travail.heure_debut, horaire_travail.tolerance_minutes, horaire_travail.jours())
+
+
+def _charger():
+    """Construire {employe_id: [(debut, fin, Horaire)] par priorité, horaire du poste en dernier}."""
+    from manage_contrat.models import Contrat
+    from .models import Employe, HoraireTravail
+
+    par_poste = {}
+    par_contrat = {}
+    for horaire_travail in HoraireTravail.objects.filter(actif=True).order_by('-updated_at'):
+        if horaire_travail.contrat_id:
+            par_contrat.setdefault(horaire_travail.contrat_id, _horaire(horaire_travail))
+        elif horaire_travail.poste_id:
+            par_poste.setdefault(horaire_travail.poste_id, _horaire(horaire_travail))
+
+    par_employe = {}
+    if par_contrat:
+        contrats = Contrat.objects.filter(id__in=par_contrat, statut='actif').order_by('-date_debut')
+        for contrat_id, employe_id, debut, fin in contrats.values_list('id', 'employe_id', 'date_debut', 'date_fin'):
+            par_employe.setdefault(employe_id, []).append((debut, fin, par_contrat[contrat_id]))
+    if par_poste:
+        for employe_id, poste_id in Employe.objects.filter(poste_id__in=par_poste).values_list('id', 'poste_id'):
+            par_employe.setdefault(employe_id, []).append((None, None, par_poste[poste_id]))
+    return par_employe
+
+
+def _table_courante():
+    version = _version_courante()
+    if _table['version'] != version:
+        par_employe = _charger()
+        with _lock:
+            _table['par_employe'] = par_employe
+            _table['version'] = version
+    return _table['par_employe']
+
+
+def horaire_par_defaut():
+    heure = getattr(settings, 'PRESENCE_HEURE_DEBUT', None)
+    if not heure:
+        return None
+    if not isinstance(heure, datetime.time):
+        heure = datetime.datetime.strptime(heure, '%H:%M').time()
+    return Horaire(
+        heure,
+        getattr(settings, 'PRESENCE_TOLERANCE_MINUTES', 0),
+        frozenset(getattr(settings, 'PRESENCE_JOURS_OUVRES', (0, 1, 2, 3, 4))),
+    )
+
+
+def horaire_de(employe_id, jour):
+    """Horaire applicable à l'employé ce jour-là : contrat actif, puis poste, puis défaut."""
+    for debut, fin, horaire in _table_courante().get(employe_id, ()):
+        if (debut is None or debut <= jour) and (fin is None or jour <= fin):
+            return horaire
+    return horaire_par_defaut()
+
+
+def statut_arrivee(horaire, moment):
+    """'retard' si l'arrivée dépasse l'heure de début plus la tolérance un jour travaillé."""
+    if horaire is None:
+        return 'present'
+    local = timezone.localtime(moment)
+    if local.weekday() not in horaire.jours:
+        return 'present'
+    limite = datetime.datetime.combine(local.date(), horaire.heure_debut) + datetime.timedelta(minutes=horaire.tolerance_minutes)
+    return 'retard' if local.replace(tzinfo=None) > limite else 'present'
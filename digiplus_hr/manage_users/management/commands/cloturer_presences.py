@@ -0,0 +1,42 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from manage_users.presences import cloturer_presences
+
+
+def _date(valeur):
+    try:
+        return datetime.date.fromisoformat(valeur)
+    except ValueError:
+        raise CommandError(f"Date invalide : {valeur} (format AAAA-MM-JJ).")
+
+
+class Command(BaseCommand):
+    help = "Complète les présences manquantes (congé/repos/absent) et ferme les journées ouvertes (à lancer chaque nuit)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--debut', help="Premier jour AAAA-MM-JJ (défaut : hier)")
+        parser.add_argument('--fin', help="Dernier jour AAAA-MM-JJ (défaut : hier)")
+        parser.add_argument('--employe', type=int, action='append', dest='employe_ids', help="Id employé (répétable)")
+
+    def handle(self, *args, **options):
+        hier = timezone.localdate() - datetime.timedelta(days=1)
+        debut = _date(options['debut']) if options['debut'] else hier
+        fin = _date(options['fin']) if options['fin'] else hier
+        if debut > fin:
+            raise CommandError("--debut doit précéder --fin.")
+
+        depart = time.monotonic()
+        resultat = cloturer_presences(debut, fin, employe_ids=options['employe_ids'])
+        duree = time.monotonic() - depart
+
+        crees = resultat['crees']
+        self.stdout.write(self.style.SUCCESS(
+            f"Du {resultat['debut']} au {resultat['fin']} : "
+            f"{crees.get('absent', 0)} absent(s), {crees.get('conge', 0)} congé(s), "
+            f"{crees.get('repos', 0)} repos créé(s), {resultat['fermees']} journée(s) fermée(s) "
+            f"({duree:.2f}s)."
+        ))
@@ -0,0 +1,46 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+
+from manage_users.diffusion import TAILLE_LOT, etat_file, vider_file
+
+
+class Command(BaseCommand):
+    help = "Diffuse les notifications temps réel en file (outbox) vers la couche Channels, en continu ou une seule fois."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--une-fois', action='store_true', help="Vider la file puis s'arrêter")
+        parser.add_argument('--intervalle', type=float, default=1.0, help="Secondes d'attente quand la file est vide (défaut : 1)")
+        parser.add_argument('--taille', type=int, default=TAILLE_LOT, help=f"Messages réservés par lot (défaut : {TAILLE_LOT})")
+        parser.add_argument('--stats', action='store_true', help="Afficher l'état de la file sans rien envoyer")
+
+    def handle(self, *args, **options):
+        if options['taille'] < 1:
+            raise CommandError("--taille doit être positif.")
+        if options['stats']:
+            etat = etat_file()
+            self.stdout.write(
+                f"{etat['en_attente']} message(s) en attente dont {etat['en_echec']} en échec, "
+                f"plus ancien : {etat['age_max_secondes']}s."
+            )
+            return
+
+        # async_to_sync : les accès ORM de vider_file restent sur le thread de la commande
+        envoyees, echecs = async_to_sync(self._diffuser)(options)
+        self.stdout.write(self.style.SUCCESS(f"{envoyees} message(s) envoyé(s), {echecs} échec(s)."))
+
+    async def _diffuser(self, options):
+        total_envoyees = total_echecs = 0
+        try:
+            while True:
+                envoyees, echecs = await vider_file(options['taille'])
+                total_envoyees += envoyees
+                total_echecs += echecs
+                if envoyees + echecs < options['taille']:
+                    if options['une_fois']:
+                        break
+                    await asyncio.sleep(options['intervalle'])
+        except asyncio.CancelledError:
+            pass
+        return total_envoyees, total_echecs
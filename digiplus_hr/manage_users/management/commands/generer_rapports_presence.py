@@ -0,0 +1,30 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from manage_users.rapports import generer_rapports
+
+
+class Command(BaseCommand):
+    help = "Calcule les rapports mensuels de présence (un agrégat groupé, upsert en masse)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--annee', type=int, help="Année (défaut : mois précédent)")
+        parser.add_argument('--mois', type=int, help="Mois 1-12 (défaut : mois précédent)")
+        parser.add_argument('--employe', type=int, action='append', dest='employe_ids', help="Id employé (répétable)")
+
+    def handle(self, *args, **options):
+        premier_du_mois = timezone.localdate().replace(day=1)
+        precedent = premier_du_mois - datetime.timedelta(days=1)
+        annee = options['annee'] or precedent.year
+        mois = options['mois'] or precedent.month
+        if not 1 <= mois <= 12:
+            raise CommandError("--mois doit être compris entre 1 et 12.")
+
+        resultat = generer_rapports(annee, mois, employe_ids=options['employe_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultat['rapports']} rapport(s) {mois:02d}/{annee} générés "
+            f"en {resultat['duree_totale_ms']} ms "
+            f"(agrégat {resultat['duree_agregation_ms']} ms, écriture {resultat['duree_ecriture_ms']} ms)."
+        ))
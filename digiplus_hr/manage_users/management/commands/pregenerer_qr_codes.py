@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from manage_users.qr_utils import codes_pour, pregenerer_images
+
+
+class Command(BaseCommand):
+    help = "Pré-génère les images QR manquantes ou périmées (pool de processus)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employe', type=int, action='append', dest='employe_ids', help="Id employé (répétable)")
+        parser.add_argument('--departement', type=int, action='append', dest='departement_ids', help="Id département (répétable)")
+        parser.add_argument('--workers', type=int, default=None, help="Nombre de processus de rendu")
+        parser.add_argument('--force', action='store_true', help="Re-rendre même les images à jour")
+        parser.add_argument('--creer-manquants', action='store_true', help="Émettre un code aux employés qui n'en ont pas")
+
+    def handle(self, *args, **options):
+        debut = time.monotonic()
+        codes = codes_pour(
+            employe_ids=options['employe_ids'],
+            departement_ids=options['departement_ids'],
+            creer_manquants=options['creer_manquants'],
+        )
+        resultat = pregenerer_images(codes, workers=options['workers'], force=options['force'])
+        duree = time.monotonic() - debut
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultat['rendus']} image(s) rendue(s), {resultat['rattaches']} rattachée(s), "
+            f"{resultat['a_jour']} déjà à jour sur {resultat['total']} code(s) "
+            f"({resultat['workers']} processus, {duree:.2f}s)."
+        ))
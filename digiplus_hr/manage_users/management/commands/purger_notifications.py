@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from manage_users.retention import TAILLE_LOT, limite_retention, purger_notifications
+
+
+class Command(BaseCommand):
+    help = "Supprime par lots les notifications lues plus anciennes que la rétention, avec archive JSON Lines facultative."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jours', type=int, help="Âge minimal en jours (défaut : NOTIFICATIONS_RETENTION_JOURS)")
+        parser.add_argument('--archive', help="Fichier JSON Lines complété avant chaque suppression")
+        parser.add_argument('--taille', type=int, default=TAILLE_LOT, help=f"Notifications par lot (défaut : {TAILLE_LOT})")
+        parser.add_argument('--pause', type=float, default=0.0, help="Secondes d'attente entre deux lots")
+        parser.add_argument('--simulation', action='store_true', help="Compter sans supprimer")
+
+    def handle(self, *args, **options):
+        if options['jours'] is not None and options['jours'] < 0:
+            raise CommandError("--jours doit être positif.")
+        if options['taille'] < 1:
+            raise CommandError("--taille doit être positif.")
+        limite = limite_retention(options['jours'])
+
+        depart = time.monotonic()
+        if options['archive'] and not options['simulation']:
+            with open(options['archive'], 'a', encoding='utf-8') as archive:
+                total = purger_notifications(limite, archive, options['taille'], options['pause'])
+        else:
+            total = purger_notifications(limite, None, options['taille'], options['pause'], options['simulation'])
+
+        verbe = "à purger" if options['simulation'] else "purgée(s)"
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} notification(s) lue(s) envoyée(s) avant le {limite:%Y-%m-%d %H:%M} {verbe} "
+            f"({time.monotonic() - depart:.2f}s)."
+        ))
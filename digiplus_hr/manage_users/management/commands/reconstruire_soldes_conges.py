@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from manage_users.soldes import crediter_conges, reconstruire_soldes, reimputer_demandes
+
+
+class Command(BaseCommand):
+    help = "Rejoue le registre des congés pour recalculer les soldes (un agrégat groupé, insertion en masse)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--annee', type=int, action='append', dest='annees', help="Année (répétable ; défaut : toutes)")
+        parser.add_argument('--crediter', action='store_true', help="Créditer d'abord les droits des contrats (défaut : année en cours)")
+        parser.add_argument('--depuis-demandes', action='store_true', help="Réimputer d'abord l'historique des demandes de congé")
+
+    def handle(self, *args, **options):
+        annees = options['annees']
+        depart = time.monotonic()
+
+        credits = 0
+        if options['crediter']:
+            for annee in annees or [timezone.localdate().year]:
+                credits += len(crediter_conges(annee))
+        imputations = reimputer_demandes(annees) if options['depuis_demandes'] else 0
+        soldes = reconstruire_soldes(annees)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{credits} acquisition(s), {imputations} imputation(s) ajoutée(s) ; "
+            f"{soldes} solde(s) recalculé(s) ({time.monotonic() - depart:.2f}s)."
+        ))
@@ -0,0 +1,34 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from manage_users.resumes import remplir_resumes
+
+
+def _date(valeur):
+    try:
+        return datetime.date.fromisoformat(valeur)
+    except ValueError:
+        raise CommandError(f"Date invalide : {valeur} (format AAAA-MM-JJ).")
+
+
+class Command(BaseCommand):
+    help = "Reconstruit le résumé journalier des présences par département sur une plage de dates."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--debut', required=True, help="Premier jour AAAA-MM-JJ")
+        parser.add_argument('--fin', required=True, help="Dernier jour AAAA-MM-JJ")
+        parser.add_argument('--departement', type=int, action='append', dest='departement_ids', help="Id département (répétable)")
+
+    def handle(self, *args, **options):
+        debut = _date(options['debut'])
+        fin = _date(options['fin'])
+        if debut > fin:
+            raise CommandError("--debut doit précéder --fin.")
+
+        depart = time.monotonic()
+        lignes = remplir_resumes(debut, fin, departement_ids=options['departement_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{lignes} ligne(s) de résumé reconstruites du {debut} au {fin} ({time.monotonic() - depart:.2f}s)."
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from manage_users.rapports import verifier_rapports
+
+
+class Command(BaseCommand):
+    help = "Compare les rapports de présence d'un mois à un recalcul complet et, avec --reparer, corrige les écarts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--annee', type=int, help="Année (défaut : mois en cours)")
+        parser.add_argument('--mois', type=int, help="Mois 1-12 (défaut : mois en cours)")
+        parser.add_argument('--reparer', action='store_true', help="Recalculer les rapports en écart")
+
+    def handle(self, *args, **options):
+        aujourd_hui = timezone.localdate()
+        annee = options['annee'] or aujourd_hui.year
+        mois = options['mois'] or aujourd_hui.month
+        if not 1 <= mois <= 12:
+            raise CommandError("--mois doit être compris entre 1 et 12.")
+
+        ecarts = verifier_rapports(annee, mois, reparer=options['reparer'])
+        for ecart in ecarts:
+            details = ', '.join(f"{champ}: {stocke} -> {attendu}" for champ, (stocke, attendu) in ecart['champs'].items())
+            self.stdout.write(f"Employé {ecart['employe_id']} : {details}")
+
+        if not ecarts:
+            self.stdout.write(self.style.SUCCESS(f"Rapports {mois:02d}/{annee} conformes."))
+        elif options['reparer']:
+            self.stdout.write(self.style.SUCCESS(f"{len(ecarts)} rapport(s) {mois:02d}/{annee} réparé(s)."))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(ecarts)} rapport(s) {mois:02d}/{annee} en écart (relancer avec --reparer)."))
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:46
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Q
+
+
+def backfill_pauses_en_cours(apps, schema_editor):
+    """Reporter sur Presence les pauses ouvertes (plus de débuts que de fins)."""
+    Badgeage = apps.get_model('manage_users', 'Badgeage')
+    Presence = apps.get_model('manage_users', 'Presence')
+
+    ouvertes = (
+        Badgeage.objects.values('employe_id', 'date')
+        .annotate(
+            debuts=Count('id', filter=Q(type='pause_debut')),
+            fins=Count('id', filter=Q(type='pause_fin')),
+            dernier_debut=Max('datetime', filter=Q(type='pause_debut')),
+        )
+        .filter(debuts__gt=F('fins'))
+    )
+    for row in ouvertes:
+        Presence.objects.filter(
+            employe_id=row['employe_id'],
+            date=row['date'],
+            heure_depart__isnull=True,
+        ).update(pause_en_cours_depuis=row['dernier_debut'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manage_users', '0014_enlarge_codeqr_code_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='presence',
+            name='pause_en_cours_depuis',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_pauses_en_cours, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manage_users', '0015_presence_pause_en_cours_depuis'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='badgeage',
+            name='date',
+            field=models.DateField(db_index=True, default=django.utils.timezone.localdate),
+        ),
+        migrations.AlterField(
+            model_name='badgeage',
+            name='datetime',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
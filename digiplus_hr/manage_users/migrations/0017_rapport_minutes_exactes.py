@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+def backfill_minutes(apps, schema_editor):
+    """Dériver les minutes des heures déjà stockées (arrondies au centième)."""
+    RapportPresence = apps.get_model('manage_users', 'RapportPresence')
+    rapports = []
+    for rapport in RapportPresence.objects.iterator(chunk_size=1000):
+        rapport.total_minutes_travail = round(rapport.total_heures_travail * 60)
+        rapport.total_minutes_pauses = round(rapport.total_heures_pauses * 60)
+        rapports.append(rapport)
+    RapportPresence.objects.bulk_update(rapports, ['total_minutes_travail', 'total_minutes_pauses'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manage_users', '0016_badgeage_horodatage_explicite'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rapportpresence',
+            name='total_minutes_pauses',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='rapportpresence',
+            name='total_minutes_travail',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_minutes, migrations.RunPython.noop),
+    ]
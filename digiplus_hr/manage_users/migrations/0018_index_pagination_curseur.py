@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manage_users', '0017_rapport_minutes_exactes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='badgeage',
+            index=models.Index(fields=['-datetime', '-id'], name='mu_bdg_datetime_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='badgeage',
+            index=models.Index(fields=['employe', '-datetime', '-id'], name='mu_bdg_emp_datetime_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='demandecongeaudit',
+            index=models.Index(fields=['-date_action', '-id'], name='mu_audit_action_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['-date_envoi', '-id'], name='mu_notif_envoi_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='presence',
+            index=models.Index(fields=['-date', '-id'], name='mu_presence_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='presence',
+            index=models.Index(fields=['employe', '-date', '-id'], name='mu_presence_emp_date_id_idx'),
+        ),
+    ]
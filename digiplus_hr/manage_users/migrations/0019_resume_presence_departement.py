@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manage_users', '0018_index_pagination_curseur'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumePresenceDepartement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('statut', models.CharField(choices=[('present', 'Présent'), ('absent', 'Absent'), ('retard', 'En retard'), ('conge', 'Congé'), ('repos', 'Jour de repos')], max_length=20)),
+                ('nb_employes', models.IntegerField(default=0)),
+                ('minutes_travail', models.IntegerField(default=0)),
+                ('minutes_pauses', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('departement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumes_presence', to='manage_users.departement')),
+            ],
+            options={
+                'ordering': ['-date', 'departement', 'statut'],
+                'indexes': [models.Index(fields=['date', 'departement'], name='mu_resume_date_dep_idx')],
+                'unique_together': {('departement', 'date', 'statut')},
+            },
+        ),
+    ]
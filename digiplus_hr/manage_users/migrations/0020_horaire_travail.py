@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manage_contrat', '0003_contrat'),
+        ('manage_users', '0019_resume_presence_departement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HoraireTravail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100)),
+                ('heure_debut', models.TimeField()),
+                ('tolerance_minutes', models.PositiveIntegerField(default=0)),
+                ('jours_travail', models.CharField(default='0,1,2,3,4', max_length=20)),
+                ('actif', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('contrat', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='horaires', to='manage_contrat.contrat')),
+                ('poste', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='horaires', to='manage_users.poste')),
+            ],
+            options={
+                'ordering': ['nom'],
+                'constraints': [models.CheckConstraint(condition=models.Q(('poste__isnull', False), ('contrat__isnull', False), _connector='OR'), name='horaire_poste_ou_contrat')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manage_users', '0020_horaire_travail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendrierTravail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100, unique=True)),
+                ('jours_repos', models.CharField(default='5,6', max_length=20)),
+                ('par_defaut', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['nom'],
+            },
+        ),
+        migrations.AddField(
+            model_name='departement',
+            name='calendrier',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='departements', to='manage_users.calendriertravail'),
+        ),
+        migrations.CreateModel(
+            name='JourFerie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True)),
+                ('libelle', models.CharField(max_length=150)),
+                ('calendrier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jours_feries', to='manage_users.calendriertravail')),
+            ],
+            options={
+                'ordering': ['date'],
+                'unique_together': {('calendrier', 'date')},
+            },
+        ),
+    ]
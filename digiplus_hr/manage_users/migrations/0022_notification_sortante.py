@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:52
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manage_users', '0021_calendrier_travail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationSortante',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('groupe', models.CharField(max_length=150)),
+                ('contenu', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('disponible_a', models.DateTimeField(default=django.utils.timezone.now)),
+                ('tentatives', models.PositiveIntegerField(default=0)),
+                ('derniere_erreur', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['disponible_a', 'id'], name='mu_outbox_dispo_idx')],
+            },
+        ),
+    ]
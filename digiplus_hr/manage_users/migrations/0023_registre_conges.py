@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manage_users', '0022_notification_sortante'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MouvementConge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('annee', models.PositiveSmallIntegerField()),
+                ('type_conge', models.CharField(choices=[('annuel', 'Congé annuel'), ('maladie', 'Congé maladie'), ('sans_solde', 'Congé sans solde')], max_length=50)),
+                ('nature', models.CharField(choices=[('acquisition', 'Acquisition'), ('consommation', 'Consommation'), ('annulation', 'Annulation'), ('ajustement', 'Ajustement')], max_length=20)),
+                ('jours', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('libelle', models.CharField(blank=True, default='', max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('demande_conge', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mouvements_conge', to='manage_users.demandeconge')),
+                ('employe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mouvements_conge', to='manage_users.employe')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['employe', 'annee', 'type_conge'], name='mu_mvt_conge_solde_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SoldeConge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('annee', models.PositiveSmallIntegerField()),
+                ('type_conge', models.CharField(choices=[('annuel', 'Congé annuel'), ('maladie', 'Congé maladie'), ('sans_solde', 'Congé sans solde')], max_length=50)),
+                ('acquis', models.DecimalField(decimal_places=2, default=0, max_digits=7)),
+                ('consommes', models.DecimalField(decimal_places=2, default=0, max_digits=7)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('employe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='soldes_conge', to='manage_users.employe')),
+            ],
+            options={
+                'ordering': ['employe', 'annee', 'type_conge'],
+                'constraints': [models.UniqueConstraint(fields=('employe', 'annee', 'type_conge'), name='mu_solde_conge_unique')],
+            },
+        ),
+    ]
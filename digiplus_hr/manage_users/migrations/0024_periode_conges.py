@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:08
+
+from django.db import migrations, models
+
+INDEX_GIST = 'mu_conge_periode_gist_idx'
+
+
+def creer_index_periode(apps, schema_editor):
+    # Index de plages (opérateur &&) : PostgreSQL uniquement, SQLite garde l'index B-tree
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {INDEX_GIST} ON manage_users_demandeconge "
+        "USING gist (daterange(date_debut, date_fin, '[]')) "
+        "WHERE statut IN ('en_attente', 'approuve')"
+    )
+
+
+def supprimer_index_periode(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX_GIST}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manage_users', '0023_registre_conges'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='demandeconge',
+            index=models.Index(fields=['employe', 'date_debut', 'date_fin'], name='mu_conge_employe_periode_idx'),
+        ),
+        migrations.RunPython(creer_index_periode, supprimer_index_periode),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def remplir_destinataires(apps, schema_editor):
+    # Un seul UPDATE ... SET destinataire_id = (sous-requête) pour l'historique
+    Notification = apps.get_model('manage_users', 'Notification')
+    DemandeConge = apps.get_model('manage_users', 'DemandeConge')
+    Notification.objects.filter(destinataire__isnull=True).update(
+        destinataire_id=Subquery(
+            DemandeConge.objects.filter(pk=OuterRef('demande_conge_id')).values('employe__user_id')[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manage_users', '0024_periode_conges'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='destinataire',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(remplir_destinataires, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['destinataire', '-date_envoi', '-id'], name='mu_notif_dest_envoi_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['destinataire', 'lu', '-date_envoi'], name='mu_notif_dest_lu_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:02
+
+from django.db import migrations
+
+CONTRAINTE = 'mu_conge_sans_chevauchement'
+STATUTS_ACTIFS = "('en_attente', 'approuve')"
+
+
+def creer_contrainte(apps, schema_editor):
+    # Contrainte d'exclusion : PostgreSQL uniquement (btree_gist pour l'égalité sur employe_id)
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT a.id, b.id FROM manage_users_demandeconge a "
+            "JOIN manage_users_demandeconge b ON a.employe_id = b.employe_id AND a.id < b.id "
+            "AND a.date_debut <= b.date_fin AND b.date_debut <= a.date_fin "
+            f"WHERE a.statut IN {STATUTS_ACTIFS} AND b.statut IN {STATUTS_ACTIFS} "
+            "ORDER BY a.id, b.id LIMIT 20"
+        )
+        conflits = cursor.fetchall()
+    if conflits:
+        paires = ', '.join(f"#{a}/#{b}" for a, b in conflits)
+        raise RuntimeError(
+            f"Demandes de congé actives qui se recouvrent ({paires}) : "
+            "rejeter ou corriger l'une de chaque paire avant d'appliquer cette migration."
+        )
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    schema_editor.execute(
+        f"ALTER TABLE manage_users_demandeconge ADD CONSTRAINT {CONTRAINTE} "
+        "EXCLUDE USING gist (employe_id WITH =, daterange(date_debut, date_fin, '[]') WITH &&) "
+        f"WHERE (statut IN {STATUTS_ACTIFS})"
+    )
+
+
+def supprimer_contrainte(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f"ALTER TABLE manage_users_demandeconge DROP CONSTRAINT IF EXISTS {CONTRAINTE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manage_users', '0025_notification_destinataire'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_contrainte, supprimer_contrainte),
+    ]
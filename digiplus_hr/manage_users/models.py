@@ -1,11 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils import timezone
 from datetime import timedelta
 import random
 import secrets
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -80,10 +80,45 @@ class OTP(models.Model):
     class Meta:
         ordering = ['-created_at']
 
+class CalendrierTravail(models.Model):
+    """Jours de repos hebdomadaires d'un site ; les jours fériés s'y ajoutent."""
+    nom = models.CharField(max_length=100, unique=True)
+    # Jours de repos, 0 = lundi : "5,6"
+    jours_repos = models.CharField(max_length=20, default='5,6')
+    # Calendrier des employés dont le département n'en désigne aucun
+    par_defaut = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.nom
+
+    def repos(self):
+        return frozenset(int(jour) for jour in self.jours_repos.split(',') if jour.strip())
+
+    class Meta:
+        ordering = ['nom']
+
+
+class JourFerie(models.Model):
+    """Jour férié d'un calendrier, ou de tous les calendriers si `calendrier` est vide."""
+    calendrier = models.ForeignKey(CalendrierTravail, on_delete=models.CASCADE, null=True, blank=True, related_name='jours_feries')
+    date = models.DateField(db_index=True)
+    libelle = models.CharField(max_length=150)
+
+    def __str__(self):
+        return f"{self.date} - {self.libelle}"
+
+    class Meta:
+        ordering = ['date']
+        unique_together = ['calendrier', 'date']
+
+
 class Departement(models.Model):
     nom = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
     chef_departement = models.OneToOneField('Employe', on_delete=models.SET_NULL, null=True, blank=True, related_name='departement_manage')
+    calendrier = models.ForeignKey(CalendrierTravail, on_delete=models.SET_NULL, null=True, blank=True, related_name='departements')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -128,6 +163,24 @@ class Employe(models.Model):
     
     def __str__(self):
         return f"{self.matricule} - {self.user.get_full_name()}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Poste chargé : les tables des horaires et des calendriers ne sont rechargées que s'il change
+        if 'poste_id' in instance.__dict__:
+            instance._poste_initial = instance.poste_id
+        return instance
+
+    def poste_modifie(self, created=False, update_fields=None):
+        """Vrai si la sauvegarde qui vient d'avoir lieu a pu changer le poste."""
+        if update_fields is not None and not {'poste', 'poste_id'} & set(update_fields):
+            return False
+        if created:
+            return self.poste_id is not None
+        if not hasattr(self, '_poste_initial'):
+            return True
+        return self._poste_initial != self.poste_id
     
 class DemandeConge(models.Model):
     STATUT_CHOICES = [
@@ -151,6 +204,20 @@ class DemandeConge(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Chevauchements d'un employé (sur PostgreSQL, index GiST de période en plus, voir absences.py)
+            models.Index(fields=['employe', 'date_debut', 'date_fin'], name='mu_conge_employe_periode_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Statut chargé : base du compteur temps réel des demandes en attente
+        if 'statut' in instance.__dict__:
+            instance._statut_initial = instance.statut
+        return instance
+
     def approuver(self, admin=None, raison='', **extra_fields):
         """Approuver la demande de congé et créer notification persistante + temps réel.
         
@@ -159,46 +226,40 @@ class DemandeConge(models.Model):
             raison: Raison optionnelle de l'approbation
             **extra_fields: champs additionnels à mettre à jour (ex: description)
         """
+        from .diffusion import mettre_en_file
+
         self.statut = 'approuve'
         for key, value in extra_fields.items():
             if hasattr(self, key):
                 setattr(self, key, value)
-        self.save()
-        
-        # Créer notification pour l'employé
-        Notification.objects.create(
-            demande_conge=self,
-            titre='Congé approuvé',
-            message=f'Votre demande de congé du {self.date_debut} au {self.date_fin} a été approuvée.'
-        )
-        
-        # Créer audit log
-        if admin:
-            DemandeCongeAudit.objects.create(
+
+        with transaction.atomic():
+            self.save()
+
+            # Créer notification pour l'employé
+            Notification.objects.create(
                 demande_conge=self,
-                admin=admin,
-                action='approuve',
-                raison=raison
+                destinataire_id=self.employe.user_id,
+                titre='Congé approuvé',
+                message=f'Votre demande de congé du {self.date_debut} au {self.date_fin} a été approuvée.'
             )
-        
-        # Envoi notification temps réel via Channels au propriétaire
-        try:
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                f"user_{self.employe.user.id}",
-                {
-                    "type": "send_notification",
-                    "content": {
-                        "titre": "Congé approuvé",
-                        "message": f"Votre demande du {self.date_debut} au {self.date_fin} a été approuvée.",
-                        "demande_id": self.id,
-                        "statut": self.statut,
-                    }
-                }
-            )
-        except Exception:
-            # Ne pas faire échouer la logique principale si Channels n'est pas configuré
-            pass
+
+            # Créer audit log
+            if admin:
+                DemandeCongeAudit.objects.create(
+                    demande_conge=self,
+                    admin=admin,
+                    action='approuve',
+                    raison=raison
+                )
+
+            # Notification temps réel au propriétaire, envoyée après validation (outbox)
+            mettre_en_file(f"user_{self.employe.user_id}", {
+                "titre": "Congé approuvé",
+                "message": f"Votre demande du {self.date_debut} au {self.date_fin} a été approuvée.",
+                "demande_id": self.id,
+                "statut": self.statut,
+            })
 
     def rejeter(self, admin=None, raison='', **extra_fields):
         """Rejeter la demande de congé et créer notification persistante + temps réel.
@@ -208,50 +269,44 @@ class DemandeConge(models.Model):
             raison: Raison du rejet
             **extra_fields: champs additionnels à mettre à jour (ex: description)
         """
+        from .diffusion import mettre_en_file
+
         self.statut = 'rejete'
         for key, value in extra_fields.items():
             if hasattr(self, key):
                 setattr(self, key, value)
-        self.save()
-        
+
         # Créer notification pour l'employé
         message = f'Votre demande de congé du {self.date_debut} au {self.date_fin} a été rejetée.'
         if raison:
             message += f'\n\nRaison: {raison}'
-        
-        Notification.objects.create(
-            demande_conge=self,
-            titre='Congé rejeté',
-            message=message
-        )
-        
-        # Créer audit log
-        if admin:
-            DemandeCongeAudit.objects.create(
+
+        with transaction.atomic():
+            self.save()
+
+            Notification.objects.create(
                 demande_conge=self,
-                admin=admin,
-                action='rejete',
-                raison=raison
+                destinataire_id=self.employe.user_id,
+                titre='Congé rejeté',
+                message=message
             )
-        
-        # Envoi notification temps réel via Channels au propriétaire
-        try:
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                f"user_{self.employe.user.id}",
-                {
-                    "type": "send_notification",
-                    "content": {
-                        "titre": "Congé rejeté",
-                        "message": f"Votre demande du {self.date_debut} au {self.date_fin} a été rejetée." + (f"\n\nRaison: {raison}" if raison else ""),
-                        "demande_id": self.id,
-                        "statut": self.statut,
-                    }
-                }
-            )
-        except Exception:
-            # Ne pas faire échouer la logique principale si Channels n'est pas configuré
-            pass
+
+            # Créer audit log
+            if admin:
+                DemandeCongeAudit.objects.create(
+                    demande_conge=self,
+                    admin=admin,
+                    action='rejete',
+                    raison=raison
+                )
+
+            # Notification temps réel au propriétaire, envoyée après validation (outbox)
+            mettre_en_file(f"user_{self.employe.user_id}", {
+                "titre": "Congé rejeté",
+                "message": f"Votre demande du {self.date_debut} au {self.date_fin} a été rejetée." + (f"\n\nRaison: {raison}" if raison else ""),
+                "demande_id": self.id,
+                "statut": self.statut,
+            })
 
     def __str__(self):
         return f"{self.employe.matricule} - {self.type_conge} ({self.statut})"
@@ -259,11 +314,35 @@ class DemandeConge(models.Model):
 
 class Notification(models.Model):
     demande_conge = models.ForeignKey(DemandeConge, on_delete=models.CASCADE, related_name='notifications')
+    # Dénormalisé depuis demande_conge.employe.user : listes et compteurs sans jointure
+    destinataire = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
     titre = models.CharField(max_length=200)
     message = models.TextField()
     date_envoi = models.DateTimeField(auto_now_add=True)
     lu = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Pagination par curseur (date_envoi, id)
+            models.Index(fields=['-date_envoi', '-id'], name='mu_notif_envoi_id_idx'),
+            # Liste d'un destinataire par curseur, et comptage de ses non lues
+            models.Index(fields=['destinataire', '-date_envoi', '-id'], name='mu_notif_dest_envoi_idx'),
+            models.Index(fields=['destinataire', 'lu', '-date_envoi'], name='mu_notif_dest_lu_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # État lu chargé : base du compteur de non lues
+        if 'lu' in instance.__dict__:
+            instance._lu_initial = instance.lu
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self.destinataire_id is None and self.demande_conge_id is not None:
+            self.destinataire_id = self.demande_conge.employe.user_id
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Notification: {self.titre} pour {self.demande_conge.employe.matricule}"
 
@@ -284,11 +363,95 @@ class DemandeCongeAudit(models.Model):
     
     class Meta:
         ordering = ['-date_action']
+        indexes = [
+            models.Index(fields=['-date_action', '-id'], name='mu_audit_action_id_idx'),
+        ]
     
     def __str__(self):
         return f"{self.demande_conge.employe.matricule} - {self.action} par {self.admin.email}"
 
 
+class MouvementConge(models.Model):
+    """Écriture du registre des congés : jours crédités (> 0) ou débités (< 0).
+
+    Le registre n'est jamais réécrit : une demande approuvée puis rejetée ou
+    supprimée reçoit une écriture d'annulation. SoldeConge en est la somme.
+    """
+    NATURE_CHOICES = [
+        ('acquisition', 'Acquisition'),
+        ('consommation', 'Consommation'),
+        ('annulation', 'Annulation'),
+        ('ajustement', 'Ajustement'),
+    ]
+
+    employe = models.ForeignKey('Employe', on_delete=models.CASCADE, related_name='mouvements_conge')
+    annee = models.PositiveSmallIntegerField()
+    type_conge = models.CharField(max_length=50, choices=DemandeConge.TYPE_CONGE_CHOICES)
+    nature = models.CharField(max_length=20, choices=NATURE_CHOICES)
+    jours = models.DecimalField(max_digits=6, decimal_places=2)
+    demande_conge = models.ForeignKey(
+        DemandeConge, on_delete=models.SET_NULL, null=True, blank=True, related_name='mouvements_conge'
+    )
+    libelle = models.CharField(max_length=200, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['employe', 'annee', 'type_conge'], name='mu_mvt_conge_solde_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.employe.matricule} {self.annee} {self.type_conge} {self.nature} {self.jours:+}"
+
+
+class SoldeConge(models.Model):
+    """Solde matérialisé par (employé, année, type de congé), tenu à jour par soldes.py."""
+    employe = models.ForeignKey('Employe', on_delete=models.CASCADE, related_name='soldes_conge')
+    annee = models.PositiveSmallIntegerField()
+    type_conge = models.CharField(max_length=50, choices=DemandeConge.TYPE_CONGE_CHOICES)
+    acquis = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    consommes = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['employe', 'annee', 'type_conge']
+        constraints = [
+            models.UniqueConstraint(fields=['employe', 'annee', 'type_conge'], name='mu_solde_conge_unique'),
+        ]
+
+    @property
+    def solde(self):
+        return self.acquis - self.consommes
+
+    def __str__(self):
+        return f"{self.employe.matricule} {self.annee} {self.type_conge} : {self.solde}"
+
+
+class NotificationSortante(models.Model):
+    """Message temps réel en attente d'envoi (outbox), écrit dans la transaction métier.
+
+    Le diffuseur (diffusion.vider_file) le publie sur le groupe Channels après
+    validation puis le supprime ; sans accusé, il est repris à `disponible_a`.
+    """
+    groupe = models.CharField(max_length=150)
+    contenu = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Prochaine tentative : réservation en cours ou attente après un échec
+    disponible_a = models.DateTimeField(default=timezone.now)
+    tentatives = models.PositiveIntegerField(default=0)
+    derniere_erreur = models.TextField(blank=True, default='')
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['disponible_a', 'id'], name='mu_outbox_dispo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.groupe} #{self.pk} ({self.tentatives} tentative(s))"
+
+
 class CodeQR(models.Model):
     code_unique = models.CharField(max_length=512, unique=True, db_index=True)
     qr_code_image = models.ImageField(upload_to='qr_codes/', blank=True, null=True)
@@ -300,8 +463,19 @@ class CodeQR(models.Model):
     class Meta:
         ordering = ['-date_generation']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Mémoriser le code chargé pour invalider son cache s'il est remplacé
+        instance._code_unique_initial = instance.__dict__.get('code_unique')
+        return instance
+
     @staticmethod
-    def generate_unique_code():
+    def generate_unique_code(employe_id=None):
+        # Jeton compact signé dès que l'employé est connu ; format historique sinon
+        if employe_id is not None:
+            from .qr_utils import generer_jeton
+            return generer_jeton(employe_id)
         return secrets.token_urlsafe(256)
 
     def __str__(self):
@@ -318,8 +492,8 @@ class Badgeage(models.Model):
 
     employe = models.ForeignKey(Employe, on_delete=models.CASCADE, related_name='badgeages')
     type = models.CharField(max_length=20, choices=TYPE_CHOICES)
-    datetime = models.DateTimeField(auto_now_add=True)
-    date = models.DateField(auto_now_add=True, db_index=True)
+    datetime = models.DateTimeField(default=timezone.now)
+    date = models.DateField(default=timezone.localdate, db_index=True)
     localisation_latitude = models.FloatField(blank=True, null=True)
     localisation_longitude = models.FloatField(blank=True, null=True)
     adresse_localisation = models.CharField(max_length=255, blank=True, null=True)
@@ -330,6 +504,9 @@ class Badgeage(models.Model):
         indexes = [
             models.Index(fields=['employe', 'date'], name='mu_emp_date_bdg_idx'),
             models.Index(fields=['date'], name='manage_user_badge_date_idx'),
+            # Pagination par curseur (datetime, id), globale et par employé
+            models.Index(fields=['-datetime', '-id'], name='mu_bdg_datetime_id_idx'),
+            models.Index(fields=['employe', '-datetime', '-id'], name='mu_bdg_emp_datetime_id_idx'),
         ]
 
     def __str__(self):
@@ -353,6 +530,7 @@ class Presence(models.Model):
     duree_travail_minutes = models.IntegerField(default=0)
     nb_pauses = models.IntegerField(default=0)
     duree_pauses_minutes = models.IntegerField(default=0)
+    pause_en_cours_depuis = models.DateTimeField(blank=True, null=True)
     remarques = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -363,8 +541,23 @@ class Presence(models.Model):
         indexes = [
             models.Index(fields=['employe', 'date'], name='manage_user_employe_date_idx'),
             models.Index(fields=['date', 'statut'], name='manage_user_date_statut_idx'),
+            models.Index(fields=['-date', '-id'], name='mu_presence_date_id_idx'),
+            models.Index(fields=['employe', '-date', '-id'], name='mu_presence_emp_date_id_idx'),
         ]
 
+    CHAMPS_RAPPORT = ('employe_id', 'date', 'statut', 'duree_travail_minutes', 'duree_pauses_minutes')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # État chargé : base des deltas appliqués à RapportPresence après save
+        if all(champ in instance.__dict__ for champ in cls.CHAMPS_RAPPORT):
+            instance._etat_initial = instance.etat_rapport()
+        return instance
+
+    def etat_rapport(self):
+        return tuple(getattr(self, champ) for champ in self.CHAMPS_RAPPORT)
+
     def __str__(self):
         return f"{self.employe.matricule} - {self.date} - {self.statut}"
 
@@ -381,6 +574,9 @@ class RapportPresence(models.Model):
     total_jours_repos = models.IntegerField(default=0)
     total_heures_travail = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total_heures_pauses = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Cumuls exacts en minutes : les heures en sont dérivées, les deltas s'y appliquent sans arrondi
+    total_minutes_travail = models.IntegerField(default=0)
+    total_minutes_pauses = models.IntegerField(default=0)
     observations = models.TextField(blank=True, null=True)
     generated_at = models.DateTimeField(auto_now=True)
 
@@ -394,3 +590,193 @@ class RapportPresence(models.Model):
     def __str__(self):
         return f"{self.employe.matricule} - {self.mois}/{self.annee}"
 
+
+class HoraireTravail(models.Model):
+    """Horaire de référence d'un poste ou d'un contrat (le contrat prime)."""
+    nom = models.CharField(max_length=100)
+    poste = models.ForeignKey(Poste, on_delete=models.CASCADE, null=True, blank=True, related_name='horaires')
+    contrat = models.ForeignKey('manage_contrat.Contrat', on_delete=models.CASCADE, null=True, blank=True, related_name='horaires')
+    heure_debut = models.TimeField()
+    tolerance_minutes = models.PositiveIntegerField(default=0)
+    # Jours travaillés, 0 = lundi : "0,1,2,3,4"
+    jours_travail = models.CharField(max_length=20, default='0,1,2,3,4')
+    actif = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['nom']
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(poste__isnull=False) | models.Q(contrat__isnull=False),
+                name='horaire_poste_ou_contrat',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.nom} ({self.heure_debut:%H:%M})"
+
+    def jours(self):
+        return frozenset(int(jour) for jour in self.jours_travail.split(',') if jour.strip())
+
+
+class ResumePresenceDepartement(models.Model):
+    """Effectifs et minutes par (département, jour, statut), maintenus à chaque écriture de Presence."""
+    departement = models.ForeignKey(Departement, on_delete=models.CASCADE, related_name='resumes_presence')
+    date = models.DateField()
+    statut = models.CharField(max_length=20, choices=Presence.STATUT_CHOICES)
+    nb_employes = models.IntegerField(default=0)
+    minutes_travail = models.IntegerField(default=0)
+    minutes_pauses = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date', 'departement', 'statut']
+        unique_together = (('departement', 'date', 'statut'),)
+        indexes = [
+            models.Index(fields=['date', 'departement'], name='mu_resume_date_dep_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.departement_id} - {self.date} - {self.statut}: {self.nb_employes}"
+
+
+@receiver(post_save, sender=HoraireTravail)
+@receiver(post_delete, sender=HoraireTravail)
+@receiver(post_save, sender='manage_contrat.Contrat')
+@receiver(post_delete, sender='manage_contrat.Contrat')
+def invalider_cache_horaires(sender, **kwargs):
+    from .horaires import invalider_horaires
+    invalider_horaires()
+
+
+@receiver(post_save, sender=Employe)
+def invalider_horaires_employe(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    # Seul le poste rattache un employé à un horaire (ceux des contrats suivent Contrat)
+    # Avant invalider_calendrier_employe, qui remet _poste_initial à jour
+    if not raw and instance.poste_modifie(created, update_fields):
+        from .horaires import invalider_horaires
+        invalider_horaires()
+
+
+@receiver(post_save, sender=CalendrierTravail)
+@receiver(post_delete, sender=CalendrierTravail)
+@receiver(post_save, sender=JourFerie)
+@receiver(post_delete, sender=JourFerie)
+@receiver(post_save, sender=Departement)
+@receiver(post_save, sender=Poste)
+def invalider_cache_calendrier(sender, **kwargs):
+    from .calendrier import invalider_calendriers
+    invalider_calendriers()
+
+
+@receiver(post_save, sender=Employe)
+def invalider_calendrier_employe(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    # Le calendrier d'un employé est celui du département de son poste
+    if not raw and instance.poste_modifie(created, update_fields):
+        from .calendrier import invalider_calendriers
+        invalider_calendriers()
+    instance._poste_initial = instance.poste_id
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalider_dashboard_user(sender, update_fields=None, **kwargs):
+    from .tableau_bord import CHAMPS_USER, invalider_statistiques
+    invalider_statistiques(update_fields, CHAMPS_USER)
+
+
+@receiver(post_save, sender=Employe)
+@receiver(post_delete, sender=Employe)
+def invalider_dashboard_employe(sender, update_fields=None, **kwargs):
+    from .tableau_bord import CHAMPS_EMPLOYE, invalider_statistiques
+    invalider_statistiques(update_fields, CHAMPS_EMPLOYE)
+
+
+@receiver(post_save, sender=Poste)
+@receiver(post_delete, sender=Poste)
+def invalider_dashboard_poste(sender, created=True, **kwargs):
+    # Seul le nombre de postes est affiché : une modification ne le change pas
+    if created:
+        from .tableau_bord import invalider_statistiques
+        invalider_statistiques()
+
+
+@receiver(post_save, sender=CodeQR)
+@receiver(post_delete, sender=CodeQR)
+def invalider_resolution_code_qr(sender, instance, **kwargs):
+    from .qr_utils import invalider_codes
+    invalider_codes([instance.code_unique, getattr(instance, '_code_unique_initial', None)])
+
+
+@receiver(post_save, sender=DemandeConge)
+def imputer_demande_conge(sender, instance, created=False, raw=False, **kwargs):
+    # Avant compter_demande_conge, qui remet _statut_initial à jour
+    if raw:
+        return
+    if instance.statut != 'approuve' and getattr(instance, '_statut_initial', None) != 'approuve':
+        return
+    from .soldes import imputer_demandes
+    imputer_demandes([instance])
+
+
+@receiver(pre_delete, sender=DemandeConge)
+def desimputer_demande_conge(sender, instance, origin=None, **kwargs):
+    # Suppression en cascade (employé, utilisateur) : le registre part avec l'employé
+    if getattr(origin, 'model', type(origin)) is not DemandeConge:
+        return
+    from .soldes import imputer_demandes
+    imputer_demandes([instance], supprimees=True)
+
+
+@receiver(post_save, sender=DemandeConge)
+def compter_demande_conge(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if not created and not hasattr(instance, '_statut_initial'):
+        return
+    from .compteurs import signaler_conge
+    signaler_conge(None if created else instance._statut_initial, instance.statut)
+    instance._statut_initial = instance.statut
+
+
+@receiver(post_delete, sender=DemandeConge)
+def decompter_demande_conge(sender, instance, **kwargs):
+    from .compteurs import signaler_conge
+    signaler_conge(getattr(instance, '_statut_initial', instance.statut), None)
+
+
+@receiver(post_save, sender=Notification)
+def compter_notification(sender, instance, created=False, raw=False, **kwargs):
+    if raw or instance.destinataire_id is None:
+        return
+    non_lue_avant = not created and not getattr(instance, '_lu_initial', instance.lu)
+    delta = (not instance.lu) - non_lue_avant
+    instance._lu_initial = instance.lu
+    if delta:
+        from .non_lues import ajuster_non_lues
+        ajuster_non_lues({instance.destinataire_id: delta})
+
+
+@receiver(post_delete, sender=Notification)
+def decompter_notification(sender, instance, **kwargs):
+    if instance.destinataire_id is None or getattr(instance, '_lu_initial', instance.lu):
+        return
+    from .non_lues import ajuster_non_lues
+    ajuster_non_lues({instance.destinataire_id: -1})
+
+
+@receiver(post_save, sender=Presence)
+def maj_rapport_presence(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    from .rapports import appliquer_deltas
+    if created:
+        instance._etat_initial = None
+    appliquer_deltas([instance])
+
+
+@receiver(post_delete, sender=Presence)
+def retirer_rapport_presence(sender, instance, **kwargs):
+    from .rapports import retirer_presences
+    retirer_presences([instance])
@@ -0,0 +1,76 @@
+"""
+Compteur de notifications non lues par utilisateur.
+
+Les clients interrogent ce nombre en permanence : il est servi depuis le
+cache partagé et n'est compté en base (index destinataire, lu) qu'en cas
+d'absence. Création, lecture (unitaire ou groupée, `marquer_lues`) et
+suppression d'une notification l'ajustent par incr après validation, puis
+la nouvelle valeur est poussée au destinataire par la file des
+notifications temps réel (diffusion.py ; trame {"type": "non_lues"}).
+
+Une clé absente n'est pas recréée par incr : la lecture suivante recompte.
+NOTIFICATIONS_NON_LUES_TTL borne la dérive en cas d'écriture concurrente à
+un recomptage.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .diffusion import mettre_en_file_lot
+from .models import Notification
+
+CACHE_PREFIXE = 'notifications:non_lues:'
+
+
+def _cle(user_id):
+    return f'{CACHE_PREFIXE}{user_id}'
+
+
+def _duree():
+    return getattr(settings, 'NOTIFICATIONS_NON_LUES_TTL', 3600)
+
+
+def compter_non_lues(user_id):
+    return Notification.objects.filter(destinataire_id=user_id, lu=False).count()
+
+
+def non_lues(user_id):
+    """Nombre de notifications non lues de l'utilisateur, depuis le cache si possible."""
+    nombre = cache.get(_cle(user_id))
+    if nombre is None:
+        nombre = compter_non_lues(user_id)
+        cache.add(_cle(user_id), nombre, _duree())
+    return nombre
+
+
+def marquer_lues(user_id, ids=None, avant=None):
+    """Marquer lues en un seul UPDATE les notifications de l'utilisateur (par ids ou jusqu'à `avant`)."""
+    notifications = Notification.objects.filter(destinataire_id=user_id, lu=False)
+    if ids is not None:
+        notifications = notifications.filter(id__in=ids)
+    if avant is not None:
+        notifications = notifications.filter(date_envoi__lte=avant)
+    with transaction.atomic():
+        # update() n'émet pas post_save : compteur ajusté explicitement
+        marquees = notifications.update(lu=True)
+        ajuster_non_lues({user_id: -marquees})
+    return marquees
+
+
+def ajuster_non_lues(deltas):
+    """Appliquer {user_id: delta} aux compteurs après validation, puis pousser les valeurs."""
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if deltas:
+        transaction.on_commit(lambda: _appliquer(deltas))
+
+
+def _appliquer(deltas):
+    for user_id, delta in deltas.items():
+        try:
+            cache.incr(_cle(user_id), delta)
+        except ValueError:
+            pass
+    mettre_en_file_lot([
+        (f"user_{user_id}", {"type": "non_lues", "non_lues": non_lues(user_id)})
+        for user_id in deltas
+    ])
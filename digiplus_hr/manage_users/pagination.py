@@ -0,0 +1,116 @@
+"""
+Pagination par curseur (keyset) pour les listes d'événements volumineuses.
+
+La page suivante est désignée par la clé (horodatage, id) du dernier élément
+renvoyé : la requête devient `WHERE (ts, id) < (t, i) ORDER BY ts DESC, id DESC
+LIMIT n`, servie par un index composite, au même coût en page 1 et en page 500.
+Le COUNT(*) n'est exécuté que sur demande (?total=1).
+
+Activation par la vue : `pagination_class = PaginationCurseur` et
+`ordre_curseur = 'champ_horodatage'`. Sans ?page_size, la première page
+compte `taille_defaut` éléments : aucune liste n'est renvoyée sans borne.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class PaginationCurseur(BasePagination):
+    curseur_param = 'curseur'
+    taille_param = 'page_size'
+    total_param = 'total'
+    taille_defaut = 50
+    taille_max = 500
+
+    def _taille(self, request):
+        valeur = request.query_params.get(self.taille_param)
+        if not valeur:
+            return self.taille_defaut
+        try:
+            taille = int(valeur)
+        except ValueError:
+            raise ValidationError({self.taille_param: "Entier attendu."})
+        return max(1, min(taille, self.taille_max))
+
+    def _encoder(self, horodatage, pk):
+        brut = json.dumps([horodatage.isoformat(), pk]).encode('utf-8')
+        return base64.urlsafe_b64encode(brut).decode('ascii')
+
+    def _decoder(self, curseur, champ):
+        try:
+            horodatage, pk = json.loads(base64.urlsafe_b64decode(curseur.encode('ascii')))
+            return champ.to_python(horodatage), int(pk)
+        except Exception:
+            raise ValidationError({self.curseur_param: "Curseur invalide."})
+
+    def paginate_queryset(self, queryset, request, view=None):
+        curseur = request.query_params.get(self.curseur_param)
+        self.request = request
+        nom_champ = getattr(view, 'ordre_curseur')
+        champ = queryset.model._meta.get_field(nom_champ)
+        self.taille = self._taille(request)
+
+        total = request.query_params.get(self.total_param)
+        if total is None:
+            avec_total = getattr(settings, 'PAGINATION_CURSEUR_TOTAL', False)
+        else:
+            avec_total = total.lower() in ('1', 'true', 'oui')
+        self.total = queryset.count() if avec_total else None
+
+        queryset = queryset.order_by(f'-{nom_champ}', '-pk')
+        if curseur:
+            horodatage, pk = self._decoder(curseur, champ)
+            queryset = queryset.filter(Q(**{f'{nom_champ}__lt': horodatage}) | Q(**{nom_champ: horodatage, 'pk__lt': pk}))
+
+        elements = list(queryset[:self.taille + 1])
+        self.suivant = None
+        if len(elements) > self.taille:
+            elements = elements[:self.taille]
+            dernier = elements[-1]
+            self.suivant = self._encoder(getattr(dernier, nom_champ), dernier.pk)
+        return elements
+
+    def get_next_link(self):
+        if self.suivant is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.curseur_param, self.suivant)
+        return replace_query_param(url, self.taille_param, self.taille)
+
+    def get_paginated_response(self, data):
+        contenu = {
+            'next': self.get_next_link(),
+            'curseur_suivant': self.suivant,
+            'results': data,
+        }
+        if self.total is not None:
+            contenu['count'] = self.total
+        return Response(contenu)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'curseur_suivant': {'type': 'string', 'nullable': True},
+                'count': {'type': 'integer'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': self.curseur_param, 'required': False, 'in': 'query', 'schema': {'type': 'string'},
+             'description': "Curseur de la page suivante (curseur_suivant)."},
+            {'name': self.taille_param, 'required': False, 'in': 'query', 'schema': {'type': 'integer'},
+             'description': f"Taille de page (max {self.taille_max})."},
+            {'name': self.total_param, 'required': False, 'in': 'query', 'schema': {'type': 'boolean'},
+             'description': "Inclure le nombre total d'éléments (COUNT)."},
+        ]
@@ -0,0 +1,151 @@
+"""
+Clôture des journées de présence.
+
+Une ligne Presence n'existe que si l'employé a badgé. La clôture complète une
+plage de dates : les jours sans ligne deviennent `conge` (demande approuvée),
+`repos` (jour non ouvré selon le calendrier de l'employé) ou `absent`, et les journées restées ouvertes
+(arrivée sans départ) sont fermées à PRESENCE_HEURE_CLOTURE. Tout se fait en
+quelques requêtes ensemblistes, quel que soit l'effectif.
+"""
+import datetime
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .badgeage import PRESENCE_CHAMPS_ETAT, appliquer_badgeage
+from .calendrier import calendriers_de, est_jour_ouvre
+from .models import DemandeConge, Employe, Presence
+from .rapports import appliquer_deltas, recalculer_rapports
+from .resumes import recalculer_resumes
+
+TAILLE_LOT = 1000
+STATUTS_EMPLOYE_EXCLUS = ('inactif', 'suspendu')
+REMARQUE_CLOTURE = 'Clôture automatique (départ non pointé).'
+
+
+def jours_entre(debut, fin):
+    jour = debut
+    while jour <= fin:
+        yield jour
+        jour += datetime.timedelta(days=1)
+
+
+def heure_cloture():
+    valeur = getattr(settings, 'PRESENCE_HEURE_CLOTURE', '18:00')
+    if isinstance(valeur, datetime.time):
+        return valeur
+    return datetime.datetime.strptime(valeur, '%H:%M').time()
+
+
+def _jours_conge(employe_ids, debut, fin):
+    """Ensemble (employe_id, date) couvert par une demande approuvée dans la plage."""
+    jours = set()
+    demandes = DemandeConge.objects.filter(
+        employe_id__in=employe_ids,
+        statut='approuve',
+        date_debut__lte=fin,
+        date_fin__gte=debut,
+    ).values_list('employe_id', 'date_debut', 'date_fin')
+    for employe_id, date_debut, date_fin in demandes:
+        for jour in jours_entre(max(date_debut, debut), min(date_fin, fin)):
+            jours.add((employe_id, jour))
+    return jours
+
+
+def completer_presences(debut, fin, employe_ids=None):
+    """Créer en masse les Presence manquantes de la plage ; retourne un compteur par statut."""
+    employes = Employe.objects.exclude(statut__in=STATUTS_EMPLOYE_EXCLUS)
+    if employe_ids:
+        employes = employes.filter(id__in=employe_ids)
+    embauches = dict(employes.values_list('id', 'date_embauche'))
+    if not embauches:
+        return Counter()
+
+    existantes = defaultdict(set)
+    for employe_id, jour in Presence.objects.filter(
+        employe_id__in=embauches, date__range=(debut, fin),
+    ).values_list('employe_id', 'date'):
+        existantes[jour].add(employe_id)
+    conges = _jours_conge(embauches, debut, fin)
+
+    crees = Counter()
+    a_creer = []
+    calendriers = calendriers_de(embauches)
+    for jour in jours_entre(debut, fin):
+        ouvres = {calendrier_id: est_jour_ouvre(jour, calendrier_id) for calendrier_id in set(calendriers.values())}
+        for employe_id, date_embauche in embauches.items():
+            if (date_embauche and date_embauche > jour) or employe_id in existantes[jour]:
+                continue
+            if (employe_id, jour) in conges:
+                statut = 'conge'
+            elif not ouvres[calendriers[employe_id]]:
+                statut = 'repos'
+            else:
+                statut = 'absent'
+            a_creer.append(Presence(employe_id=employe_id, date=jour, statut=statut))
+            crees[statut] += 1
+            if len(a_creer) >= TAILLE_LOT:
+                _inserer(a_creer)
+                a_creer = []
+    _inserer(a_creer)
+    return crees
+
+
+def _inserer(presences):
+    # Un scan concurrent peut avoir créé la ligne entre-temps : on la garde. Les
+    # lignes réellement insérées étant inconnues, les rapports touchés sont recalculés.
+    Presence.objects.bulk_create(presences, ignore_conflicts=True)
+    paires = {(presence.employe_id, presence.date) for presence in presences}
+    recalculer_rapports(paires)
+    recalculer_resumes(paires)
+
+
+def fermer_journees_ouvertes(debut, fin, employe_ids=None):
+    """Fermer à l'heure de clôture les journées avec arrivée mais sans départ."""
+    ouvertes = Presence.objects.filter(
+        date__range=(debut, fin),
+        heure_arrivee__isnull=False,
+        heure_depart__isnull=True,
+    )
+    if employe_ids:
+        ouvertes = ouvertes.filter(employe_id__in=employe_ids)
+
+    cloture = heure_cloture()
+    champs = PRESENCE_CHAMPS_ETAT + ['remarques']
+    maintenant = timezone.now()
+    fermees = 0
+    lot = []
+    with transaction.atomic():
+        for presence in ouvertes.select_for_update().iterator(chunk_size=TAILLE_LOT):
+            moment = timezone.make_aware(datetime.datetime.combine(presence.date, max(cloture, presence.heure_arrivee)))
+            if presence.pause_en_cours_depuis is not None:
+                # Pause bornée au départ calculé : nulle si elle a commencé après
+                appliquer_badgeage(presence, 'pause_fin', moment)
+            appliquer_badgeage(presence, 'depart', moment)
+            presence.remarques = '\n'.join(filter(None, [presence.remarques, REMARQUE_CLOTURE]))
+            presence.updated_at = maintenant
+            lot.append(presence)
+            if len(lot) >= TAILLE_LOT:
+                Presence.objects.bulk_update(lot, champs)
+                appliquer_deltas(lot)
+                fermees += len(lot)
+                lot = []
+        Presence.objects.bulk_update(lot, champs)
+        appliquer_deltas(lot)
+    return fermees + len(lot)
+
+
+def cloturer_presences(debut, fin, employe_ids=None):
+    """Compléter puis fermer les journées de `debut` à `fin` (au plus hier).
+
+    La journée en cours n'est jamais touchée : un employé peut encore badger.
+    """
+    fin = min(fin, timezone.localdate() - datetime.timedelta(days=1))
+    if debut > fin:
+        return {'debut': debut, 'fin': fin, 'crees': {}, 'fermees': 0}
+
+    crees = completer_presences(debut, fin, employe_ids)
+    fermees = fermer_journees_ouvertes(debut, fin, employe_ids)
+    return {'debut': debut, 'fin': fin, 'crees': dict(crees), 'fermees': fermees}
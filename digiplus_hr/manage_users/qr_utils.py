@@ -0,0 +1,384 @@
+"""
+Outils autour des codes QR de badgeage.
+
+Les codes émis sont des jetons compacts signés : `DP1.<employe>.<nonce>.<hmac>`
+(~35 caractères au lieu de ~342), vérifiables sans accès à la base. Les codes
+historiques (token_urlsafe(256)) restent acceptés tant que
+CODEQR_CODES_HISTORIQUES_ACCEPTES est vrai.
+
+La résolution code -> employé est mise en cache sous une empreinte du jeton :
+un scan en régime établi ne touche plus l'index unique de CodeQR.
+
+Ce module n'importe pas les modèles au chargement : `rendre_png` doit rester
+utilisable depuis les processus du pool de pré-génération.
+"""
+import base64
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import secrets
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import qrcode
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.http import base36_to_int, int_to_base36
+
+CACHE_PREFIX = 'codeqr:resolution:'
+
+JETON_VERSION = 'DP1'
+JETON_SEL = 'manage_users.CodeQR.jeton'
+JETON_SIGNATURE_OCTETS = 12
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+_svg_lock = threading.Lock()
+_svg_lru = OrderedDict()
+
+
+def _b64(octets):
+    return base64.urlsafe_b64encode(octets).rstrip(b'=').decode('ascii')
+
+
+def _signature(version, employe_part, nonce):
+    cle = getattr(settings, 'CODEQR_SIGNING_KEY', None) or settings.SECRET_KEY
+    mac = salted_hmac(JETON_SEL, f"{version}.{employe_part}.{nonce}", secret=cle, algorithm='sha256')
+    return _b64(mac.digest()[:JETON_SIGNATURE_OCTETS])
+
+
+def generer_jeton(employe_id):
+    """Jeton compact signé pour un employé ; le nonce le rend unique."""
+    employe_part = int_to_base36(int(employe_id))
+    nonce = _b64(secrets.token_bytes(6))
+    signature = _signature(JETON_VERSION, employe_part, nonce)
+    return f"{JETON_VERSION}.{employe_part}.{nonce}.{signature}"
+
+
+def est_jeton_compact(code_unique):
+    return code_unique.startswith(JETON_VERSION + '.')
+
+
+def verifier_jeton(code_unique):
+    """Retourner l'id employé d'un jeton compact authentique, None sinon."""
+    parties = code_unique.split('.')
+    if len(parties) != 4 or parties[0] != JETON_VERSION:
+        return None
+    version, employe_part, nonce, signature = parties
+    if not constant_time_compare(signature, _signature(version, employe_part, nonce)):
+        return None
+    try:
+        return base36_to_int(employe_part)
+    except ValueError:
+        return None
+
+
+def jeton_recevable(code_unique):
+    """Contrôle hors base : signature des jetons compacts, politique des codes historiques."""
+    if est_jeton_compact(code_unique):
+        return verifier_jeton(code_unique) is not None
+    return getattr(settings, 'CODEQR_CODES_HISTORIQUES_ACCEPTES', True)
+
+
+def code_digest(code_unique):
+    return hashlib.sha256(code_unique.encode('utf-8')).hexdigest()
+
+
+def _cache_key(code_unique):
+    return CACHE_PREFIX + code_digest(code_unique)
+
+
+def _compter(cle):
+    with _stats_lock:
+        _stats[cle] += 1
+
+
+def resoudre_code(code_unique):
+    """Retourner (employe_id, user_id) pour un code actif, None sinon."""
+    from .models import CodeQR
+
+    # Un jeton forgé ou mal formé est rejeté avant tout accès au cache ou à la base
+    if not jeton_recevable(code_unique):
+        return None
+    employe_jeton = verifier_jeton(code_unique) if est_jeton_compact(code_unique) else None
+
+    key = _cache_key(code_unique)
+    entree = cache.get(key)
+    if entree is not None:
+        _compter('hits')
+    else:
+        _compter('misses')
+        entree = (
+            CodeQR.objects.filter(code_unique=code_unique)
+            .values_list('employe_id', 'employe__user_id', 'actif')
+            .first()
+        )
+        if entree is None:
+            return None
+        cache.set(key, tuple(entree), getattr(settings, 'CODEQR_CACHE_TIMEOUT', 300))
+
+    employe_id, user_id, actif = entree
+    if not actif or (employe_jeton is not None and employe_jeton != employe_id):
+        return None
+    return employe_id, user_id
+
+
+def invalider_codes(codes):
+    """Retirer du cache la résolution des codes donnés, maintenant et après validation.
+
+    Tant que la transaction est ouverte, un resoudre_code concurrent lit encore
+    l'ancienne ligne et peut la remettre en cache : l'entrée est donc retirée
+    une seconde fois une fois la modification validée.
+    """
+    keys = [_cache_key(code) for code in codes if code]
+    if keys:
+        cache.delete_many(keys)
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def emettre_code(employe):
+    """Émettre un nouveau code actif pour `employe`.
+
+    CodeQR est unique par employé : un code existant (même inactif) est
+    renouvelé sur place, l'ancien code étant invalidé par le signal post_save.
+    """
+    from .models import CodeQR
+
+    code_unique = CodeQR.generate_unique_code(employe.id)
+    code_qr = CodeQR.objects.filter(employe=employe).first()
+    if code_qr is None:
+        return CodeQR.objects.create(employe=employe, code_unique=code_unique, actif=True)
+
+    code_qr.code_unique = code_unique
+    code_qr.actif = True
+    code_qr.qr_code_image = None
+    code_qr.save(update_fields=['code_unique', 'actif', 'qr_code_image'])
+    return code_qr
+
+
+def desactiver_codes(employe):
+    """Désactiver les codes actifs d'un employé et invalider leur résolution."""
+    from .models import CodeQR
+
+    actifs = CodeQR.objects.filter(employe=employe, actif=True)
+    codes = list(actifs.values_list('code_unique', flat=True))
+    actifs.update(actif=False)
+    invalider_codes(codes)
+
+
+def statistiques_cache():
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
+
+
+# ------------------------------
+# Rendu des images
+# ------------------------------
+
+def rendre_png(code_unique):
+    """Rendre l'image PNG d'un code (fonction pure, exécutable dans un worker)."""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(code_unique)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def rendre_svg(code_unique):
+    """Rendre le code en SVG vectoriel (quelques Ko, net à toute taille)."""
+    import qrcode.image.svg
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=10,
+        border=4,
+        image_factory=qrcode.image.svg.SvgPathImage,
+    )
+    qr.add_data(code_unique)
+    qr.make(fit=True)
+
+    buffer = io.BytesIO()
+    qr.make_image().save(buffer)
+    return buffer.getvalue()
+
+
+def svg_pour(code_unique):
+    """SVG du code, servi depuis un LRU borné (CODEQR_SVG_LRU_TAILLE) indexé par empreinte."""
+    cle = code_digest(code_unique)
+    with _svg_lock:
+        svg = _svg_lru.get(cle)
+        if svg is not None:
+            _svg_lru.move_to_end(cle)
+            return svg
+
+    svg = rendre_svg(code_unique)
+    with _svg_lock:
+        _svg_lru[cle] = svg
+        _svg_lru.move_to_end(cle)
+        while len(_svg_lru) > getattr(settings, 'CODEQR_SVG_LRU_TAILLE', 512):
+            _svg_lru.popitem(last=False)
+    return svg
+
+
+def etag_image(code_unique, format_image):
+    """ETag fort : le rendu est une fonction déterministe du code et du format."""
+    return f'"{code_digest(code_unique)[:32]}-{format_image}"'
+
+
+def etag_donnees(data, format_image):
+    """ETag fort d'une réponse JSON : empreinte de tout le contenu sérialisé."""
+    contenu = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'))
+    return f'"{hashlib.sha256(contenu.encode("utf-8")).hexdigest()[:32]}-{format_image}"'
+
+
+def lire_png(code_qr):
+    """Contenu PNG de `code_qr` : fichier existant s'il est à jour, sinon rendu en mémoire.
+
+    Rien n'est écrit : l'enregistrement des images relève de assurer_image et
+    de la pré-génération.
+    """
+    if not image_a_jour(code_qr):
+        return rendre_png(code_qr.code_unique)
+    with code_qr.qr_code_image.open('rb') as fichier:
+        return fichier.read()
+
+
+def nom_image(code_qr):
+    """Chemin de l'image, dérivé du contenu encodé : même code, même fichier."""
+    code_hash = code_digest(code_qr.code_unique)[:16]
+    return f"qr_codes/qr_{code_qr.employe_id}_{code_hash}.png"
+
+
+def image_a_jour(code_qr):
+    if not code_qr.qr_code_image:
+        return False
+    if code_qr.qr_code_image.name != nom_image(code_qr):
+        return False
+    return code_qr.qr_code_image.storage.exists(code_qr.qr_code_image.name)
+
+
+def _attacher_image(code_qr, png):
+    """Écrire l'image si besoin et l'attacher à `code_qr` (sans save)."""
+    champ = code_qr.qr_code_image
+    nom = nom_image(code_qr)
+    if not champ.storage.exists(nom):
+        nom = champ.storage.save(nom, ContentFile(png))
+    champ.name = nom
+
+
+def assurer_image(code_qr):
+    """Rendre et enregistrer l'image de `code_qr` si elle manque ou est périmée."""
+    if image_a_jour(code_qr):
+        return False
+    nom = nom_image(code_qr)
+    if code_qr.qr_code_image.storage.exists(nom):
+        code_qr.qr_code_image.name = nom
+    else:
+        _attacher_image(code_qr, rendre_png(code_qr.code_unique))
+    code_qr.save(update_fields=['qr_code_image'])
+    return True
+
+
+def employes_cibles(employe_ids=None, departement_ids=None):
+    """Employés et/ou départements ciblés (tous si aucun filtre)."""
+    from django.db.models import Q
+    from .models import Employe
+
+    employes = Employe.objects.all()
+    filtre = Q()
+    if employe_ids:
+        filtre |= Q(id__in=employe_ids)
+    if departement_ids:
+        filtre |= Q(poste__departement_id__in=departement_ids)
+    if filtre:
+        employes = employes.filter(filtre)
+    return employes
+
+
+def codes_pour(employe_ids=None, departement_ids=None, creer_manquants=False):
+    """Codes actifs des employés et/ou départements ciblés (tous si aucun filtre)."""
+    from .models import CodeQR
+
+    employes = employes_cibles(employe_ids, departement_ids)
+    if creer_manquants:
+        sans_code = employes.filter(code_qr__isnull=True).values_list('id', flat=True)
+        CodeQR.objects.bulk_create([
+            CodeQR(employe_id=employe_id, code_unique=CodeQR.generate_unique_code(employe_id), actif=True)
+            for employe_id in sans_code
+        ])
+
+    return CodeQR.objects.filter(actif=True, employe__in=employes).order_by('employe_id')
+
+
+def pregenerer_images(codes_qr, workers=None, force=False):
+    """Pré-générer les images manquantes ou périmées sur un pool de processus.
+
+    Le rendu (CPU) est réparti entre `workers` processus ; l'écriture des
+    fichiers et la mise à jour de CodeQR (un bulk_update) restent dans le
+    processus appelant.
+    """
+    from .models import CodeQR
+
+    codes_qr = list(codes_qr)
+    a_rendre = []
+    a_rattacher = []
+    for code_qr in codes_qr:
+        if not force and image_a_jour(code_qr):
+            continue
+        if not force and code_qr.qr_code_image.storage.exists(nom_image(code_qr)):
+            a_rattacher.append(code_qr)
+        else:
+            a_rendre.append(code_qr)
+
+    workers = workers or getattr(settings, 'QR_PREGENERATION_WORKERS', None) or os.cpu_count() or 1
+    contenus = [code_qr.code_unique for code_qr in a_rendre]
+    if workers > 1 and len(contenus) > 1:
+        contexte = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=contexte) as pool:
+            images = pool.map(rendre_png, contenus, chunksize=16)
+            for code_qr, png in zip(a_rendre, images):
+                if force:
+                    code_qr.qr_code_image.storage.delete(nom_image(code_qr))
+                _attacher_image(code_qr, png)
+    else:
+        for code_qr, contenu in zip(a_rendre, contenus):
+            if force:
+                code_qr.qr_code_image.storage.delete(nom_image(code_qr))
+            _attacher_image(code_qr, rendre_png(contenu))
+
+    for code_qr in a_rattacher:
+        code_qr.qr_code_image.name = nom_image(code_qr)
+
+    CodeQR.objects.bulk_update(a_rendre + a_rattacher, ['qr_code_image'], batch_size=500)
+
+    return {
+        'total': len(codes_qr),
+        'rendus': len(a_rendre),
+        'rattaches': len(a_rattacher),
+        'a_jour': len(codes_qr) - len(a_rendre) - len(a_rattacher),
+        'workers': workers if len(contenus) > 1 else 1,
+    }
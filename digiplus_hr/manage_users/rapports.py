@@ -0,0 +1,261 @@
+"""
+Génération et maintenance des rapports mensuels de présence.
+
+Les totaux de tous les employés sont calculés par un seul agrégat groupé sur
+Presence, puis écrits en un upsert (bulk_create avec update_conflicts) sur la
+contrainte unique (employe, annee, mois).
+
+Entre deux générations, chaque écriture de Presence applique son delta
+(ancien état retiré, nouvel état ajouté) au rapport du mois, dans la même
+transaction : le signal post_save couvre les save() unitaires, les chemins
+en masse appellent appliquer_deltas ou recalculer_rapports explicitement.
+"""
+import calendar
+import datetime
+import time
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import Presence, RapportPresence
+
+TAILLE_LOT = 1000
+
+CHAMPS_RAPPORT = [
+    'total_jours_travail', 'total_jours_present', 'total_jours_absent', 'total_jours_retard',
+    'total_jours_conge', 'total_jours_repos', 'total_heures_travail', 'total_heures_pauses',
+    'total_minutes_travail', 'total_minutes_pauses', 'generated_at',
+]
+
+CHAMPS_COMPTEURS = {
+    'jours_travail': 'total_jours_travail',
+    'jours_present': 'total_jours_present',
+    'jours_absent': 'total_jours_absent',
+    'jours_retard': 'total_jours_retard',
+    'jours_conge': 'total_jours_conge',
+    'jours_repos': 'total_jours_repos',
+    'minutes_travail': 'total_minutes_travail',
+    'minutes_pauses': 'total_minutes_pauses',
+}
+
+STATUTS_JOUR_TRAVAIL = ('present', 'retard', 'absent')
+
+
+def bornes_mois(annee, mois):
+    dernier_jour = calendar.monthrange(annee, mois)[1]
+    return datetime.date(annee, mois, 1), datetime.date(annee, mois, dernier_jour)
+
+
+def minutes_en_heures(minutes):
+    return (Decimal(int(minutes or 0)) / 60).quantize(Decimal('0.01'))
+
+
+def agreger_mois(annee, mois, employe_ids=None):
+    """Totaux du mois par employé, en une requête groupée."""
+    debut, fin = bornes_mois(annee, mois)
+    presences = Presence.objects.filter(date__range=(debut, fin))
+    if employe_ids:
+        presences = presences.filter(employe_id__in=employe_ids)
+    return (
+        presences.order_by()
+        .values('employe_id')
+        .annotate(
+            # Jours où l'employé était attendu : hors congé et repos
+            jours_travail=Count('id', filter=Q(statut__in=STATUTS_JOUR_TRAVAIL)),
+            jours_present=Count('id', filter=Q(statut='present')),
+            jours_absent=Count('id', filter=Q(statut='absent')),
+            jours_retard=Count('id', filter=Q(statut='retard')),
+            jours_conge=Count('id', filter=Q(statut='conge')),
+            jours_repos=Count('id', filter=Q(statut='repos')),
+            minutes_travail=Sum('duree_travail_minutes'),
+            minutes_pauses=Sum('duree_pauses_minutes'),
+        )
+    )
+
+
+def generer_rapports(annee, mois, employe_ids=None):
+    """Calculer et enregistrer les rapports du mois ; retourne un résumé chronométré."""
+    debut = time.monotonic()
+
+    rapports = [
+        RapportPresence(
+            employe_id=ligne['employe_id'],
+            annee=annee,
+            mois=mois,
+            total_jours_travail=ligne['jours_travail'],
+            total_jours_present=ligne['jours_present'],
+            total_jours_absent=ligne['jours_absent'],
+            total_jours_retard=ligne['jours_retard'],
+            total_jours_conge=ligne['jours_conge'],
+            total_jours_repos=ligne['jours_repos'],
+            total_heures_travail=minutes_en_heures(ligne['minutes_travail']),
+            total_heures_pauses=minutes_en_heures(ligne['minutes_pauses']),
+            total_minutes_travail=ligne['minutes_travail'] or 0,
+            total_minutes_pauses=ligne['minutes_pauses'] or 0,
+        )
+        for ligne in agreger_mois(annee, mois, employe_ids)
+    ]
+    agregation = time.monotonic()
+
+    RapportPresence.objects.bulk_create(
+        rapports,
+        batch_size=TAILLE_LOT,
+        update_conflicts=True,
+        unique_fields=['employe', 'annee', 'mois'],
+        update_fields=CHAMPS_RAPPORT,
+    )
+    fin = time.monotonic()
+
+    return {
+        'annee': annee,
+        'mois': mois,
+        'rapports': len(rapports),
+        'duree_agregation_ms': round((agregation - debut) * 1000, 1),
+        'duree_ecriture_ms': round((fin - agregation) * 1000, 1),
+        'duree_totale_ms': round((fin - debut) * 1000, 1),
+    }
+
+
+# ------------------------------
+# Maintenance incrémentale
+# ------------------------------
+
+def _contribuer(deltas, etat, signe):
+    employe_id, jour, statut, minutes_travail, minutes_pauses = etat
+    compteur = deltas[(employe_id, jour.year, jour.month)]
+    compteur[f'jours_{statut}'] += signe
+    if statut in STATUTS_JOUR_TRAVAIL:
+        compteur['jours_travail'] += signe
+    compteur['minutes_travail'] += signe * int(minutes_travail or 0)
+    compteur['minutes_pauses'] += signe * int(minutes_pauses or 0)
+
+
+def _appliquer(deltas, a_recalculer):
+    """Reporter les deltas sur les rapports existants (verrouillés) ; recalculer les autres."""
+    deltas = {cle: compteur for cle, compteur in deltas.items() if any(compteur.values())}
+    cles = set(deltas) | set(a_recalculer)
+    if not cles:
+        return
+
+    with transaction.atomic():
+        # Filtre large (produit des ensembles) puis sélection exacte en mémoire
+        existants = {
+            (rapport.employe_id, rapport.annee, rapport.mois): rapport
+            for rapport in RapportPresence.objects.select_for_update().filter(
+                employe_id__in={cle[0] for cle in cles},
+                annee__in={cle[1] for cle in cles},
+                mois__in={cle[2] for cle in cles},
+            )
+        }
+
+        maintenant = timezone.now()
+        a_mettre_a_jour = []
+        manquants = defaultdict(set)
+        for cle in cles:
+            rapport = existants.get(cle)
+            if rapport is None or cle in a_recalculer:
+                # Pas de base fiable pour un delta : le recalcul inclut déjà l'état courant
+                manquants[cle[1:]].add(cle[0])
+                continue
+            for nom, valeur in deltas[cle].items():
+                if nom in CHAMPS_COMPTEURS:
+                    champ = CHAMPS_COMPTEURS[nom]
+                    setattr(rapport, champ, getattr(rapport, champ) + valeur)
+            rapport.total_heures_travail = minutes_en_heures(rapport.total_minutes_travail)
+            rapport.total_heures_pauses = minutes_en_heures(rapport.total_minutes_pauses)
+            rapport.generated_at = maintenant
+            a_mettre_a_jour.append(rapport)
+
+        RapportPresence.objects.bulk_update(a_mettre_a_jour, CHAMPS_RAPPORT)
+        for (annee, mois), employe_ids in manquants.items():
+            generer_rapports(annee, mois, employe_ids=employe_ids)
+
+
+def appliquer_deltas(presences):
+    """Reporter sur RapportPresence et le résumé par département les changements de `presences` (déjà écrites).
+
+    L'état de référence est `_etat_initial` (posé au chargement, None pour une
+    ligne nouvelle) ; sans référence connue, les agrégats touchés sont recalculés.
+    """
+    from .resumes import appliquer_changements
+
+    deltas = defaultdict(Counter)
+    a_recalculer = set()
+    changements = []
+    inconnus = set()
+    for presence in presences:
+        apres = presence.etat_rapport()
+        if not hasattr(presence, '_etat_initial'):
+            a_recalculer.add((apres[0], apres[1].year, apres[1].month))
+            inconnus.add((apres[0], apres[1]))
+        else:
+            avant = presence._etat_initial
+            if avant == apres:
+                continue
+            if avant is not None:
+                _contribuer(deltas, avant, -1)
+            _contribuer(deltas, apres, 1)
+            changements.append((avant, apres))
+        presence._etat_initial = apres
+    _appliquer(deltas, a_recalculer)
+    appliquer_changements(changements, inconnus)
+
+
+def retirer_presences(presences):
+    """Retirer des agrégats la contribution de presences supprimées."""
+    from .resumes import appliquer_changements
+
+    deltas = defaultdict(Counter)
+    changements = []
+    for presence in presences:
+        etat = getattr(presence, '_etat_initial', None) or presence.etat_rapport()
+        _contribuer(deltas, etat, -1)
+        changements.append((etat, None))
+    _appliquer(deltas, set())
+    appliquer_changements(changements)
+
+
+def recalculer_rapports(paires):
+    """Recalculer les rapports des couples (employe_id, date) touchés par une écriture en masse."""
+    par_mois = defaultdict(set)
+    for employe_id, jour in paires:
+        par_mois[(jour.year, jour.month)].add(employe_id)
+    for (annee, mois), employe_ids in par_mois.items():
+        generer_rapports(annee, mois, employe_ids=employe_ids)
+
+
+def verifier_rapports(annee, mois, reparer=False):
+    """Comparer les rapports du mois à un recalcul complet ; réparer les écarts si demandé.
+
+    Retourne la liste des écarts : {'employe_id', 'champs': {champ: (stocké, attendu)}}.
+    """
+    attendus = {ligne['employe_id']: ligne for ligne in agreger_mois(annee, mois)}
+    stockes = {
+        rapport.employe_id: rapport
+        for rapport in RapportPresence.objects.filter(annee=annee, mois=mois)
+    }
+
+    ecarts = []
+    for employe_id in sorted(set(attendus) | set(stockes)):
+        ligne = attendus.get(employe_id)
+        rapport = stockes.get(employe_id)
+        champs = {}
+        for nom, champ in CHAMPS_COMPTEURS.items():
+            attendu = (ligne[nom] or 0) if ligne else 0
+            stocke = getattr(rapport, champ) if rapport else 0
+            if attendu != stocke:
+                champs[champ] = (stocke, attendu)
+        if ligne and rapport is None:
+            champs['rapport'] = (None, 'manquant')
+        if champs:
+            ecarts.append({'employe_id': employe_id, 'champs': champs})
+
+    if reparer and ecarts:
+        employe_ids = [ecart['employe_id'] for ecart in ecarts]
+        generer_rapports(annee, mois, employe_ids=employe_ids)
+        orphelins = [employe_id for employe_id in employe_ids if employe_id not in attendus]
+        RapportPresence.objects.filter(annee=annee, mois=mois, employe_id__in=orphelins).delete()
+    return ecarts
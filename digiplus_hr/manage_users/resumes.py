@@ -0,0 +1,174 @@
+"""
+Résumé journalier des présences par département.
+
+ResumePresenceDepartement porte, pour chaque (département, jour, statut), le
+nombre d'employés et les minutes cumulées : les tableaux de bord lisent des
+plages de mois sans joindre Presence -> Employe -> Poste -> Departement.
+
+Les écritures de Presence y reportent leur delta (voir rapports.appliquer_deltas)
+par incrément en base, appliqué après validation de la transaction appelante
+dans une transaction courte : le verrou de ligne posé par l'UPDATE n'est tenu
+que le temps de celle-ci, pas celui du scan. Un (département, jour) touché par
+une écriture en masse ou d'état antérieur inconnu est recalculé entièrement
+depuis Presence.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.utils import timezone
+
+from .models import Departement, Employe, Presence, ResumePresenceDepartement
+
+TAILLE_LOT = 1000
+CHAMPS_DELTA = ('nb_employes', 'minutes_travail', 'minutes_pauses')
+
+
+def departements_des(employe_ids):
+    return dict(
+        Employe.objects.filter(id__in=set(employe_ids), poste__isnull=False)
+        .values_list('id', 'poste__departement_id')
+    )
+
+
+def _agreger(presences):
+    return (
+        presences.filter(employe__poste__isnull=False)
+        .order_by()
+        .values('employe__poste__departement_id', 'date', 'statut')
+        .annotate(
+            nb=Count('id'),
+            minutes_travail=Sum('duree_travail_minutes'),
+            minutes_pauses=Sum('duree_pauses_minutes'),
+        )
+    )
+
+
+def _lignes(agregat, garder=None):
+    for ligne in agregat:
+        cle = (ligne['employe__poste__departement_id'], ligne['date'])
+        if garder is not None and cle not in garder:
+            continue
+        yield ResumePresenceDepartement(
+            departement_id=cle[0],
+            date=cle[1],
+            statut=ligne['statut'],
+            nb_employes=ligne['nb'],
+            minutes_travail=ligne['minutes_travail'] or 0,
+            minutes_pauses=ligne['minutes_pauses'] or 0,
+        )
+
+
+def _recalculer_jours(jours):
+    """Reconstruire les lignes des couples (departement_id, date) donnés."""
+    if not jours:
+        return
+    departement_ids = {departement_id for departement_id, _ in jours}
+    dates = {jour for _, jour in jours}
+    with transaction.atomic():
+        # Verrou par département : deux recalculs concurrents du même jour se succèdent,
+        # le second agrège alors les présences validées par le premier.
+        list(Departement.objects.select_for_update().filter(id__in=departement_ids).values_list('id', flat=True))
+
+        perimes = [
+            pk for pk, departement_id, jour in ResumePresenceDepartement.objects.filter(
+                departement_id__in=departement_ids, date__in=dates,
+            ).values_list('pk', 'departement_id', 'date')
+            if (departement_id, jour) in jours
+        ]
+        ResumePresenceDepartement.objects.filter(pk__in=perimes).delete()
+        agregat = _agreger(Presence.objects.filter(employe__poste__departement_id__in=departement_ids, date__in=dates))
+        ResumePresenceDepartement.objects.bulk_create(_lignes(agregat, garder=jours), batch_size=TAILLE_LOT)
+
+
+def recalculer_resumes(paires):
+    """Recalculer, après validation, les jours de département touchés par des couples (employe_id, date).
+
+    Différé comme les deltas : un recalcul immédiat précéderait les deltas
+    encore en attente de la même transaction, qui s'ajouteraient ensuite à
+    un total qui les compte déjà.
+    """
+    paires = set(paires)
+    departements = departements_des(employe_id for employe_id, _ in paires)
+    jours = {
+        (departements[employe_id], jour)
+        for employe_id, jour in paires
+        if departements.get(employe_id)
+    }
+    if jours:
+        transaction.on_commit(lambda: _recalculer_jours(jours))
+
+
+def appliquer_changements(changements, inconnus=()):
+    """Reporter des changements d'état de Presence sur le résumé.
+
+    `changements` : couples (avant, apres) d'états Presence.etat_rapport(),
+    None pour une ligne créée ou supprimée. `inconnus` : couples
+    (employe_id, date) dont l'état antérieur n'est pas connu. Le report a lieu
+    après validation ; une transaction annulée n'en laisse aucun.
+    """
+    inconnus = set(inconnus)
+    employe_ids = {etat[0] for paire in changements for etat in paire if etat} | {e for e, _ in inconnus}
+    if not employe_ids:
+        return
+    departements = departements_des(employe_ids)
+
+    deltas = defaultdict(Counter)
+    for avant, apres in changements:
+        for etat, signe in ((avant, -1), (apres, 1)):
+            if etat is None or not departements.get(etat[0]):
+                continue
+            employe_id, jour, statut, minutes_travail, minutes_pauses = etat
+            compteur = deltas[(departements[employe_id], jour, statut)]
+            compteur['nb_employes'] += signe
+            compteur['minutes_travail'] += signe * int(minutes_travail or 0)
+            compteur['minutes_pauses'] += signe * int(minutes_pauses or 0)
+    deltas = {cle: compteur for cle, compteur in deltas.items() if any(compteur.values())}
+
+    a_recalculer = {(departements[e], jour) for e, jour in inconnus if departements.get(e)}
+    deltas = {cle: compteur for cle, compteur in deltas.items() if cle[:2] not in a_recalculer}
+    if not deltas and not a_recalculer:
+        return
+
+    transaction.on_commit(lambda: _reporter(deltas, a_recalculer))
+
+
+def _reporter(deltas, a_recalculer):
+    cles = list(deltas)
+    with transaction.atomic():
+        # Statut encore jamais vu ce jour : ligne amorcée à zéro, sans conflit possible
+        ResumePresenceDepartement.objects.bulk_create(
+            [ResumePresenceDepartement(departement_id=departement_id, date=jour, statut=statut) for departement_id, jour, statut in cles],
+            batch_size=TAILLE_LOT, ignore_conflicts=True,
+        )
+        maintenant = timezone.now()
+        for i in range(0, len(cles), TAILLE_LOT):
+            filtre = Q()
+            increments = defaultdict(list)
+            for cle in cles[i:i + TAILLE_LOT]:
+                condition = Q(departement_id=cle[0], date=cle[1], statut=cle[2])
+                filtre |= condition
+                for champ in CHAMPS_DELTA:
+                    increments[champ].append(When(condition, then=Value(deltas[cle][champ])))
+            # L'UPDATE verrouille les lignes jusqu'à la fin de cette transaction courte :
+            # deux reports concurrents sur un même département se succèdent sans lecture préalable
+            ResumePresenceDepartement.objects.filter(filtre).update(
+                updated_at=maintenant,
+                **{champ: F(champ) + Case(*whens, default=Value(0)) for champ, whens in increments.items()},
+            )
+        _recalculer_jours(a_recalculer)
+
+
+def remplir_resumes(debut, fin, departement_ids=None):
+    """(Re)construire le résumé d'une plage de dates en un agrégat groupé ; retourne le nombre de lignes."""
+    presences = Presence.objects.filter(date__range=(debut, fin))
+    existants = ResumePresenceDepartement.objects.filter(date__range=(debut, fin))
+    if departement_ids:
+        presences = presences.filter(employe__poste__departement_id__in=departement_ids)
+        existants = existants.filter(departement_id__in=departement_ids)
+
+    with transaction.atomic():
+        existants.delete()
+        lignes = list(_lignes(_agreger(presences)))
+        ResumePresenceDepartement.objects.bulk_create(lignes, batch_size=TAILLE_LOT)
+    return len(lignes)
@@ -0,0 +1,60 @@
+"""
+Rétention des notifications : suppression (avec archive facultative) des
+notifications lues plus anciennes que NOTIFICATIONS_RETENTION_JOURS.
+
+Le travail est découpé en lots de clés primaires, lus dans l'ordre de l'index
+(date_envoi, id) et supprimés chacun dans sa propre courte transaction : aucun
+verrou n'est tenu sur la table entre deux lots, et une pause optionnelle
+laisse passer le trafic applicatif. Avec une archive, chaque lot est écrit en
+JSON Lines avant d'être supprimé (au pire archivé deux fois, jamais perdu).
+Les notifications non lues ne sont jamais purgées.
+"""
+import datetime
+import json
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification
+
+TAILLE_LOT = 1000
+CHAMPS_ARCHIVE = ('id', 'destinataire_id', 'demande_conge_id', 'titre', 'message', 'date_envoi', 'lu')
+
+
+def limite_retention(jours=None):
+    """Date d'envoi en deçà de laquelle une notification lue est purgée."""
+    if jours is None:
+        jours = getattr(settings, 'NOTIFICATIONS_RETENTION_JOURS', 180)
+    return timezone.now() - datetime.timedelta(days=jours)
+
+
+def purger_notifications(limite, archive=None, taille=TAILLE_LOT, pause=0.0, simulation=False):
+    """Supprimer par lots les notifications lues envoyées avant `limite` ; retourne le nombre traité.
+
+    `archive` : fichier texte ouvert, reçoit une ligne JSON par notification.
+    `simulation` : compter sans rien écrire ni supprimer.
+    """
+    perimees = Notification.objects.filter(lu=True, date_envoi__lt=limite)
+    if simulation:
+        return perimees.count()
+
+    total = 0
+    while True:
+        with transaction.atomic():
+            lot = list(perimees.order_by('date_envoi', 'id').values_list('id', flat=True)[:taille])
+            if not lot:
+                break
+            if archive is not None:
+                for ligne in Notification.objects.filter(id__in=lot).order_by('date_envoi', 'id').values(*CHAMPS_ARCHIVE):
+                    archive.write(json.dumps(ligne, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+                archive.flush()
+            Notification.objects.filter(id__in=lot).delete()
+        total += len(lot)
+        if len(lot) < taille:
+            break
+        if pause:
+            time.sleep(pause)
+    return total
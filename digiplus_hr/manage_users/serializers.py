@@ -1,8 +1,14 @@
+from contextlib import contextmanager
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from django.db import IntegrityError, transaction
 from rest_framework.validators import UniqueValidator
-from .models import OTP, Departement, Poste, Employe, DemandeConge, Notification, DemandeCongeAudit, CodeQR, Badgeage, Presence, RapportPresence
+from .models import OTP, Departement, Poste, Employe, DemandeConge, Notification, DemandeCongeAudit, CodeQR, Badgeage, Presence, RapportPresence, ResumePresenceDepartement, HoraireTravail, CalendrierTravail, JourFerie
+from .absences import CONTRAINTE_CHEVAUCHEMENT, STATUTS_ACTIFS, chevauchements
+from .calendrier import calendrier_de, jours_ouvres_entre
+from .soldes import TYPE_ACQUIS, annees_insuffisantes, solde_de, soldes_de
 
 
 User = get_user_model()
@@ -97,6 +103,23 @@ class BadgeageScannerSerializer(serializers.Serializer):
             raise serializers.ValidationError("Fournir 'code_unique' ou 'user_id'.")
         return attrs
 
+class BadgeageLotItemSerializer(BadgeageScannerSerializer):
+    """Badgeage rejoué par une borne : porte l'horodatage de l'appareil."""
+    horodatage = serializers.DateTimeField()
+
+
+class BadgeageLotSerializer(serializers.Serializer):
+    # Chaque élément est validé séparément pour produire un résultat par scan.
+    scans = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_scans(self, value):
+        from django.conf import settings
+
+        taille_max = getattr(settings, 'BADGEAGE_LOT_TAILLE_MAX', 500)
+        if len(value) > taille_max:
+            raise serializers.ValidationError(f"Un lot ne peut pas dépasser {taille_max} scans.")
+        return value
+
 # ==============================
 # Profile Serializers
 # ==============================
@@ -258,6 +281,77 @@ class PosteSerializer(serializers.ModelSerializer):
         model = Poste
         fields = ['id', 'titre', 'description', 'salaire_de_base', 'departement', 'departement_details', 'created_at', 'updated_at']
 
+def valider_jours_semaine(value, vide_autorise=False):
+    """Normaliser une liste "0,1,4" de jours de la semaine (0 = lundi)."""
+    jours = [jour.strip() for jour in value.split(',') if jour.strip()]
+    if (not jours and not vide_autorise) or any(jour not in '0123456' or len(jour) != 1 for jour in jours):
+        raise serializers.ValidationError("Liste de jours 0 (lundi) à 6 (dimanche) séparés par des virgules.")
+    return ','.join(sorted(set(jours)))
+
+
+class CalendrierTravailSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CalendrierTravail
+        fields = ['id', 'nom', 'jours_repos', 'par_defaut', 'created_at', 'updated_at']
+        read_only_fields = ['created_at', 'updated_at']
+
+    def validate_jours_repos(self, value):
+        return valider_jours_semaine(value, vide_autorise=True)
+
+    def validate_par_defaut(self, value):
+        autres = CalendrierTravail.objects.filter(par_defaut=True)
+        if self.instance is not None:
+            autres = autres.exclude(pk=self.instance.pk)
+        if value and autres.exists():
+            raise serializers.ValidationError("Un autre calendrier est déjà le calendrier par défaut.")
+        return value
+
+
+class JourFerieSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = JourFerie
+        fields = ['id', 'calendrier', 'date', 'libelle']
+
+
+class PlageJoursOuvresSerializer(serializers.Serializer):
+    date_debut = serializers.DateField()
+    date_fin = serializers.DateField()
+
+    def validate(self, attrs):
+        if attrs['date_debut'] > attrs['date_fin']:
+            raise serializers.ValidationError("'date_debut' doit précéder 'date_fin'.")
+        return attrs
+
+
+class CalendrierEquipeSerializer(PlageJoursOuvresSerializer):
+    statut = serializers.MultipleChoiceField(choices=STATUTS_ACTIFS, required=False)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if (attrs['date_fin'] - attrs['date_debut']).days > 366:
+            raise serializers.ValidationError("Plage limitée à un an.")
+        # Paramètre absent de la query string : liste vide, tous les statuts actifs
+        attrs['statut'] = attrs.get('statut') or set(STATUTS_ACTIFS)
+        return attrs
+
+
+class HoraireTravailSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HoraireTravail
+        fields = ['id', 'nom', 'poste', 'contrat', 'heure_debut', 'tolerance_minutes', 'jours_travail',
+                  'actif', 'created_at', 'updated_at']
+        read_only_fields = ['created_at', 'updated_at']
+
+    def validate_jours_travail(self, value):
+        return valider_jours_semaine(value)
+
+    def validate(self, attrs):
+        poste = attrs.get('poste', getattr(self.instance, 'poste', None))
+        contrat = attrs.get('contrat', getattr(self.instance, 'contrat', None))
+        if poste is None and contrat is None:
+            raise serializers.ValidationError("Un horaire doit être rattaché à un poste ou à un contrat.")
+        return attrs
+
 class EmployeSerializer(serializers.ModelSerializer):
     user = UserProfileSerializer(read_only=True)
     poste_details = PosteSerializer(source='poste', read_only=True)
@@ -274,6 +368,34 @@ class CodeQRSerializer(serializers.ModelSerializer):
         read_only_fields = ['code_unique', 'qr_code_image', 'date_generation']
 
 
+class CodeQRPregenerationSerializer(serializers.Serializer):
+    employe_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    departement_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    creer_manquants = serializers.BooleanField(required=False, default=False)
+    force = serializers.BooleanField(required=False, default=False)
+    workers = serializers.IntegerField(required=False, min_value=1, max_value=16)
+
+
+class CodeQRExportSerializer(serializers.Serializer):
+    departement = serializers.IntegerField(required=False)
+    employes = serializers.CharField(required=False)
+    sortie = serializers.ChoiceField(choices=['zip', 'pdf'], required=False, default='zip')
+    image = serializers.ChoiceField(choices=['png', 'svg'], required=False, default='png')
+
+    def validate_employes(self, value):
+        try:
+            return [int(v) for v in value.split(',') if v.strip()]
+        except ValueError:
+            raise serializers.ValidationError("Liste d'identifiants séparés par des virgules attendue.")
+
+    def validate(self, attrs):
+        if not attrs.get('departement') and not attrs.get('employes'):
+            raise serializers.ValidationError("Paramètre requis: 'departement' ou 'employes'.")
+        if attrs['sortie'] == 'pdf' and attrs['image'] == 'svg':
+            raise serializers.ValidationError("La planche PDF n'accepte que des images PNG.")
+        return attrs
+
+
 class BadgeageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Badgeage
@@ -293,17 +415,211 @@ class RapportPresenceSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class ResumePresenceDepartementSerializer(serializers.ModelSerializer):
+    departement_nom = serializers.CharField(source='departement.nom', read_only=True)
+
+    class Meta:
+        model = ResumePresenceDepartement
+        fields = ['id', 'departement', 'departement_nom', 'date', 'statut', 'nb_employes',
+                  'minutes_travail', 'minutes_pauses', 'updated_at']
+
+
+class PlageResumeSerializer(serializers.Serializer):
+    date_debut = serializers.DateField()
+    date_fin = serializers.DateField()
+    departement = serializers.IntegerField(required=False)
+    statut = serializers.ChoiceField(choices=[c[0] for c in Presence.STATUT_CHOICES], required=False)
+
+    def validate(self, attrs):
+        if attrs['date_debut'] > attrs['date_fin']:
+            raise serializers.ValidationError("'date_debut' doit précéder 'date_fin'.")
+        if (attrs['date_fin'] - attrs['date_debut']).days > 366:
+            raise serializers.ValidationError("Plage limitée à un an.")
+        return attrs
+
+
+class TendancesPresenceSerializer(serializers.Serializer):
+    date_debut = serializers.DateField()
+    date_fin = serializers.DateField()
+    pas = serializers.ChoiceField(choices=['jour', 'semaine', 'mois'], default='jour')
+    groupe = serializers.ChoiceField(choices=['departement', 'poste'], required=False)
+    departement = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if attrs['date_debut'] > attrs['date_fin']:
+            raise serializers.ValidationError("'date_debut' doit précéder 'date_fin'.")
+        if (attrs['date_fin'] - attrs['date_debut']).days > 731:
+            raise serializers.ValidationError("Plage limitée à deux ans.")
+        return attrs
+
+
+class ExportPointageSerializer(serializers.Serializer):
+    date_debut = serializers.DateField(required=False)
+    date_fin = serializers.DateField(required=False)
+    departement = serializers.IntegerField(required=False)
+    statut = serializers.CharField(required=False)
+    fichier = serializers.ChoiceField(choices=['csv', 'xlsx'], required=False, default='csv')
+
+    def validate(self, attrs):
+        if attrs.get('date_debut') and attrs.get('date_fin') and attrs['date_debut'] > attrs['date_fin']:
+            raise serializers.ValidationError("'date_debut' doit précéder 'date_fin'.")
+        return attrs
+
+
+class RapportPresenceGenerationSerializer(serializers.Serializer):
+    annee = serializers.IntegerField(min_value=2000, max_value=2100)
+    mois = serializers.IntegerField(min_value=1, max_value=12)
+    employe_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+
+class DemandeCongeListSerializer(serializers.ListSerializer):
+    """Liste de demandes : les soldes de toute la page sont chargés en une requête."""
+
+    def to_representation(self, data):
+        demandes = list(data.all() if hasattr(data, 'all') else data)
+        self.child._soldes = soldes_de(
+            (demande.employe_id, demande.date_debut.year, demande.type_conge)
+            for demande in demandes if demande.employe_id and demande.date_debut
+        )
+        return super().to_representation(demandes)
+
+
 class DemandeCongeSerializer(serializers.ModelSerializer):
+    jours_ouvres = serializers.SerializerMethodField()
+    solde = serializers.SerializerMethodField()
+
     class Meta:
         model = DemandeConge
         fields = '__all__'
         read_only_fields = ['employe', 'created_at', 'updated_at']
+        list_serializer_class = DemandeCongeListSerializer
+
+    def get_jours_ouvres(self, obj):
+        """Durée de la demande en jours ouvrés selon le calendrier de l'employé."""
+        if not (obj.date_debut and obj.date_fin and obj.employe_id):
+            return None
+        return jours_ouvres_entre(obj.date_debut, obj.date_fin, calendrier_de(obj.employe_id))
+
+    def get_solde(self, obj):
+        """Solde de l'employé pour le type et l'année de début de la demande (registre des congés)."""
+        if not (obj.date_debut and obj.employe_id):
+            return None
+        soldes = getattr(self, '_soldes', None)
+        if soldes is not None:
+            solde = soldes.get((obj.employe_id, obj.date_debut.year, obj.type_conge))
+        else:
+            solde = solde_de(obj.employe_id, obj.date_debut.year, obj.type_conge)
+        if solde is None:
+            return None
+        return {'annee': solde.annee, 'acquis': solde.acquis, 'consommes': solde.consommes, 'solde': solde.solde}
+
+    def _refuser_chevauchements(self, employe_id, date_debut, date_fin, exclure_id=None):
+        existantes = chevauchements(employe_id, date_debut, date_fin, exclure_id=exclure_id)
+        conflits = [
+            f"Chevauche la demande #{demande.id} du {demande.date_debut} au {demande.date_fin} ({demande.get_statut_display().lower()})."
+            for demande in existantes[:5]
+        ]
+        if conflits:
+            raise serializers.ValidationError({'date_debut': conflits})
+
+    @contextmanager
+    def _sous_verrou_employe(self, employe_id, validated_data):
+        """Contrôler les chevauchements et écrire la demande sous verrou de l'employé.
+
+        Le contrôle de validate() ne suffit pas face à deux soumissions
+        concurrentes : le verrou les fait se succéder, la seconde voit la
+        première. Sur PostgreSQL, la contrainte d'exclusion
+        mu_conge_sans_chevauchement couvre aussi les écritures hors de l'API.
+        """
+        date_debut = validated_data.get('date_debut', getattr(self.instance, 'date_debut', None))
+        date_fin = validated_data.get('date_fin', getattr(self.instance, 'date_fin', None))
+        statut = validated_data.get('statut', getattr(self.instance, 'statut', 'en_attente'))
+        try:
+            with transaction.atomic():
+                list(Employe.objects.select_for_update().filter(pk=employe_id).values_list('pk', flat=True))
+                if statut in STATUTS_ACTIFS and date_debut and date_fin:
+                    self._refuser_chevauchements(employe_id, date_debut, date_fin, getattr(self.instance, 'pk', None))
+                yield
+        except IntegrityError as exc:
+            if CONTRAINTE_CHEVAUCHEMENT not in str(exc):
+                raise
+            raise serializers.ValidationError({'date_debut': ["Chevauche une autre demande active."]})
+
+    def create(self, validated_data):
+        with self._sous_verrou_employe(validated_data['employe'].pk, validated_data):
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with self._sous_verrou_employe(instance.employe_id, validated_data):
+            return super().update(instance, validated_data)
+
+    def validate(self, attrs):
+        from django.conf import settings
+
+        date_debut = attrs.get('date_debut', getattr(self.instance, 'date_debut', None))
+        date_fin = attrs.get('date_fin', getattr(self.instance, 'date_fin', None))
+        type_conge = attrs.get('type_conge', getattr(self.instance, 'type_conge', None))
+        statut = attrs.get('statut', getattr(self.instance, 'statut', 'en_attente'))
+        if self.instance is not None:
+            employe_id = self.instance.employe_id
+        else:
+            request = self.context.get('request')
+            employe = getattr(getattr(request, 'user', None), 'employe', None)
+            employe_id = employe.id if employe is not None else None
+        if employe_id is None or not (date_debut and date_fin):
+            return attrs
+
+        # Une demande active ne peut recouvrir une autre demande active du même employé
+        if statut in STATUTS_ACTIFS:
+            self._refuser_chevauchements(employe_id, date_debut, date_fin, getattr(self.instance, 'pk', None))
+
+        # Contrôle du solde à la création, pour le seul type qui s'acquiert
+        if self.instance is None and type_conge == TYPE_ACQUIS and getattr(settings, 'CONGES_CONTROLE_SOLDE', False):
+            manques = annees_insuffisantes(employe_id, type_conge, date_debut, date_fin)
+            if manques:
+                raise serializers.ValidationError({'solde': [
+                    f"{annee} : {jours} jour(s) demandé(s), solde disponible {disponible}."
+                    for annee, jours, disponible in manques
+                ]})
+        return attrs
 
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = '__all__'
-        read_only_fields = ['demande_conge', 'date_envoi']
+        read_only_fields = ['demande_conge', 'destinataire', 'date_envoi']
+
+class MarquageLuSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    avant = serializers.DateTimeField(required=False)
+
+    def validate_ids(self, value):
+        from django.conf import settings
+
+        taille_max = getattr(settings, 'NOTIFICATIONS_LECTURE_LOT_MAX', 1000)
+        if len(value) > taille_max:
+            raise serializers.ValidationError(f"Au plus {taille_max} notifications par requête.")
+        return value
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('avant' in attrs):
+            raise serializers.ValidationError("Fournir 'ids' ou 'avant', pas les deux.")
+        return attrs
+
+
+class DecisionGroupeeSerializer(serializers.Serializer):
+    demande_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    decision = serializers.ChoiceField(choices=['approuve', 'rejete'])
+    raison = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate_demande_ids(self, value):
+        from django.conf import settings
+
+        taille_max = getattr(settings, 'CONGES_DECISION_LOT_MAX', 1000)
+        if len(value) > taille_max:
+            raise serializers.ValidationError(f"Au plus {taille_max} demandes par décision.")
+        return value
+
 
 class DemandeCongeAuditSerializer(serializers.ModelSerializer):
     admin_name = serializers.CharField(source='admin.get_full_name', read_only=True)
@@ -0,0 +1,242 @@
+"""
+Registre des congés et soldes matérialisés.
+
+Chaque acquisition (droits des contrats), consommation (demande approuvée) ou
+annulation (demande approuvée puis rejetée, modifiée ou supprimée) est une
+écriture MouvementConge. SoldeConge en garde la somme par (employé, année,
+type de congé) : lire un solde est une recherche sur clé unique, sans
+recompter les demandes passées.
+
+Les écritures d'une opération sont insérées en un bulk_create et les soldes
+concernés incrémentés en un seul UPDATE. `imputer_demandes` est idempotent :
+il compare ce que le registre impute déjà à chaque demande avec ce qu'elle
+devrait imputer (jours ouvrés par année si elle est approuvée, rien sinon) et
+n'écrit que l'écart. `reconstruire_soldes` rejoue le registre en masse.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When
+from django.utils import timezone
+
+from .calendrier import calendrier_de, calendriers_de, jours_ouvres_entre
+from .models import DemandeConge, MouvementConge, SoldeConge
+
+NATURES_CREDIT = ('acquisition', 'ajustement')
+# Seul le congé annuel s'acquiert ; les autres types ne font que consommer
+TYPE_ACQUIS = 'annuel'
+# Contrats signés ouvrant droit à acquisition
+CONTRAT_STATUTS_ACQUISITION = ('actif', 'suspendu', 'clos')
+TAILLE_LOT = 500
+ZERO = Decimal('0')
+CENTIEME = Decimal('0.01')
+
+
+def jours_par_annee(debut, fin, calendrier_id=None):
+    """{annee: jours ouvrés} de `debut` à `fin` inclus, une entrée par année couverte."""
+    return {
+        annee: jours_ouvres_entre(
+            max(debut, datetime.date(annee, 1, 1)), min(fin, datetime.date(annee, 12, 31)), calendrier_id,
+        )
+        for annee in range(debut.year, fin.year + 1)
+    }
+
+
+def solde_de(employe_id, annee, type_conge=TYPE_ACQUIS):
+    """SoldeConge de l'employé (None si aucune écriture)."""
+    return SoldeConge.objects.filter(employe_id=employe_id, annee=annee, type_conge=type_conge).first()
+
+
+def soldes_de(cles):
+    """{(employe_id, annee, type_conge): SoldeConge} pour les clés données, en une requête."""
+    cles = set(cles)
+    if not cles:
+        return {}
+    # Filtre large (produit des ensembles) puis sélection exacte en mémoire
+    soldes = SoldeConge.objects.filter(
+        employe_id__in={cle[0] for cle in cles},
+        annee__in={cle[1] for cle in cles},
+        type_conge__in={cle[2] for cle in cles},
+    )
+    return {
+        (solde.employe_id, solde.annee, solde.type_conge): solde
+        for solde in soldes
+        if (solde.employe_id, solde.annee, solde.type_conge) in cles
+    }
+
+
+def annees_insuffisantes(employe_id, type_conge, debut, fin):
+    """[(annee, jours demandés, solde disponible)] pour les années où le solde ne couvre pas la demande."""
+    besoins = {annee: jours for annee, jours in jours_par_annee(debut, fin, calendrier_de(employe_id)).items() if jours}
+    soldes = {
+        solde.annee: solde.solde
+        for solde in SoldeConge.objects.filter(employe_id=employe_id, type_conge=type_conge, annee__in=besoins)
+    }
+    return [
+        (annee, jours, soldes.get(annee, ZERO))
+        for annee, jours in sorted(besoins.items())
+        if jours > soldes.get(annee, ZERO)
+    ]
+
+
+def appliquer_mouvements(mouvements):
+    """Enregistrer des écritures et incrémenter les soldes qu'elles touchent."""
+    if not mouvements:
+        return
+    deltas = defaultdict(lambda: [ZERO, ZERO])
+    for mouvement in mouvements:
+        cle = (mouvement.employe_id, mouvement.annee, mouvement.type_conge)
+        if mouvement.nature in NATURES_CREDIT:
+            deltas[cle][0] += mouvement.jours
+        else:
+            deltas[cle][1] -= mouvement.jours
+
+    sortie = DecimalField(max_digits=7, decimal_places=2)
+    cles = list(deltas)
+    with transaction.atomic():
+        MouvementConge.objects.bulk_create(mouvements, batch_size=TAILLE_LOT)
+        SoldeConge.objects.bulk_create(
+            [SoldeConge(employe_id=employe_id, annee=annee, type_conge=type_conge) for employe_id, annee, type_conge in cles],
+            batch_size=TAILLE_LOT, ignore_conflicts=True,
+        )
+        maintenant = timezone.now()
+        for i in range(0, len(cles), TAILLE_LOT):
+            filtre = Q()
+            acquis, consommes = [], []
+            for employe_id, annee, type_conge in cles[i:i + TAILLE_LOT]:
+                condition = Q(employe_id=employe_id, annee=annee, type_conge=type_conge)
+                delta_acquis, delta_consommes = deltas[employe_id, annee, type_conge]
+                filtre |= condition
+                acquis.append(When(condition, then=Value(delta_acquis)))
+                consommes.append(When(condition, then=Value(delta_consommes)))
+            # Incrément en base : sûr face aux écritures concurrentes sur le même solde
+            SoldeConge.objects.filter(filtre).update(
+                acquis=F('acquis') + Case(*acquis, default=Value(ZERO), output_field=sortie),
+                consommes=F('consommes') + Case(*consommes, default=Value(ZERO), output_field=sortie),
+                updated_at=maintenant,
+            )
+
+
+def imputer_demandes(demandes, supprimees=False):
+    """Aligner le registre sur le statut et les dates des demandes ; retourne les écritures ajoutées."""
+    demandes = [demande for demande in demandes if demande.pk]
+    if not demandes:
+        return []
+
+    deja = defaultdict(dict)
+    lignes = (
+        MouvementConge.objects.filter(demande_conge_id__in=[demande.pk for demande in demandes])
+        .order_by()
+        .values('demande_conge_id', 'annee', 'type_conge')
+        .annotate(jours=Sum('jours'))
+    )
+    for ligne in lignes:
+        deja[ligne['demande_conge_id']][ligne['annee'], ligne['type_conge']] = ligne['jours']
+
+    calendriers = calendriers_de({demande.employe_id for demande in demandes})
+    # Dates éventuellement encore en chaînes sur une instance non rechargée
+    en_date = DemandeConge._meta.get_field('date_debut').to_python
+    mouvements = []
+    for demande in demandes:
+        attendu = {}
+        if demande.statut == 'approuve' and not supprimees:
+            jours = jours_par_annee(en_date(demande.date_debut), en_date(demande.date_fin), calendriers[demande.employe_id])
+            attendu = {(annee, demande.type_conge): -Decimal(n) for annee, n in jours.items() if n}
+        impute = deja.get(demande.pk, {})
+        for annee, type_conge in sorted(attendu.keys() | impute.keys()):
+            ecart = attendu.get((annee, type_conge), ZERO) - impute.get((annee, type_conge), ZERO)
+            if ecart:
+                mouvements.append(MouvementConge(
+                    employe_id=demande.employe_id, annee=annee, type_conge=type_conge,
+                    nature='consommation' if ecart < 0 else 'annulation', jours=ecart,
+                    demande_conge_id=demande.pk,
+                    libelle=f"Demande #{demande.pk} du {demande.date_debut} au {demande.date_fin}",
+                ))
+    appliquer_mouvements(mouvements)
+    return mouvements
+
+
+def droits_contrats(annee, employe_ids=None):
+    """{employe_id: jours} acquis sur `annee`, au prorata de la durée des contrats dans l'année."""
+    from manage_contrat.models import Contrat
+
+    debut, fin = datetime.date(annee, 1, 1), datetime.date(annee, 12, 31)
+    contrats = Contrat.objects.filter(
+        Q(date_fin__isnull=True) | Q(date_fin__gte=debut),
+        statut__in=CONTRAT_STATUTS_ACQUISITION, date_debut__lte=fin,
+    )
+    if employe_ids is not None:
+        contrats = contrats.filter(employe_id__in=employe_ids)
+
+    jours_annee = (fin - debut).days + 1
+    droits = defaultdict(lambda: ZERO)
+    for employe_id, date_debut, date_fin, conges_annuels in contrats.values_list(
+        'employe_id', 'date_debut', 'date_fin', 'conges_annuels_jours',
+    ):
+        couverts = (min(date_fin or fin, fin) - max(date_debut, debut)).days + 1
+        droits[employe_id] += Decimal(conges_annuels * couverts) / jours_annee
+    return {employe_id: jours.quantize(CENTIEME) for employe_id, jours in droits.items()}
+
+
+def crediter_conges(annee, employe_ids=None):
+    """Porter au registre l'écart entre les droits des contrats et les acquisitions déjà créditées."""
+    droits = droits_contrats(annee, employe_ids)
+    credites = MouvementConge.objects.filter(annee=annee, type_conge=TYPE_ACQUIS, nature='acquisition')
+    if employe_ids is not None:
+        credites = credites.filter(employe_id__in=employe_ids)
+    credites = dict(
+        credites.order_by().values('employe_id').annotate(jours=Sum('jours')).values_list('employe_id', 'jours')
+    )
+
+    mouvements = []
+    for employe_id in sorted(droits.keys() | credites.keys()):
+        ecart = droits.get(employe_id, ZERO) - credites.get(employe_id, ZERO)
+        if ecart:
+            mouvements.append(MouvementConge(
+                employe_id=employe_id, annee=annee, type_conge=TYPE_ACQUIS, nature='acquisition',
+                jours=ecart, libelle=f"Droits {annee} (contrats)",
+            ))
+    appliquer_mouvements(mouvements)
+    return mouvements
+
+
+def reimputer_demandes(annees=None, taille=TAILLE_LOT):
+    """Rejouer imputer_demandes sur l'historique des demandes, par lots ; retourne le nombre d'écritures."""
+    demandes = DemandeConge.objects.filter(Q(statut='approuve') | Q(mouvements_conge__isnull=False))
+    if annees:
+        demandes = demandes.filter(date_debut__year__lte=max(annees), date_fin__year__gte=min(annees))
+    ids = list(demandes.order_by('id').values_list('id', flat=True).distinct())
+
+    total = 0
+    for i in range(0, len(ids), taille):
+        with transaction.atomic():
+            lot = DemandeConge.objects.filter(id__in=ids[i:i + taille]).order_by('id')
+            total += len(imputer_demandes(lot))
+    return total
+
+
+def reconstruire_soldes(annees=None):
+    """Recalculer les soldes depuis le registre : un GROUP BY, puis insertion en masse."""
+    mouvements = MouvementConge.objects.order_by()
+    soldes = SoldeConge.objects.all()
+    if annees:
+        mouvements = mouvements.filter(annee__in=annees)
+        soldes = soldes.filter(annee__in=annees)
+
+    lignes = mouvements.values('employe_id', 'annee', 'type_conge').annotate(
+        credits=Sum('jours', filter=Q(nature__in=NATURES_CREDIT)),
+        debits=Sum('jours', filter=~Q(nature__in=NATURES_CREDIT)),
+    )
+    nouveaux = [
+        SoldeConge(
+            employe_id=ligne['employe_id'], annee=ligne['annee'], type_conge=ligne['type_conge'],
+            acquis=ligne['credits'] or ZERO, consommes=-(ligne['debits'] or ZERO),
+        )
+        for ligne in lignes
+    ]
+    with transaction.atomic():
+        soldes.delete()
+        SoldeConge.objects.bulk_create(nouveaux, batch_size=TAILLE_LOT)
+    return len(nouveaux)
@@ -0,0 +1,60 @@
+"""
+Statistiques du tableau de bord administrateur.
+
+Une requête d'agrégats conditionnels par table (User, Employe, Poste) ; le
+résultat est gardé dans le cache partagé jusqu'à ce qu'une écriture sur l'une
+de ces tables le supprime (voir les receivers de models.py). DASHBOARD_CACHE_TTL
+borne malgré tout sa durée de vie, pour les écritures qui ne passent pas par
+les signaux (update() en masse, SQL direct).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Employe, Poste, User
+
+CACHE_CLE = 'dashboard:admin'
+
+# Champs dont dépendent les compteurs : une sauvegarde limitée à d'autres
+# champs (last_login à chaque connexion, par exemple) ne vide pas le cache.
+CHAMPS_USER = frozenset({'is_superadmin', 'is_admin', 'is_employe', 'is_verified'})
+CHAMPS_EMPLOYE = frozenset({'statut'})
+
+
+def calculer_statistiques():
+    users = User.objects.aggregate(
+        total=Count('id'),
+        superadmins=Count('id', filter=Q(is_superadmin=True)),
+        admins=Count('id', filter=Q(is_admin=True, is_superadmin=False)),
+        employes=Count('id', filter=Q(is_employe=True)),
+        verified=Count('id', filter=Q(is_verified=True)),
+    )
+    users['unverified'] = users['total'] - users['verified']
+    employes = Employe.objects.aggregate(
+        total=Count('id'),
+        actifs=Count('id', filter=Q(statut='actif')),
+        inactifs=Count('id', filter=Q(statut='inactif')),
+    )
+    return {
+        'users': users,
+        'employes': employes,
+        'postes': Poste.objects.count(),
+    }
+
+
+def statistiques_admin():
+    """Retourner (statistiques, âge en secondes du calcul)."""
+    entree = cache.get(CACHE_CLE)
+    if entree is None:
+        entree = {'calcule_a': time.time(), 'donnees': calculer_statistiques()}
+        cache.set(CACHE_CLE, entree, getattr(settings, 'DASHBOARD_CACHE_TTL', 300))
+    return entree['donnees'], max(0, int(time.time() - entree['calcule_a']))
+
+
+def invalider_statistiques(champs_modifies=None, champs_suivis=None):
+    """Vider le cache, sauf si la sauvegarde ne touche aucun champ suivi."""
+    if champs_modifies is not None and champs_suivis is not None and not (set(champs_modifies) & champs_suivis):
+        return
+    cache.delete(CACHE_CLE)
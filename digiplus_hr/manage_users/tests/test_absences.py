@@ -0,0 +1,104 @@
+import datetime
+from unittest.mock import patch
+
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from manage_users.absences import calendrier_equipe, chevauchements
+from manage_users.calendrier import invalider_calendriers
+from manage_users.models import DemandeConge, Departement, Employe, Poste, User
+from manage_users.serializers import DemandeCongeSerializer
+
+
+@override_settings(NOTIFICATIONS_DIFFUSION_EN_PROCESSUS=False)
+class TestAbsencesEquipe(APITestCase):
+    def setUp(self):
+        invalider_calendriers()
+        self.addCleanup(invalider_calendriers)
+        self.admin = User.objects.create_user(email="abs.admin@example.com", password="pass1234", is_admin=True, is_employe=False, is_verified=True)
+        self.ventes = Departement.objects.create(nom="Ventes")
+        autre = Departement.objects.create(nom="Achats")
+        self.employes = []
+        for i, departement in enumerate((self.ventes, self.ventes, autre)):
+            poste = Poste.objects.create(titre=f"Poste {i}", salaire_de_base=100000, departement=departement)
+            user = User.objects.create_user(email=f"abs{i}@example.com", password="pass1234", first_name="Abs", last_name=str(i), is_employe=True, is_verified=True)
+            self.employes.append(Employe.objects.create(user=user, matricule=f"ABS{i}", date_embauche=datetime.date(2024, 1, 1), poste=poste))
+
+    def demande(self, employe, debut, fin, statut='en_attente'):
+        return DemandeConge.objects.create(employe=employe, type_conge='annuel', date_debut=debut, date_fin=fin, statut=statut)
+
+    def test_chevauchements_ignorent_les_rejets(self):
+        premiere = self.demande(self.employes[0], datetime.date(2025, 3, 3), datetime.date(2025, 3, 7))
+        self.demande(self.employes[0], datetime.date(2025, 3, 10), datetime.date(2025, 3, 12), 'rejete')
+        self.demande(self.employes[1], datetime.date(2025, 3, 3), datetime.date(2025, 3, 7))
+
+        self.assertEqual(list(chevauchements(self.employes[0].id, datetime.date(2025, 3, 7), datetime.date(2025, 3, 11))), [premiere])
+        self.assertFalse(chevauchements(self.employes[0].id, datetime.date(2025, 3, 8), datetime.date(2025, 3, 12)).exists())
+        self.assertFalse(chevauchements(self.employes[0].id, datetime.date(2025, 3, 1), datetime.date(2025, 3, 31), exclure_id=premiere.id).exists())
+
+    def test_creation_et_modification_refusees_en_cas_de_chevauchement(self):
+        existante = self.demande(self.employes[0], datetime.date(2025, 3, 3), datetime.date(2025, 3, 7), 'approuve')
+        self.client.force_authenticate(user=self.employes[0].user)
+        url = reverse("demande-conge-list-create")
+
+        resp = self.client.post(url, {"type_conge": "maladie", "date_debut": "2025-03-07", "date_fin": "2025-03-10"}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn(f"#{existante.id}", resp.data["date_debut"][0])
+
+        resp = self.client.post(url, {"type_conge": "maladie", "date_debut": "2025-03-10", "date_fin": "2025-03-11"}, format="json")
+        self.assertEqual(resp.status_code, 201)
+        # Déplacer la seconde demande sur la première : refusé ; la modifier sur place : accepté
+        detail = reverse("demande-conge-detail", args=[resp.data["id"]])
+        self.assertEqual(self.client.patch(detail, {"date_debut": "2025-03-06"}, format="json").status_code, 400)
+        self.assertEqual(self.client.patch(detail, {"date_fin": "2025-03-12"}, format="json").status_code, 200)
+
+    def test_soumission_concurrente_refusee_a_l_ecriture(self):
+        self.client.force_authenticate(user=self.employes[0].user)
+        valider = DemandeCongeSerializer.validate
+
+        def soumission_concurrente(serializer, attrs):
+            attrs = valider(serializer, attrs)
+            # Une autre requête du même employé passe entre la validation et l'écriture
+            self.demande(self.employes[0], datetime.date(2025, 3, 5), datetime.date(2025, 3, 6))
+            return attrs
+
+        with patch.object(DemandeCongeSerializer, 'validate', autospec=True, side_effect=soumission_concurrente):
+            resp = self.client.post(
+                reverse("demande-conge-list-create"),
+                {"type_conge": "annuel", "date_debut": "2025-03-03", "date_fin": "2025-03-07"}, format="json",
+            )
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("date_debut", resp.data)
+        self.assertEqual(DemandeConge.objects.filter(employe=self.employes[0]).count(), 1)
+
+    def test_calendrier_par_balayage(self):
+        a, b, hors_equipe = self.employes
+        self.demande(a, datetime.date(2025, 2, 24), datetime.date(2025, 3, 4), 'approuve')
+        self.demande(b, datetime.date(2025, 3, 4), datetime.date(2025, 3, 5))
+        self.demande(b, datetime.date(2025, 3, 6), datetime.date(2025, 3, 6), 'rejete')
+        self.demande(hors_equipe, datetime.date(2025, 3, 3), datetime.date(2025, 3, 7), 'approuve')
+
+        with self.assertNumQueries(1):
+            jours = calendrier_equipe(self.ventes.id, datetime.date(2025, 3, 3), datetime.date(2025, 3, 9))
+        absents = {jour['date'].day: [absent['matricule'] for absent in jour['absents']] for jour in jours}
+        self.assertEqual(absents, {3: ['ABS0'], 4: ['ABS0', 'ABS1'], 5: ['ABS1'], 6: [], 7: [], 8: [], 9: []})
+        self.assertEqual([jour['ouvre'] for jour in jours], [True] * 5 + [False] * 2)
+
+        approuvees = calendrier_equipe(self.ventes.id, datetime.date(2025, 3, 4), datetime.date(2025, 3, 4), statuts=('approuve',))
+        self.assertEqual([absent['nom'] for absent in approuvees[0]['absents']], ['Abs 0'])
+
+    def test_api_calendrier_equipe(self):
+        self.demande(self.employes[0], datetime.date(2025, 3, 3), datetime.date(2025, 3, 4))
+        url = reverse("departement-absences", args=[self.ventes.id])
+        self.client.force_authenticate(user=self.admin)
+
+        resp = self.client.get(url, {"date_debut": "2025-03-03", "date_fin": "2025-03-05"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([len(jour["absents"]) for jour in resp.data["jours"]], [1, 1, 0])
+        resp = self.client.get(url, {"date_debut": "2025-03-03", "date_fin": "2025-03-05", "statut": "approuve"})
+        self.assertEqual([len(jour["absents"]) for jour in resp.data["jours"]], [0, 0, 0])
+        self.assertEqual(self.client.get(url, {"date_debut": "2025-01-01", "date_fin": "2026-06-01"}).status_code, 400)
+
+        self.client.force_authenticate(user=self.employes[0].user)
+        self.assertEqual(self.client.get(url, {"date_debut": "2025-03-03", "date_fin": "2025-03-05"}).status_code, 403)
@@ -0,0 +1,80 @@
+import datetime
+
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from manage_users.analytique import calculer_tendances
+from manage_users.models import Departement, Employe, Poste, Presence, User
+
+
+class TestTendancesPresence(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.admin = User.objects.create_user(email="ana@example.com", password="pass1234", is_admin=True, is_employe=False, is_verified=True)
+        self.client.force_authenticate(user=self.admin)
+        self.url = reverse("presence-tendances")
+
+        ventes = Departement.objects.create(nom="Ventes")
+        achats = Departement.objects.create(nom="Achats")
+        self.employes = []
+        for i, departement in enumerate((ventes, ventes, achats)):
+            poste = Poste.objects.create(titre=f"Poste {i}", salaire_de_base=100000, departement=departement)
+            user = User.objects.create_user(email=f"ana{i}@example.com", password="pass1234", is_employe=True)
+            self.employes.append(Employe.objects.create(user=user, matricule=f"ANA{i}", date_embauche=datetime.date(2024, 1, 1), poste=poste))
+
+        # Lundi 3 et mardi 4 mars 2025, puis lundi 10 mars
+        journees = {
+            datetime.date(2025, 3, 3): ('present', 'retard', 'absent'),
+            datetime.date(2025, 3, 4): ('present', 'present', 'conge'),
+            datetime.date(2025, 3, 10): ('retard', 'absent', 'present'),
+        }
+        for jour, statuts in journees.items():
+            for employe, statut in zip(self.employes, statuts):
+                minutes = 480 if statut in ('present', 'retard') else 0
+                Presence.objects.create(
+                    employe=employe, date=jour, statut=statut,
+                    duree_travail_minutes=minutes, duree_pauses_minutes=minutes // 8,
+                )
+
+    def test_par_semaine_et_departement(self):
+        lignes = calculer_tendances(datetime.date(2025, 3, 1), datetime.date(2025, 3, 31), 'semaine', 'departement')
+        par_cle = {(ligne['periode'], ligne['groupe_nom']): ligne for ligne in lignes}
+        self.assertEqual(len(lignes), 4)
+
+        ventes = par_cle[(datetime.date(2025, 3, 3), 'Ventes')]
+        self.assertEqual((ventes['jours_travail'], ventes['jours_absent'], ventes['jours_retard']), (4, 0, 1))
+        self.assertEqual(ventes['taux_retard'], 0.25)
+        self.assertEqual(ventes['taux_absenteisme'], 0.0)
+        self.assertEqual(ventes['minutes_travail_moyennes'], 480.0)
+
+        # Le congé n'entre pas dans les jours de travail
+        achats = par_cle[(datetime.date(2025, 3, 3), 'Achats')]
+        self.assertEqual((achats['jours_travail'], achats['taux_absenteisme'], achats['taux_retard']), (1, 1.0, None))
+
+    def test_plage_entiere_sans_pas(self):
+        (global_,) = calculer_tendances(datetime.date(2025, 3, 1), datetime.date(2025, 3, 31))
+        self.assertEqual(global_['jours_travail'], 8)
+        self.assertEqual(global_['taux_absenteisme'], 0.25)
+        self.assertEqual(global_['taux_retard'], round(2 / 6, 4))
+        self.assertEqual(global_['minutes_pauses_moyennes'], 60.0)
+
+    def test_api_mise_en_cache_par_parametres(self):
+        params = {"date_debut": "2025-03-01", "date_fin": "2025-03-31", "pas": "mois", "groupe": "poste"}
+        with self.assertNumQueries(1):
+            resp = self.client.get(self.url, params)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.data["resultats"]), 3)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url, params).data, resp.data)
+        with self.assertNumQueries(1):
+            self.client.get(self.url, {**params, "pas": "jour"})
+
+    def test_parametres_et_permissions(self):
+        self.assertEqual(self.client.get(self.url, {"date_debut": "2025-03-31", "date_fin": "2025-03-01"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"date_debut": "2025-03-01", "date_fin": "2025-03-31", "pas": "annee"}).status_code, 400)
+
+        self.client.force_authenticate(user=self.employes[0].user)
+        self.assertEqual(self.client.get(self.url, {"date_debut": "2025-03-01", "date_fin": "2025-03-31"}).status_code, 403)
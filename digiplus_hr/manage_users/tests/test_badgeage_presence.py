@@ -1,10 +1,18 @@
+import datetime
+from unittest.mock import patch
+
 from rest_framework.test import APITestCase
+from django.core.cache import cache
+from django.test.utils import override_settings
 from django.urls import reverse
 from django.utils import timezone
 
 from manage_users.models import User, Employe, CodeQR, Badgeage, Presence
+from manage_users.rapports import verifier_rapports
 
 
+# Les scénarios enchaînent des scans identiques (cycles de pauses) : sans anti-rebond
+@override_settings(BADGEAGE_ANTIREBOND_SECONDES=0)
 class TestBadgeagePresence(APITestCase):
     def test_badgeage_updates_presence(self):
         user = User.objects.create_user(
@@ -58,3 +66,249 @@ class TestBadgeagePresence(APITestCase):
 
         badgeages_today = Badgeage.objects.filter(employe=employe, date=timezone.now().date())
         self.assertEqual(badgeages_today.count(), 4)
+
+    @override_settings(TIME_ZONE="Pacific/Kiritimati")
+    def test_scanner_date_et_heure_locales(self):
+        user = User.objects.create_user(email="emp6@example.com", password="pass1234", is_employe=True, is_verified=True)
+        employe = Employe.objects.create(user=user, matricule="EMP105", date_embauche=timezone.now().date())
+        self.client.force_authenticate(user=user)
+        # 12h UTC le 2 mars : déjà le 3 mars à 2h en heure locale (UTC+14)
+        moment = datetime.datetime(2026, 3, 2, 12, 0, tzinfo=datetime.timezone.utc)
+
+        with patch("django.utils.timezone.now", return_value=moment):
+            resp = self.client.post(reverse("badgeage-scanner"), {"user_id": user.id, "type": "arrivee"}, format="json")
+
+        self.assertEqual(resp.status_code, 201)
+        presence = Presence.objects.get(employe=employe, date=datetime.date(2026, 3, 3))
+        self.assertEqual(presence.heure_arrivee, datetime.time(2, 0))
+        self.assertTrue(Badgeage.objects.filter(employe=employe, date=datetime.date(2026, 3, 3)).exists())
+
+        with patch("django.utils.timezone.now", return_value=moment + datetime.timedelta(hours=8, minutes=30)):
+            resp = self.client.post(reverse("badgeage-scanner"), {"user_id": user.id, "type": "depart"}, format="json")
+
+        self.assertEqual(resp.status_code, 201)
+        presence.refresh_from_db()
+        self.assertEqual(presence.heure_depart, datetime.time(10, 30))
+        self.assertEqual(presence.duree_travail_minutes, 510)
+
+    def test_scanner_refuse_transitions_invalides(self):
+        user = User.objects.create_user(
+            email="emp2@example.com",
+            password="pass1234",
+            first_name="Emp",
+            last_name="Deux",
+            is_employe=True,
+            is_verified=True,
+        )
+        employe = Employe.objects.create(
+            user=user,
+            matricule="EMP101",
+            date_embauche=timezone.now().date(),
+        )
+
+        self.client.force_authenticate(user=user)
+        scanner_url = reverse("badgeage-scanner")
+
+        def scan(badge_type):
+            return self.client.post(scanner_url, {"user_id": user.id, "type": badge_type}, format="json")
+
+        resp = scan("pause_debut")
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(Presence.objects.filter(employe=employe).exists())
+
+        self.assertEqual(scan("arrivee").status_code, 201)
+        self.assertEqual(scan("arrivee").status_code, 400)
+        self.assertEqual(scan("pause_fin").status_code, 400)
+        self.assertEqual(scan("pause_debut").status_code, 201)
+        self.assertEqual(scan("depart").status_code, 400)
+
+        presence = Presence.objects.get(employe=employe, date=timezone.now().date())
+        self.assertIsNotNone(presence.pause_en_cours_depuis)
+
+        self.assertEqual(scan("pause_fin").status_code, 201)
+        presence.refresh_from_db()
+        self.assertIsNone(presence.pause_en_cours_depuis)
+        self.assertEqual(Badgeage.objects.filter(employe=employe).count(), 3)
+
+    def test_scanner_cout_constant_selon_le_nombre_d_evenements(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        user = User.objects.create_user(
+            email="emp3@example.com",
+            password="pass1234",
+            first_name="Emp",
+            last_name="Trois",
+            is_employe=True,
+            is_verified=True,
+        )
+        Employe.objects.create(user=user, matricule="EMP102", date_embauche=timezone.now().date())
+
+        self.client.force_authenticate(user=user)
+        scanner_url = reverse("badgeage-scanner")
+
+        def scan(badge_type):
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.client.post(scanner_url, {"user_id": user.id, "type": badge_type}, format="json")
+            self.assertEqual(resp.status_code, 201)
+            return len(ctx.captured_queries)
+
+        scan("arrivee")
+        premier_cycle = [scan("pause_debut"), scan("pause_fin")]
+        for _ in range(5):
+            scan("pause_debut")
+            scan("pause_fin")
+        dernier_cycle = [scan("pause_debut"), scan("pause_fin")]
+        self.assertEqual(premier_cycle, dernier_cycle)
+
+    def test_scanner_lot_rejoue_les_scans_hors_ligne(self):
+        admin = User.objects.create_user(
+            email="borne@example.com",
+            password="pass1234",
+            first_name="Borne",
+            last_name="Accueil",
+            is_employe=False,
+            is_admin=True,
+            is_verified=True,
+        )
+        user = User.objects.create_user(
+            email="emp4@example.com",
+            password="pass1234",
+            first_name="Emp",
+            last_name="Quatre",
+            is_employe=True,
+            is_verified=True,
+        )
+        employe = Employe.objects.create(user=user, matricule="EMP103", date_embauche=timezone.now().date())
+        code_qr = CodeQR.objects.create(employe=employe, code_unique=CodeQR.generate_unique_code(), actif=True)
+
+        self.client.force_authenticate(user=admin)
+        debut = timezone.now().replace(hour=8, minute=0, second=0, microsecond=0) - timezone.timedelta(days=1)
+
+        def horodatage(minutes):
+            return (debut + timezone.timedelta(minutes=minutes)).isoformat()
+
+        scans = [
+            {"code_unique": code_qr.code_unique, "type": "arrivee", "horodatage": horodatage(0)},
+            {"user_id": user.id, "type": "pause_debut", "horodatage": horodatage(240)},
+            {"user_id": user.id, "type": "pause_fin", "horodatage": horodatage(270)},
+            {"code_unique": code_qr.code_unique, "type": "depart", "horodatage": horodatage(540)},
+            {"code_unique": code_qr.code_unique, "type": "depart", "horodatage": horodatage(541)},
+            {"code_unique": "inconnu", "type": "arrivee", "horodatage": horodatage(0)},
+            {"user_id": user.id, "type": "sieste", "horodatage": horodatage(300)},
+        ]
+        resp = self.client.post(reverse("badgeage-scanner-lot"), {"scans": scans}, format="json")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["acceptes"], 4)
+        self.assertEqual(resp.data["rejetes"], 3)
+        self.assertEqual([r["index"] for r in resp.data["resultats"]], list(range(7)))
+        self.assertEqual(resp.data["resultats"][4]["statut"], "rejete")
+
+        presence = Presence.objects.get(employe=employe, date=debut.date())
+        self.assertEqual(presence.nb_pauses, 1)
+        self.assertEqual(presence.duree_pauses_minutes, 30)
+        self.assertEqual(presence.duree_travail_minutes, 510)
+        self.assertEqual(Badgeage.objects.filter(employe=employe, date=debut.date()).count(), 4)
+
+    def test_scanner_lot_journee_creee_par_un_scan_concurrent(self):
+        admin = User.objects.create_user(
+            email="borne2@example.com", password="pass1234", is_employe=False, is_admin=True, is_verified=True,
+        )
+        user = User.objects.create_user(email="emp5@example.com", password="pass1234", is_employe=True, is_verified=True)
+        employe = Employe.objects.create(user=user, matricule="EMP104", date_embauche=timezone.now().date())
+        self.client.force_authenticate(user=admin)
+        debut = timezone.now().replace(hour=8, minute=0, second=0, microsecond=0) - timezone.timedelta(days=1)
+
+        # Le scanner crée la journée entre la lecture verrouillée du lot et son insertion
+        bulk_create = Presence.objects.bulk_create
+
+        def scanner_concurrent(objs, **kwargs):
+            Presence.objects.create(employe=employe, date=debut.date(), statut='present', heure_arrivee=debut.time())
+            return bulk_create(objs, **kwargs)
+
+        scans = [
+            {"user_id": user.id, "type": "arrivee", "horodatage": (debut + timezone.timedelta(minutes=5)).isoformat()},
+            {"user_id": user.id, "type": "depart", "horodatage": (debut + timezone.timedelta(hours=9)).isoformat()},
+        ]
+        with patch.object(Presence.objects, 'bulk_create', side_effect=scanner_concurrent):
+            resp = self.client.post(reverse("badgeage-scanner-lot"), {"scans": scans}, format="json")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([r["statut"] for r in resp.data["resultats"]], ["rejete", "accepte"])
+        presence = Presence.objects.get(employe=employe, date=debut.date())
+        self.assertEqual(presence.heure_arrivee, debut.time())
+        self.assertEqual(presence.duree_travail_minutes, 540)
+        self.assertEqual(verifier_rapports(debut.year, debut.month), [])
+
+
+class TestIdempotenceBadgeage(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="idem@example.com",
+            password="pass1234",
+            first_name="Idem",
+            last_name="Test",
+            is_employe=True,
+            is_verified=True,
+        )
+        self.employe = Employe.objects.create(
+            user=self.user,
+            matricule="EMP110",
+            date_embauche=timezone.now().date(),
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("badgeage-scanner")
+
+    def test_cle_idempotence_rejoue_la_reponse(self):
+        payload = {"user_id": self.user.id, "type": "arrivee"}
+        premier = self.client.post(self.url, payload, format="json", HTTP_IDEMPOTENCY_KEY="borne-1-0001")
+        self.assertEqual(premier.status_code, 201)
+
+        with self.assertNumQueries(0):
+            rejeu = self.client.post(self.url, payload, format="json", HTTP_IDEMPOTENCY_KEY="borne-1-0001")
+        self.assertEqual(rejeu.status_code, 201)
+        self.assertEqual(rejeu["Idempotent-Replayed"], "true")
+        self.assertEqual(rejeu.data["id"], premier.data["id"])
+        self.assertEqual(Badgeage.objects.filter(employe=self.employe).count(), 1)
+
+    def test_cle_idempotence_reutilisee_pour_un_autre_corps(self):
+        premier = self.client.post(self.url, {"user_id": self.user.id, "type": "arrivee"}, format="json", HTTP_IDEMPOTENCY_KEY="borne-1-0002")
+        self.assertEqual(premier.status_code, 201)
+
+        resp = self.client.post(self.url, {"user_id": self.user.id, "type": "pause_debut"}, format="json", HTTP_IDEMPOTENCY_KEY="borne-1-0002")
+        self.assertEqual(resp.status_code, 422)
+        self.assertEqual(Badgeage.objects.filter(employe=self.employe).count(), 1)
+
+    @override_settings(BADGEAGE_ANTIREBOND_SECONDES=30)
+    def test_double_appui_court_circuite(self):
+        payload = {"user_id": self.user.id, "type": "arrivee"}
+        self.assertEqual(self.client.post(self.url, payload, format="json").status_code, 201)
+
+        resp = self.client.post(self.url, payload, format="json")
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(Badgeage.objects.filter(employe=self.employe).count(), 1)
+
+        # Un autre type de scan n'est pas concerné par la fenêtre
+        resp = self.client.post(self.url, {"user_id": self.user.id, "type": "pause_debut"}, format="json")
+        self.assertEqual(resp.status_code, 201)
+
+    @override_settings(BADGEAGE_ANTIREBOND_SECONDES=30)
+    def test_scan_non_autorise_ne_consomme_pas_la_fenetre(self):
+        code_qr = CodeQR.objects.create(employe=self.employe, code_unique=CodeQR.generate_unique_code(self.employe.id), actif=True)
+        autre = User.objects.create_user(email="idem2@example.com", password="pass1234", is_employe=True, is_verified=True)
+        Employe.objects.create(user=autre, matricule="EMP111", date_embauche=timezone.now().date())
+        payload = {"code_unique": code_qr.code_unique, "type": "arrivee"}
+
+        self.client.force_authenticate(user=autre)
+        self.assertEqual(self.client.post(self.url, payload, format="json").status_code, 403)
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.post(self.url, payload, format="json").status_code, 201)
+
+    @override_settings(BADGEAGE_ANTIREBOND_SECONDES=30)
+    def test_scan_refuse_ne_bloque_pas_la_fenetre(self):
+        payload = {"user_id": self.user.id, "type": "depart"}
+        self.assertEqual(self.client.post(self.url, payload, format="json").status_code, 400)
+        self.assertEqual(self.client.post(self.url, payload, format="json").status_code, 400)
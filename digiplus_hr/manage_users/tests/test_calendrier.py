@@ -0,0 +1,114 @@
+import datetime
+
+import numpy as np
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from manage_users.calendrier import (
+    calendrier_de, est_jour_ouvre, invalider_calendriers, jours_ouvres_entre, masque_ouvres,
+)
+from manage_users.models import CalendrierTravail, DemandeConge, Departement, Employe, JourFerie, Poste, User
+from manage_users.serializers import DemandeCongeSerializer
+
+
+def jours_ouvres_naifs(debut, fin, calendrier_id=None):
+    return sum(
+        est_jour_ouvre(debut + datetime.timedelta(days=i), calendrier_id)
+        for i in range((fin - debut).days + 1)
+    )
+
+
+class TestCalendrier(TestCase):
+    def setUp(self):
+        invalider_calendriers()
+        self.addCleanup(invalider_calendriers)
+        # Férié commun à tous les calendriers : jeudi 1er mai 2025
+        JourFerie.objects.create(date=datetime.date(2025, 5, 1), libelle="Fête du travail")
+        self.site = CalendrierTravail.objects.create(nom="Usine", jours_repos="6")
+        JourFerie.objects.create(calendrier=self.site, date=datetime.date(2025, 5, 3), libelle="Fête locale")
+
+    def test_defaut_semaine_et_feries_communs(self):
+        # Mai 2025 : 22 jours de semaine, moins le 1er mai
+        self.assertEqual(jours_ouvres_entre(datetime.date(2025, 5, 1), datetime.date(2025, 5, 31)), 21)
+        self.assertFalse(est_jour_ouvre(datetime.date(2025, 5, 1)))
+        self.assertFalse(est_jour_ouvre(datetime.date(2025, 5, 3)))
+        self.assertTrue(est_jour_ouvre(datetime.date(2025, 5, 2)))
+
+    def test_calendrier_de_site(self):
+        # Repos le dimanche seulement ; le samedi 3 mai est férié sur ce site
+        self.assertFalse(est_jour_ouvre(datetime.date(2025, 5, 3), self.site.id))
+        self.assertTrue(est_jour_ouvre(datetime.date(2025, 5, 10), self.site.id))
+        self.assertEqual(jours_ouvres_entre(datetime.date(2025, 5, 1), datetime.date(2025, 5, 31), self.site.id), 25)
+
+    def test_plage_sur_plusieurs_annees_sans_requete(self):
+        debut, fin = datetime.date(2023, 11, 17), datetime.date(2026, 2, 3)
+        attendu = jours_ouvres_naifs(debut, fin, self.site.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(jours_ouvres_entre(debut, fin, self.site.id), attendu)
+        self.assertEqual(jours_ouvres_entre(fin, debut), 0)
+
+    def test_masque_vectorise(self):
+        jours = [datetime.date(2024, 12, 30) + datetime.timedelta(days=i) for i in range(160)]
+        masque = masque_ouvres(jours, self.site.id)
+        self.assertEqual(masque.dtype, np.bool_)
+        self.assertEqual(masque.tolist(), [est_jour_ouvre(jour, self.site.id) for jour in jours])
+        self.assertEqual(masque_ouvres(np.array([], dtype='datetime64[D]')).shape, (0,))
+
+    def test_modification_invalide_les_tables(self):
+        jour = datetime.date(2025, 7, 14)
+        self.assertTrue(est_jour_ouvre(jour))
+        JourFerie.objects.create(date=jour, libelle="Fête nationale")
+        self.assertFalse(est_jour_ouvre(jour))
+
+    def test_calendrier_du_departement_et_duree_des_conges(self):
+        departement = Departement.objects.create(nom="Atelier", calendrier=self.site)
+        poste = Poste.objects.create(titre="Soudeur", salaire_de_base=100000, departement=departement)
+        user = User.objects.create_user(email="soudeur@example.com", password="pass1234", is_employe=True)
+        employe = Employe.objects.create(user=user, matricule="SOU1", date_embauche=datetime.date(2024, 1, 1), poste=poste)
+        self.assertEqual(calendrier_de(employe.id), self.site.id)
+
+        demande = DemandeConge.objects.create(
+            employe=employe, type_conge='annuel',
+            date_debut=datetime.date(2025, 5, 1), date_fin=datetime.date(2025, 5, 10),
+        )
+        # 10 jours, moins le dimanche 4 et les fériés du 1er et du 3 mai
+        self.assertEqual(DemandeCongeSerializer(demande).data['jours_ouvres'], 7)
+
+
+    def test_seul_le_poste_de_l_employe_invalide_les_tables(self):
+        departement = Departement.objects.create(nom="Logistique", calendrier=self.site)
+        user = User.objects.create_user(email="cariste@example.com", password="pass1234", is_employe=True)
+        employe = Employe.objects.create(user=user, matricule="CAR1", date_embauche=datetime.date(2024, 1, 1))
+        poste = Poste.objects.create(titre="Cariste", salaire_de_base=100000, departement=departement)
+        self.assertIsNone(calendrier_de(employe.id))
+
+        employe.telephone = "0102030405"
+        employe.save()
+        employe.save(update_fields=['statut'])
+        with self.assertNumQueries(0):
+            calendrier_de(employe.id)
+
+        employe.poste = poste
+        employe.save(update_fields=['poste'])
+        self.assertEqual(calendrier_de(employe.id), self.site.id)
+
+class TestCalendrierAPI(APITestCase):
+    def setUp(self):
+        self.addCleanup(invalider_calendriers)
+        admin = User.objects.create_user(email="cal@example.com", password="pass1234", is_admin=True, is_verified=True)
+        self.client.force_authenticate(user=admin)
+
+    def test_jours_ouvres_et_defaut_unique(self):
+        resp = self.client.post(reverse("calendrier-travail-list"), {"nom": "Siège", "jours_repos": "6,5", "par_defaut": True}, format="json")
+        self.assertEqual(resp.status_code, 201, resp.data)
+        self.assertEqual(resp.data["jours_repos"], "5,6")
+
+        resp = self.client.post(reverse("calendrier-travail-list"), {"nom": "Dépôt", "par_defaut": True}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+        calendrier_id = CalendrierTravail.objects.get(nom="Siège").id
+        url = reverse("calendrier-travail-jours-ouvres", args=[calendrier_id])
+        resp = self.client.get(url, {"date_debut": "2025-05-01", "date_fin": "2025-05-31"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["jours_ouvres"], 22)
@@ -0,0 +1,83 @@
+import datetime
+from unittest.mock import AsyncMock, patch
+
+from asgiref.sync import async_to_sync
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from manage_users import compteurs
+from manage_users.consumers import NotificationConsumer
+from manage_users.models import DemandeConge, Employe, User
+
+
+@override_settings(BADGEAGE_ANTIREBOND_SECONDES=0, DASHBOARD_COMPTEURS_FENETRE_MS=0, NOTIFICATIONS_DIFFUSION_EN_PROCESSUS=False)
+@patch('manage_users.compteurs.async_to_sync')
+@patch('manage_users.compteurs.get_channel_layer')
+class TestCompteursTempsReel(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email="live@example.com", password="pass1234", is_admin=True, is_employe=False, is_verified=True)
+        user = User.objects.create_user(email="live.emp@example.com", password="pass1234", is_employe=True, is_verified=True)
+        self.employe = Employe.objects.create(user=user, matricule="LIV1", date_embauche=datetime.date(2024, 1, 1))
+
+    def deltas_envoyes(self, mock_async_to_sync):
+        envoi = mock_async_to_sync.return_value
+        return [appel.args[1]['content']['delta'] for appel in envoi.call_args_list if appel.args[0] == 'admins']
+
+    def test_scanner_publie_les_transitions_apres_commit(self, mock_get_channel_layer, mock_async_to_sync):
+        self.client.force_authenticate(user=self.employe.user)
+        url = reverse("badgeage-scanner")
+        for badge_type in ("arrivee", "pause_debut", "pause_fin", "depart"):
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.post(url, {"user_id": self.employe.user_id, "type": badge_type}, format="json")
+            self.assertEqual(resp.status_code, 201)
+
+        self.assertEqual(self.deltas_envoyes(mock_async_to_sync), [
+            {'presents': 1},
+            {'presents': -1, 'en_pause': 1},
+            {'en_pause': -1, 'presents': 1},
+            {'presents': -1, 'partis': 1},
+        ])
+
+    def test_cycle_des_demandes_de_conge(self, mock_get_channel_layer, mock_async_to_sync):
+        aujourd_hui = timezone.localdate()
+        with self.captureOnCommitCallbacks(execute=True):
+            demande = DemandeConge.objects.create(
+                employe=self.employe, type_conge='annuel', date_debut=aujourd_hui, date_fin=aujourd_hui,
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            DemandeConge.objects.get(pk=demande.pk).approuver(admin=self.admin)
+
+        self.assertEqual(self.deltas_envoyes(mock_async_to_sync), [{'conges_en_attente': 1}, {'conges_en_attente': -1}])
+
+    @override_settings(DASHBOARD_COMPTEURS_FENETRE_MS=60000)
+    def test_deltas_regroupes_sur_la_fenetre(self, mock_get_channel_layer, mock_async_to_sync):
+        with self.captureOnCommitCallbacks(execute=True):
+            compteurs.signaler_presences([(None, 'presents')] * 3)
+            compteurs.signaler_presences([('presents', 'en_pause')])
+            compteurs.signaler_conge(None, 'en_attente')
+        self.assertEqual(self.deltas_envoyes(mock_async_to_sync), [])
+
+        compteurs._minuteur[0].cancel()
+        compteurs.vider()
+        self.assertEqual(self.deltas_envoyes(mock_async_to_sync), [{'presents': 2, 'en_pause': 1, 'conges_en_attente': 1}])
+
+    def test_etat_initial(self, mock_get_channel_layer, mock_async_to_sync):
+        self.client.force_authenticate(user=self.admin)
+        DemandeConge.objects.create(
+            employe=self.employe, type_conge='annuel', date_debut=timezone.localdate(), date_fin=timezone.localdate(),
+        )
+        resp = self.client.get(reverse("dashboard-compteurs"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["compteurs"], {'presents': 0, 'en_pause': 0, 'partis': 0, 'conges_en_attente': 1})
+
+
+class TestConsumerCompteurs(APITestCase):
+    def test_relaie_le_contenu(self):
+        consumer = NotificationConsumer()
+        consumer.send = AsyncMock()
+        async_to_sync(consumer.dashboard_compteurs)(
+            {'type': 'dashboard_compteurs', 'content': {'type': 'compteurs', 'delta': {'presents': 1}}}
+        )
+        consumer.send.assert_awaited_once_with(text_data='{"type": "compteurs", "delta": {"presents": 1}}')
@@ -0,0 +1,106 @@
+import datetime
+from unittest.mock import patch
+
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from manage_users.calendrier import calendrier_de
+from manage_users.models import DemandeConge, DemandeCongeAudit, Employe, Notification, NotificationSortante, SoldeConge, User
+
+
+@override_settings(DASHBOARD_COMPTEURS_FENETRE_MS=0, NOTIFICATIONS_DIFFUSION_EN_PROCESSUS=False)
+@patch('manage_users.compteurs.async_to_sync')
+class TestDecisionGroupee(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email="conges.admin@example.com", password="pass1234", is_admin=True, is_employe=False, is_verified=True)
+        self.client.force_authenticate(user=self.admin)
+        self.url = reverse("admin-demandes-decision-groupee")
+        self.demandes = []
+        for i in range(5):
+            user = User.objects.create_user(email=f"conges{i}@example.com", password="pass1234", is_employe=True)
+            employe = Employe.objects.create(user=user, matricule=f"CNG{i}", date_embauche=datetime.date(2024, 1, 1))
+            self.demandes.append(DemandeConge.objects.create(
+                employe=employe, type_conge='annuel',
+                date_debut=datetime.date(2025, 8, 1), date_fin=datetime.date(2025, 8, 15),
+            ))
+
+    def test_approbation_en_requetes_constantes(self, _mock_compteurs):
+        deja_rejetee = self.demandes[4]
+        deja_rejetee.statut = 'rejete'
+        deja_rejetee.save()
+        ids = [demande.id for demande in self.demandes] + [999999]
+
+        calendrier_de(self.demandes[0].employe_id)  # tables du calendrier chargées une fois par processus
+        with self.captureOnCommitCallbacks(execute=True):
+            # Dont 5 pour l'imputation au registre : agrégat, savepoint, écritures, soldes créés puis incrémentés
+            with self.assertNumQueries(13):
+                resp = self.client.post(self.url, {"demande_ids": ids, "decision": "approuve"}, format="json")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["traitees"], ids[:4])
+        self.assertEqual(resp.data["ignorees"], [deja_rejetee.id, 999999])
+        self.assertEqual(DemandeConge.objects.filter(statut='approuve').count(), 4)
+        self.assertEqual(Notification.objects.filter(titre='Congé approuvé').count(), 4)
+        self.assertEqual(DemandeCongeAudit.objects.filter(admin=self.admin, action='approuve').count(), 4)
+        self.assertEqual(SoldeConge.objects.get(employe=self.demandes[0].employe, annee=2025).consommes, 11)
+
+        # Un seul bulk_create dans la file : quatre employés et le groupe admins
+        sortantes = NotificationSortante.objects.all()
+        envois = [sortante.groupe for sortante in sortantes if sortante.contenu.get("type") != "non_lues"]
+        self.assertEqual(len(envois), 5)
+        # Puis, après validation, le compteur de non lues de chaque destinataire
+        self.assertEqual(len(sortantes) - len(envois), 4)
+        self.assertEqual(envois[-1], 'admins')
+        self.assertIn(f"user_{self.demandes[0].employe.user_id}", envois)
+
+    def test_rejet_avec_raison(self, _mock_compteurs):
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(
+                self.url, {"demande_ids": [self.demandes[0].id], "decision": "rejete", "raison": "Effectif insuffisant"}, format="json",
+            )
+        self.assertEqual(resp.status_code, 200)
+        notification = Notification.objects.get(demande_conge=self.demandes[0])
+        self.assertEqual(notification.titre, 'Congé rejeté')
+        self.assertTrue(notification.message.endswith("Raison: Effectif insuffisant"))
+
+    def test_changement_de_statut_par_le_detail(self, _mock_compteurs):
+        demande = self.demandes[0]
+        resp = self.client.patch(reverse("demande-conge-detail", args=[demande.id]), {"statut": "approuve"}, format="json")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["statut"], "approuve")
+        self.assertEqual(Notification.objects.get(demande_conge=demande).titre, 'Congé approuvé')
+        sortante = NotificationSortante.objects.get(groupe=f"user_{demande.employe.user_id}")
+        self.assertEqual(sortante.contenu["statut"], "approuve")
+        self.assertTrue(DemandeCongeAudit.objects.filter(demande_conge=demande, admin=self.admin, action='approuve').exists())
+
+    def test_statut_par_le_detail_reserve_aux_admins(self, _mock_compteurs):
+        demande, autre = self.demandes[0], self.demandes[1]
+        self.client.force_authenticate(user=demande.employe.user)
+
+        resp = self.client.patch(reverse("demande-conge-detail", args=[demande.id]), {"statut": "approuve"}, format="json")
+        self.assertEqual(resp.status_code, 403)
+        self.assertEqual(self.client.get(reverse("demande-conge-detail", args=[autre.id])).status_code, 404)
+        demande.refresh_from_db()
+        self.assertEqual(demande.statut, 'en_attente')
+        self.assertFalse(DemandeCongeAudit.objects.exists())
+
+    def test_detail_ne_redecide_pas_une_demande_traitee(self, _mock_compteurs):
+        demande = self.demandes[0]
+        demande.statut = 'rejete'
+        demande.save()
+
+        resp = self.client.patch(reverse("demande-conge-detail", args=[demande.id]), {"statut": "approuve"}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        demande.refresh_from_db()
+        self.assertEqual(demande.statut, 'rejete')
+
+    @override_settings(CONGES_DECISION_LOT_MAX=2)
+    def test_validation_et_permissions(self, _mock_compteurs):
+        ids = [demande.id for demande in self.demandes]
+        self.assertEqual(self.client.post(self.url, {"demande_ids": ids, "decision": "approuve"}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(self.url, {"demande_ids": ids[:1], "decision": "annule"}, format="json").status_code, 400)
+
+        self.client.force_authenticate(user=self.demandes[0].employe.user)
+        self.assertEqual(self.client.post(self.url, {"demande_ids": ids[:1], "decision": "approuve"}, format="json").status_code, 403)
@@ -0,0 +1,112 @@
+import datetime
+from io import StringIO
+from unittest.mock import AsyncMock, patch
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TransactionTestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from manage_users.consumers import NotificationConsumer
+from manage_users.diffusion import etat_file, mettre_en_file, mettre_en_file_lot, vider_file
+from manage_users.models import DemandeConge, Employe, NotificationSortante, User
+
+
+@override_settings(NOTIFICATIONS_DIFFUSION_EN_PROCESSUS=False)
+@patch('manage_users.diffusion.get_channel_layer')
+class TestFileNotifications(TransactionTestCase):
+    def test_envoi_groupe_et_acquittement(self, mock_get_channel_layer):
+        group_send = mock_get_channel_layer.return_value.group_send = AsyncMock()
+        mettre_en_file_lot([("user_1", {"n": 1}), ("admins", {"n": 2}), ("user_1", {"n": 3})])
+
+        self.assertEqual(async_to_sync(vider_file)(), (3, 0))
+
+        # Un seul group_send par groupe, contenus dans l'ordre d'écriture
+        envois = {appel.args[0]: appel.args[1] for appel in group_send.await_args_list}
+        self.assertEqual(group_send.await_count, 2)
+        self.assertEqual(envois["user_1"], {"type": "send_notifications", "contents": [{"n": 1}, {"n": 3}]})
+        self.assertEqual(envois["admins"]["contents"], [{"n": 2}])
+        self.assertFalse(NotificationSortante.objects.exists())
+
+    def test_echec_replanifie_avec_delai(self, mock_get_channel_layer):
+        async def group_send(groupe, message):
+            if groupe == "admins":
+                raise ConnectionError("redis indisponible")
+        mock_get_channel_layer.return_value.group_send = group_send
+        mettre_en_file("admins", {"n": 1})
+        mettre_en_file("user_1", {"n": 2})
+
+        self.assertEqual(async_to_sync(vider_file)(), (1, 1))
+        restante = NotificationSortante.objects.get()
+        self.assertEqual((restante.groupe, restante.tentatives), ("admins", 1))
+        self.assertIn("redis indisponible", restante.derniere_erreur)
+        self.assertGreater(restante.disponible_a, timezone.now())
+
+        # Pas de nouvel essai avant l'échéance ; l'échec reste compté dans l'état de la file
+        self.assertEqual(async_to_sync(vider_file)(), (0, 0))
+        etat = etat_file()
+        self.assertEqual((etat["en_attente"], etat["en_echec"]), (1, 1))
+
+    def test_reservation_expiree_reprise(self, mock_get_channel_layer):
+        mock_get_channel_layer.return_value.group_send = AsyncMock()
+        mettre_en_file("user_1", {"n": 1})
+        # Diffuseur arrêté après réservation : la ligne redevient disponible à l'échéance
+        NotificationSortante.objects.update(disponible_a=timezone.now() - datetime.timedelta(seconds=1))
+
+        call_command('diffuser_notifications', '--une-fois', stdout=StringIO())
+        self.assertFalse(NotificationSortante.objects.exists())
+
+
+@override_settings(NOTIFICATIONS_DIFFUSION_EN_PROCESSUS=False, DASHBOARD_COMPTEURS_FENETRE_MS=0)
+@patch('manage_users.compteurs.async_to_sync')
+class TestOutboxTransactionnelle(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email="outbox@example.com", password="pass1234", is_admin=True, is_employe=False, is_verified=True)
+        user = User.objects.create_user(email="outbox.emp@example.com", password="pass1234", is_employe=True, is_verified=True)
+        self.employe = Employe.objects.create(user=user, matricule="OBX1", date_embauche=datetime.date(2024, 1, 1))
+
+    def test_creation_demande_met_en_file_pour_les_admins(self, _mock_compteurs):
+        self.client.force_authenticate(user=self.employe.user)
+        resp = self.client.post(reverse("demande-conge-list-create"), {
+            "type_conge": "annuel", "date_debut": "2025-08-04", "date_fin": "2025-08-08",
+        }, format="json")
+        self.assertEqual(resp.status_code, 201)
+        sortante = NotificationSortante.objects.get()
+        self.assertEqual(sortante.groupe, "admins")
+        self.assertEqual(sortante.contenu["demande_id"], resp.data["id"])
+
+    def test_echec_metier_annule_le_message(self, _mock_compteurs):
+        demande = DemandeConge.objects.create(
+            employe=self.employe, type_conge='annuel',
+            date_debut=datetime.date(2025, 8, 4), date_fin=datetime.date(2025, 8, 8),
+        )
+        # Transaction appelante annulée : ni statut ni message, aucun réveil du diffuseur
+        with override_settings(NOTIFICATIONS_DIFFUSION_EN_PROCESSUS=True):
+            with self.captureOnCommitCallbacks() as rappels, self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    demande.approuver(admin=self.admin)
+                    raise RuntimeError
+        self.assertEqual(rappels, [])
+        self.assertFalse(NotificationSortante.objects.exists())
+        demande.refresh_from_db()
+        self.assertEqual(demande.statut, 'en_attente')
+
+    def test_etat_de_la_file(self, _mock_compteurs):
+        mettre_en_file("admins", {"n": 1})
+        self.client.force_authenticate(user=self.admin)
+        resp = self.client.get(reverse("dashboard-file-notifications"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((resp.data["en_attente"], resp.data["en_echec"]), (1, 0))
+
+
+class TestConsumerLot(APITestCase):
+    def test_une_trame_par_notification(self):
+        consumer = NotificationConsumer()
+        consumer.send = AsyncMock()
+        async_to_sync(consumer.send_notifications)({'type': 'send_notifications', 'contents': [{'n': 1}, {'n': 2}]})
+        self.assertEqual(consumer.send.await_count, 2)
+        consumer.send.assert_awaited_with(text_data='{"n": 2}')
@@ -0,0 +1,81 @@
+import csv
+import datetime
+import io
+import zipfile
+from xml.etree import ElementTree
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from manage_users.models import User, Departement, Poste, Employe, Presence, Badgeage
+
+NS = {"s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+
+class TestExportsPointage(APITestCase):
+    def setUp(self):
+        self.rh = Departement.objects.create(nom="RH")
+        self.compta = Departement.objects.create(nom="Compta")
+        jour = datetime.date(2026, 3, 2)
+        for i, departement in enumerate([self.rh, self.rh, self.compta]):
+            poste = Poste.objects.create(titre=f"Poste {i}", salaire_de_base=1000, departement=departement)
+            user = User.objects.create_user(
+                email=f"paie{i}@example.com",
+                password="pass1234",
+                first_name="Paie",
+                last_name=f"Nom; \"{i}\" & <co>",
+                is_employe=True,
+            )
+            employe = Employe.objects.create(user=user, matricule=f"PAI{i}", date_embauche=datetime.date(2025, 1, 1), poste=poste)
+            Presence.objects.bulk_create([
+                Presence(employe=employe, date=jour + datetime.timedelta(days=d),
+                         statut='present' if d % 2 == 0 else 'absent', duree_travail_minutes=480 if d % 2 == 0 else 0)
+                for d in range(10)
+            ])
+            Badgeage.objects.create(employe=employe, type='arrivee', date=jour)
+        admin = User.objects.create_user(
+            email="admin.paie@example.com",
+            password="pass1234",
+            first_name="Admin",
+            last_name="Paie",
+            is_employe=False,
+            is_admin=True,
+        )
+        self.client.force_authenticate(user=admin)
+
+    def telecharger(self, url, **params):
+        resp = self.client.get(url, params)
+        self.assertEqual(resp.status_code, 200)
+        with CaptureQueriesContext(connection) as ctx:
+            contenu = b"".join(resp.streaming_content)
+        return resp, contenu, ctx
+
+    def test_csv_presences_filtrees(self):
+        resp, contenu, ctx = self.telecharger(
+            reverse("presence-export"),
+            departement=self.rh.id, statut="present", date_debut="2026-03-02", date_fin="2026-03-06",
+        )
+        self.assertEqual(resp["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        lignes = list(csv.reader(io.StringIO(contenu.decode("utf-8-sig")), delimiter=";"))
+        self.assertEqual(lignes[0][:2], ["matricule", "nom"])
+        self.assertEqual(len(lignes), 1 + 2 * 3)
+        self.assertEqual(lignes[1][1], 'Nom; "0" & <co>')
+        self.assertTrue(all(ligne[5] == "present" for ligne in lignes[1:]))
+
+    def test_xlsx_badgeages(self):
+        resp, contenu, _ = self.telecharger(reverse("badgeage-export"), fichier="xlsx", statut="arrivee")
+        self.assertIn("spreadsheetml", resp["Content-Type"])
+        with zipfile.ZipFile(io.BytesIO(contenu)) as classeur:
+            feuille = ElementTree.fromstring(classeur.read("xl/worksheets/sheet1.xml"))
+        lignes = feuille.findall(".//s:row", NS)
+        self.assertEqual(len(lignes), 4)
+        textes = [t.text for t in lignes[1].findall(".//s:t", NS)]
+        self.assertIn("PAI0", textes)
+
+    def test_dates_incoherentes(self):
+        resp = self.client.get(reverse("presence-export"), {"date_debut": "2026-03-10", "date_fin": "2026-03-01"})
+        self.assertEqual(resp.status_code, 400)
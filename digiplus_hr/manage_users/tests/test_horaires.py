@@ -0,0 +1,151 @@
+import datetime
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from manage_contrat.models import Contrat
+from manage_users.horaires import Horaire, horaire_de, invalider_horaires, statut_arrivee
+from manage_users.models import Departement, Employe, HoraireTravail, Poste, Presence, User
+
+TOUS_LES_JOURS = '0,1,2,3,4,5,6'
+
+
+def creer_employe(email, poste=None):
+    user = User.objects.create_user(
+        email=email, password="pass1234", first_name="Emp", last_name="Horaire",
+        is_employe=True, is_verified=True,
+    )
+    return Employe.objects.create(
+        user=user, matricule=email.split('@')[0].upper(), date_embauche=datetime.date(2024, 1, 1), poste=poste,
+    )
+
+
+class TestHoraireDe(TestCase):
+    def setUp(self):
+        invalider_horaires()
+        self.addCleanup(invalider_horaires)
+        departement = Departement.objects.create(nom="Production")
+        self.poste = Poste.objects.create(titre="Opérateur", salaire_de_base=100000, departement=departement)
+        self.employe = creer_employe("op@example.com", self.poste)
+        HoraireTravail.objects.create(nom="Atelier", poste=self.poste, heure_debut=datetime.time(8, 0), tolerance_minutes=10)
+
+    def test_horaire_du_poste_sans_requete_apres_chargement(self):
+        jour = datetime.date(2025, 3, 3)
+        self.assertEqual(horaire_de(self.employe.id, jour).heure_debut, datetime.time(8, 0))
+        with self.assertNumQueries(0):
+            for _ in range(50):
+                horaire = horaire_de(self.employe.id, jour)
+        self.assertEqual(horaire.tolerance_minutes, 10)
+
+    def test_contrat_actif_prime_sur_le_poste(self):
+        contrat = Contrat.objects.create(
+            employe=self.employe, reference="CTR-H1", type_contrat="cdd", statut="actif",
+            date_debut=datetime.date(2025, 3, 1), date_fin=datetime.date(2025, 3, 31), salaire_base=100000,
+        )
+        HoraireTravail.objects.create(nom="Équipe de nuit", contrat=contrat, heure_debut=datetime.time(21, 0))
+
+        self.assertEqual(horaire_de(self.employe.id, datetime.date(2025, 3, 10)).heure_debut, datetime.time(21, 0))
+        # Hors période du contrat : l'horaire du poste s'applique
+        self.assertEqual(horaire_de(self.employe.id, datetime.date(2025, 4, 10)).heure_debut, datetime.time(8, 0))
+
+    def test_modification_invalide_le_cache(self):
+        jour = datetime.date(2025, 3, 3)
+        horaire_de(self.employe.id, jour)
+        HoraireTravail.objects.filter(poste=self.poste).get().delete()
+        self.assertIsNone(horaire_de(self.employe.id, jour))
+
+    def test_seul_le_poste_de_l_employe_invalide_le_cache(self):
+        jour = datetime.date(2025, 3, 3)
+        horaire_de(self.employe.id, jour)
+        employe = Employe.objects.get(pk=self.employe.pk)
+        employe.telephone = "0102030405"
+        employe.save()
+        employe.save(update_fields=['statut'])
+        with self.assertNumQueries(0):
+            horaire_de(self.employe.id, jour)
+
+        employe.poste = Poste.objects.create(titre="Cariste", salaire_de_base=100000, departement=self.poste.departement)
+        employe.save()
+        self.assertIsNone(horaire_de(self.employe.id, jour))
+
+    @override_settings(PRESENCE_HEURE_DEBUT='09:00', PRESENCE_TOLERANCE_MINUTES=5)
+    def test_horaire_par_defaut(self):
+        autre = creer_employe("libre@example.com")
+        horaire = horaire_de(autre.id, datetime.date(2025, 3, 3))
+        self.assertEqual((horaire.heure_debut, horaire.tolerance_minutes), (datetime.time(9, 0), 5))
+
+
+class TestStatutArrivee(TestCase):
+    horaire = Horaire(datetime.time(8, 0), 10, frozenset(range(5)))
+
+    def moment(self, jour, heure):
+        return timezone.make_aware(datetime.datetime.combine(jour, heure))
+
+    def test_tolerance(self):
+        lundi = datetime.date(2025, 3, 3)
+        self.assertEqual(statut_arrivee(self.horaire, self.moment(lundi, datetime.time(8, 10))), 'present')
+        self.assertEqual(statut_arrivee(self.horaire, self.moment(lundi, datetime.time(8, 10, 1))), 'retard')
+
+    def test_jour_non_travaille_et_sans_horaire(self):
+        samedi = datetime.date(2025, 3, 8)
+        self.assertEqual(statut_arrivee(self.horaire, self.moment(samedi, datetime.time(11, 0))), 'present')
+        self.assertEqual(statut_arrivee(None, self.moment(samedi, datetime.time(11, 0))), 'present')
+
+
+@override_settings(BADGEAGE_ANTIREBOND_SECONDES=0)
+class TestRetardAuScan(APITestCase):
+    def setUp(self):
+        invalider_horaires()
+        self.addCleanup(invalider_horaires)
+        departement = Departement.objects.create(nom="Accueil")
+        self.poste = Poste.objects.create(titre="Agent", salaire_de_base=100000, departement=departement)
+        self.employe = creer_employe("agent@example.com", self.poste)
+        self.client.force_authenticate(user=self.employe.user)
+
+    def scan(self, badge_type):
+        return self.client.post(
+            reverse("badgeage-scanner"), {"user_id": self.employe.user_id, "type": badge_type}, format="json",
+        )
+
+    def test_arrivee_en_retard_conservee_au_depart(self):
+        HoraireTravail.objects.create(nom="Tôt", poste=self.poste, heure_debut=datetime.time(0, 0), jours_travail=TOUS_LES_JOURS)
+
+        self.assertEqual(self.scan("arrivee").status_code, 201)
+        presence = Presence.objects.get(employe=self.employe)
+        self.assertEqual(presence.statut, "retard")
+
+        self.assertEqual(self.scan("depart").status_code, 201)
+        presence.refresh_from_db()
+        self.assertEqual(presence.statut, "retard")
+        self.assertIsNotNone(presence.heure_depart)
+
+    def test_arrivee_a_l_heure(self):
+        HoraireTravail.objects.create(nom="Tard", poste=self.poste, heure_debut=datetime.time(23, 59, 59), jours_travail=TOUS_LES_JOURS)
+
+        self.assertEqual(self.scan("arrivee").status_code, 201)
+        self.assertEqual(Presence.objects.get(employe=self.employe).statut, "present")
+
+
+class TestHoraireTravailAPI(APITestCase):
+    def setUp(self):
+        self.addCleanup(invalider_horaires)
+        admin = User.objects.create_user(email="rh@example.com", password="pass1234", is_admin=True, is_verified=True)
+        self.client.force_authenticate(user=admin)
+        departement = Departement.objects.create(nom="RH")
+        self.poste = Poste.objects.create(titre="Gestionnaire", salaire_de_base=100000, departement=departement)
+
+    def test_creation_et_validation(self):
+        url = reverse("horaire-travail-list")
+        resp = self.client.post(url, {"nom": "Bureau", "poste": self.poste.id, "heure_debut": "08:30",
+                                      "jours_travail": "4,0,1"}, format="json")
+        self.assertEqual(resp.status_code, 201, resp.data)
+        self.assertEqual(resp.data["jours_travail"], "0,1,4")
+
+        resp = self.client.post(url, {"nom": "Orphelin", "heure_debut": "08:30"}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.post(url, {"nom": "Bureau", "poste": self.poste.id, "heure_debut": "08:30",
+                                      "jours_travail": "0,7"}, format="json")
+        self.assertEqual(resp.status_code, 400)
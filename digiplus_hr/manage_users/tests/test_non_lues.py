@@ -0,0 +1,108 @@
+import datetime
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from manage_users.conges import decider_demandes
+from manage_users.models import DemandeConge, Employe, Notification, NotificationSortante, User
+from manage_users.non_lues import non_lues
+
+
+@override_settings(NOTIFICATIONS_DIFFUSION_EN_PROCESSUS=False, DASHBOARD_COMPTEURS_FENETRE_MS=0)
+@patch('manage_users.compteurs.async_to_sync')
+class TestNotificationsNonLues(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.admin = User.objects.create_user(email="nl.admin@example.com", password="pass1234", is_admin=True, is_employe=False, is_verified=True)
+        self.employes = []
+        for i in range(2):
+            user = User.objects.create_user(email=f"nl{i}@example.com", password="pass1234", is_employe=True, is_verified=True)
+            self.employes.append(Employe.objects.create(user=user, matricule=f"NL{i}", date_embauche=datetime.date(2024, 1, 1)))
+
+    def demande(self, employe, jour):
+        return DemandeConge.objects.create(employe=employe, type_conge='annuel', date_debut=jour, date_fin=jour)
+
+    def test_compteur_tenu_en_cache(self, _mock_compteurs):
+        user_id = self.employes[0].user_id
+        self.assertEqual(non_lues(user_id), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.demande(self.employes[0], datetime.date(2025, 3, 3)).approuver(admin=self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            decider_demandes([
+                self.demande(self.employes[0], datetime.date(2025, 3, 4)).id,
+                self.demande(self.employes[1], datetime.date(2025, 3, 4)).id,
+            ], 'rejete', self.admin)
+
+        self.assertEqual(Notification.objects.filter(destinataire_id=user_id).count(), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(non_lues(user_id), 2)
+        # Valeur poussée au destinataire par la file temps réel après chaque validation
+        poussees = [
+            sortante.contenu["non_lues"]
+            for sortante in NotificationSortante.objects.filter(groupe=f"user_{user_id}")
+            if sortante.contenu.get("type") == "non_lues"
+        ]
+        self.assertEqual(poussees, [1, 2])
+
+    def test_lecture_et_endpoints(self, _mock_compteurs):
+        autre = self.demande(self.employes[1], datetime.date(2025, 3, 3))
+        autre.approuver()
+        demande = self.demande(self.employes[0], datetime.date(2025, 3, 3))
+        demande.rejeter()
+        notification = Notification.objects.get(demande_conge=demande)
+        self.client.force_authenticate(user=self.employes[0].user)
+
+        resp = self.client.get(reverse("notifications-list"))
+        self.assertEqual([item["id"] for item in resp.data["results"]], [notification.id])
+        self.assertEqual(self.client.get(reverse("notifications-non-lues")).data, {"non_lues": 1})
+        with self.assertNumQueries(0):
+            self.client.get(reverse("notifications-non-lues"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.patch(reverse("notification-mark-read", args=[notification.id]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.client.get(reverse("notifications-non-lues")).data, {"non_lues": 0})
+        # Notification d'un autre utilisateur : introuvable
+        autre_notification = Notification.objects.get(demande_conge=autre)
+        self.assertEqual(self.client.patch(reverse("notification-mark-read", args=[autre_notification.id])).status_code, 404)
+
+    def test_cle_absente_recomptee(self, _mock_compteurs):
+        user_id = self.employes[0].user_id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.demande(self.employes[0], datetime.date(2025, 3, 3)).approuver()
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(non_lues(user_id), 1)
+
+    def test_lecture_groupee_en_un_update(self, _mock_compteurs):
+        for jour in (3, 4, 5, 6):
+            self.demande(self.employes[0], datetime.date(2025, 3, jour)).approuver()
+        self.demande(self.employes[1], datetime.date(2025, 3, 3)).approuver()
+        notifications = list(Notification.objects.filter(destinataire=self.employes[0].user).order_by('id'))
+        Notification.objects.filter(pk__in=[n.pk for n in notifications[:2]]).update(date_envoi=datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc))
+        self.client.force_authenticate(user=self.employes[0].user)
+        url = reverse("notifications-mark-read")
+        self.assertEqual(non_lues(self.employes[0].user_id), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            # Un seul UPDATE filtré sur le destinataire (savepoint du TestCase autour)
+            with self.assertNumQueries(3):
+                resp = self.client.post(url, {"avant": "2025-02-01T00:00:00Z"}, format="json")
+        self.assertEqual(resp.data["marquees"], 2)
+        self.assertEqual(non_lues(self.employes[0].user_id), 2)
+
+        # Une notification d'un autre utilisateur dans la liste est ignorée
+        autre = Notification.objects.get(destinataire=self.employes[1].user)
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(url, {"ids": [notifications[2].id, autre.id]}, format="json")
+        self.assertEqual(resp.data["marquees"], 1)
+        self.assertFalse(Notification.objects.get(pk=autre.pk).lu)
+        self.assertEqual(self.client.get(reverse("notifications-non-lues")).data, {"non_lues": 1})
+
+        self.assertEqual(self.client.post(url, {}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(url, {"ids": [1], "avant": "2025-02-01T00:00:00Z"}, format="json").status_code, 400)
@@ -4,8 +4,7 @@ Tests the creation of notifications and WebSocket sending logic
 """
 from django.test import TestCase
 from django.contrib.auth import get_user_model
-from unittest.mock import patch, MagicMock
-from manage_users.models import Poste, Employe, DemandeConge, Notification
+from manage_users.models import Poste, Employe, DemandeConge, Notification, NotificationSortante
 
 User = get_user_model()
 
@@ -59,14 +58,8 @@ class NotificationTestCase(TestCase):
             statut='en_attente'
         )
     
-    @patch('manage_users.models.async_to_sync')
-    @patch('manage_users.models.get_channel_layer')
-    def test_approuver_creates_notification(self, mock_get_channel_layer, mock_async_to_sync):
+    def test_approuver_creates_notification(self):
         """Test that approuver() creates a Notification record"""
-        # Setup mock
-        mock_channel_layer = MagicMock()
-        mock_get_channel_layer.return_value = mock_channel_layer
-        
         # Initial state
         initial_count = Notification.objects.count()
         self.assertEqual(initial_count, 0)
@@ -84,14 +77,8 @@ class NotificationTestCase(TestCase):
         self.assertEqual(notification.demande_conge, self.demande_conge)
         self.assertFalse(notification.lu)
     
-    @patch('manage_users.models.async_to_sync')
-    @patch('manage_users.models.get_channel_layer')
-    def test_rejeter_creates_notification(self, mock_get_channel_layer, mock_async_to_sync):
+    def test_rejeter_creates_notification(self):
         """Test that rejeter() creates a Notification record"""
-        # Setup mock
-        mock_channel_layer = MagicMock()
-        mock_get_channel_layer.return_value = mock_channel_layer
-        
         # Initial state
         initial_count = Notification.objects.count()
         self.assertEqual(initial_count, 0)
@@ -109,35 +96,19 @@ class NotificationTestCase(TestCase):
         self.assertEqual(notification.demande_conge, self.demande_conge)
         self.assertFalse(notification.lu)
     
-    @patch('manage_users.models.async_to_sync')
-    @patch('manage_users.models.get_channel_layer')
-    def test_approuver_sends_websocket_notification(self, mock_get_channel_layer, mock_async_to_sync):
-        """Test that approuver() sends a WebSocket notification"""
-        # Setup mock
-        mock_channel_layer = MagicMock()
-        mock_get_channel_layer.return_value = mock_channel_layer
-        mock_async_to_sync.return_value = MagicMock()
-        
+    def test_approuver_sends_websocket_notification(self):
+        """Test that approuver() queues a WebSocket notification for the employee"""
         # Call approuver
         self.demande_conge.approuver()
         
-        # Verify WebSocket group_send was called
-        mock_async_to_sync.assert_called()
-        call_args = mock_async_to_sync.return_value.call_args
-        
-        if call_args:
-            # Verify the group name is correct
-            group_name = call_args[0][0] if call_args[0] else None
-            self.assertEqual(group_name, f"user_{self.employee_user.id}")
+        # Verify the message was written to the outbox for the employee's group
+        sortantes = NotificationSortante.objects.all()
+        self.assertEqual(sortantes.count(), 1)
+        self.assertEqual(sortantes[0].groupe, f"user_{self.employee_user.id}")
+        self.assertEqual(sortantes[0].contenu["statut"], 'approuve')
     
-    @patch('manage_users.models.async_to_sync')
-    @patch('manage_users.models.get_channel_layer')
-    def test_approuver_updates_status(self, mock_get_channel_layer, mock_async_to_sync):
+    def test_approuver_updates_status(self):
         """Test that approuver() updates the status to 'approuve'"""
-        # Setup mock
-        mock_channel_layer = MagicMock()
-        mock_get_channel_layer.return_value = mock_channel_layer
-        
         # Initial status
         self.assertEqual(self.demande_conge.statut, 'en_attente')
         
@@ -150,14 +121,8 @@ class NotificationTestCase(TestCase):
         # Verify status changed
         self.assertEqual(self.demande_conge.statut, 'approuve')
     
-    @patch('manage_users.models.async_to_sync')
-    @patch('manage_users.models.get_channel_layer')
-    def test_rejeter_updates_status(self, mock_get_channel_layer, mock_async_to_sync):
+    def test_rejeter_updates_status(self):
         """Test that rejeter() updates the status to 'rejete'"""
-        # Setup mock
-        mock_channel_layer = MagicMock()
-        mock_get_channel_layer.return_value = mock_channel_layer
-        
         # Initial status
         self.assertEqual(self.demande_conge.statut, 'en_attente')
         
@@ -170,14 +135,8 @@ class NotificationTestCase(TestCase):
         # Verify status changed
         self.assertEqual(self.demande_conge.statut, 'rejete')
     
-    @patch('manage_users.models.async_to_sync')
-    @patch('manage_users.models.get_channel_layer')
-    def test_approuver_with_extra_fields(self, mock_get_channel_layer, mock_async_to_sync):
+    def test_approuver_with_extra_fields(self):
         """Test that approuver() can update additional fields"""
-        # Setup mock
-        mock_channel_layer = MagicMock()
-        mock_get_channel_layer.return_value = mock_channel_layer
-        
         # Call approuver with extra field
         original_description = self.demande_conge.description
         new_description = "Approuvé avec conditions"
@@ -191,14 +150,8 @@ class NotificationTestCase(TestCase):
         self.assertEqual(self.demande_conge.statut, 'approuve')
         self.assertEqual(self.demande_conge.description, new_description)
     
-    @patch('manage_users.models.async_to_sync')
-    @patch('manage_users.models.get_channel_layer')
-    def test_notification_queryset_filtering(self, mock_get_channel_layer, mock_async_to_sync):
+    def test_notification_queryset_filtering(self):
         """Test that notifications are properly linked to leave requests"""
-        # Setup mock 
-        mock_channel_layer = MagicMock()
-        mock_get_channel_layer.return_value = mock_channel_layer
-        
         # Create multiple leave requests
         conge2 = DemandeConge.objects.create(
             employe=self.employe,
@@ -249,14 +202,8 @@ class NotificationListViewTestCase(TestCase):
             poste=self.poste
         )
     
-    @patch('manage_users.models.async_to_sync')
-    @patch('manage_users.models.get_channel_layer')
-    def test_notification_list_view_filtering(self, mock_get_channel_layer, mock_async_to_sync):
+    def test_notification_list_view_filtering(self):
         """Test that NotificationListView returns only user's notifications"""
-        # Setup mock
-        mock_channel_layer = MagicMock()
-        mock_get_channel_layer.return_value = mock_channel_layer
-        
         # Create leave requests
         conge = DemandeConge.objects.create(
             employe=self.employe,
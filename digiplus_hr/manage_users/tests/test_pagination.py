@@ -0,0 +1,78 @@
+import datetime
+from unittest.mock import patch
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from manage_users.models import User, Employe, Badgeage
+from manage_users.pagination import PaginationCurseur
+
+
+class TestPaginationCurseur(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user(
+            email="page@example.com",
+            password="pass1234",
+            first_name="Page",
+            last_name="Test",
+            is_employe=True,
+        )
+        employe = Employe.objects.create(user=user, matricule="PAG1", date_embauche=datetime.date(2025, 1, 1))
+        debut = timezone.now() - datetime.timedelta(days=30)
+        # Horodatages en double : l'id départage les égalités
+        Badgeage.objects.bulk_create([
+            Badgeage(employe=employe, type='arrivee', datetime=debut + datetime.timedelta(hours=i // 3), date=debut.date())
+            for i in range(120)
+        ])
+        admin = User.objects.create_user(
+            email="admin.page@example.com",
+            password="pass1234",
+            first_name="Admin",
+            last_name="Page",
+            is_employe=False,
+            is_admin=True,
+        )
+        self.client.force_authenticate(user=admin)
+        self.url = reverse("badgeage-list")
+
+    def test_parcours_complet_sans_doublon_ni_count(self):
+        vus = []
+        requetes = []
+        params = {"page_size": 25}
+        while True:
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.client.get(self.url, params)
+            self.assertEqual(resp.status_code, 200)
+            self.assertNotIn("count", resp.data)
+            self.assertFalse(any("COUNT(" in q["sql"] for q in ctx.captured_queries))
+            requetes.append(len(ctx.captured_queries))
+            vus.extend(item["id"] for item in resp.data["results"])
+            if not resp.data["curseur_suivant"]:
+                break
+            params = {"page_size": 25, "curseur": resp.data["curseur_suivant"]}
+
+        self.assertEqual(len(vus), 120)
+        self.assertEqual(len(set(vus)), 120)
+        self.assertEqual(vus, list(Badgeage.objects.order_by("-datetime", "-id").values_list("id", flat=True)))
+        self.assertEqual(len(set(requetes)), 1)
+
+    def test_total_sur_demande(self):
+        resp = self.client.get(self.url, {"page_size": 10, "total": 1})
+        self.assertEqual(resp.data["count"], 120)
+        self.assertIn("curseur=", resp.data["next"])
+
+    def test_sans_parametre_premiere_page_bornee(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(len(resp.data["results"]), PaginationCurseur.taille_defaut)
+        self.assertIsNotNone(resp.data["curseur_suivant"])
+
+        with patch.object(PaginationCurseur, "taille_max", 30):
+            resp = self.client.get(self.url, {"page_size": 1000})
+        self.assertEqual(len(resp.data["results"]), 30)
+
+    def test_curseur_invalide(self):
+        resp = self.client.get(self.url, {"curseur": "pas-un-curseur"})
+        self.assertEqual(resp.status_code, 400)
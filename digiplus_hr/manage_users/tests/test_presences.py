@@ -0,0 +1,97 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from manage_users.models import User, Employe, DemandeConge, Presence
+from manage_users.presences import cloturer_presences
+
+
+@override_settings(PRESENCE_JOURS_OUVRES=(0, 1, 2, 3, 4), PRESENCE_HEURE_CLOTURE='18:00')
+class TestCloturePresences(TestCase):
+    def setUp(self):
+        # Semaine passée du lundi au dimanche
+        aujourd_hui = timezone.localdate()
+        self.lundi = aujourd_hui - datetime.timedelta(days=aujourd_hui.weekday() + 7)
+        self.dimanche = self.lundi + datetime.timedelta(days=6)
+        self.employes = []
+        for i in range(3):
+            user = User.objects.create_user(
+                email=f"clot{i}@example.com",
+                password="pass1234",
+                first_name="Clot",
+                last_name=str(i),
+                is_employe=True,
+            )
+            self.employes.append(Employe.objects.create(
+                user=user,
+                matricule=f"CLO{i}",
+                date_embauche=self.lundi - datetime.timedelta(days=30),
+            ))
+
+    def test_complete_et_ferme_en_requetes_constantes(self):
+        presents, en_conge, _absent = self.employes
+        DemandeConge.objects.create(
+            employe=en_conge,
+            type_conge='annuel',
+            date_debut=self.lundi + datetime.timedelta(days=1),
+            date_fin=self.lundi + datetime.timedelta(days=2),
+            statut='approuve',
+        )
+        Presence.objects.create(
+            employe=presents,
+            date=self.lundi,
+            statut='present',
+            heure_arrivee=datetime.time(8, 0),
+            nb_pauses=1,
+            pause_en_cours_depuis=timezone.make_aware(datetime.datetime.combine(self.lundi, datetime.time(17, 0))),
+        )
+
+        # Calendriers déjà chargés par l'imputation de la demande approuvée au registre des congés
+        with self.assertNumQueries(16):
+            resultat = cloturer_presences(self.lundi, self.dimanche)
+
+        self.assertEqual(Presence.objects.filter(date__range=(self.lundi, self.dimanche)).count(), 21)
+        self.assertEqual(resultat['crees'], {'absent': 12, 'conge': 2, 'repos': 6})
+        self.assertEqual(resultat['fermees'], 1)
+
+        ferme = Presence.objects.get(employe=presents, date=self.lundi)
+        self.assertEqual(ferme.heure_depart, datetime.time(18, 0))
+        self.assertIsNone(ferme.pause_en_cours_depuis)
+        self.assertEqual(ferme.duree_pauses_minutes, 60)
+        self.assertEqual(ferme.duree_travail_minutes, 540)
+
+        samedi = self.lundi + datetime.timedelta(days=5)
+        self.assertEqual(Presence.objects.get(employe=en_conge, date=samedi).statut, 'repos')
+
+    def test_pause_ouverte_apres_la_cloture(self):
+        Presence.objects.create(
+            employe=self.employes[0],
+            date=self.lundi,
+            statut='present',
+            heure_arrivee=datetime.time(8, 0),
+            nb_pauses=1,
+            pause_en_cours_depuis=timezone.make_aware(datetime.datetime.combine(self.lundi, datetime.time(19, 30))),
+        )
+
+        cloturer_presences(self.lundi, self.lundi)
+
+        ferme = Presence.objects.get(employe=self.employes[0], date=self.lundi)
+        self.assertEqual(ferme.heure_depart, datetime.time(18, 0))
+        self.assertIsNone(ferme.pause_en_cours_depuis)
+        self.assertEqual(ferme.duree_pauses_minutes, 0)
+        self.assertEqual(ferme.duree_travail_minutes, 600)
+
+    def test_idempotent_et_jour_courant_intouche(self):
+        aujourd_hui = timezone.localdate()
+        call_command('cloturer_presences', debut=str(self.lundi), fin=str(aujourd_hui), stdout=StringIO())
+        total = Presence.objects.count()
+
+        out = StringIO()
+        call_command('cloturer_presences', debut=str(self.lundi), fin=str(aujourd_hui), stdout=out)
+        self.assertEqual(Presence.objects.count(), total)
+        self.assertIn("0 absent(s)", out.getvalue())
+        self.assertFalse(Presence.objects.filter(date=aujourd_hui).exists())
@@ -0,0 +1,368 @@
+import shutil
+import tempfile
+import zipfile
+from io import BytesIO
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from manage_users.models import User, Departement, Poste, Employe, CodeQR
+from manage_users.qr_utils import (
+    desactiver_codes, statistiques_cache, generer_jeton, verifier_jeton, nom_image,
+    svg_pour, etag_image, resoudre_code, codes_pour, pregenerer_images, _cache_key, _svg_lru,
+)
+
+
+class TestResolutionCodeQR(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="qr@example.com",
+            password="pass1234",
+            first_name="Qr",
+            last_name="Test",
+            is_employe=True,
+            is_verified=True,
+        )
+        self.employe = Employe.objects.create(
+            user=self.user,
+            matricule="EMP200",
+            date_embauche=timezone.now().date(),
+        )
+        self.code_qr = CodeQR.objects.create(
+            employe=self.employe,
+            code_unique=CodeQR.generate_unique_code(),
+            actif=True,
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def scan(self, badge_type, code_unique=None):
+        payload = {"code_unique": code_unique or self.code_qr.code_unique, "type": badge_type}
+        return self.client.post(reverse("badgeage-scanner"), payload, format="json")
+
+    def test_scans_successifs_servis_par_le_cache(self):
+        avant = statistiques_cache()
+
+        self.assertEqual(self.scan("arrivee").status_code, 201)
+        self.assertEqual(self.scan("pause_debut").status_code, 201)
+
+        apres = statistiques_cache()
+        self.assertEqual(apres["misses"] - avant["misses"], 1)
+        self.assertEqual(apres["hits"] - avant["hits"], 1)
+
+    def test_desactivation_invalide_le_cache(self):
+        self.assertEqual(self.scan("arrivee").status_code, 201)
+
+        desactiver_codes(self.employe)
+
+        resp = self.scan("pause_debut")
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.data["error"], "QR code invalide ou inactif.")
+
+    def test_desactivation_invalide_apres_validation(self):
+        self.assertEqual(resoudre_code(self.code_qr.code_unique), (self.employe.id, self.user.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            desactiver_codes(self.employe)
+            # Lecture concurrente avant validation : l'ancienne ligne revient en cache
+            cache.set(_cache_key(self.code_qr.code_unique), (self.employe.id, self.user.id, True))
+
+        self.assertIsNone(resoudre_code(self.code_qr.code_unique))
+
+
+class TestJetonsCompacts(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.user = User.objects.create_user(
+            email="jeton@example.com",
+            password="pass1234",
+            first_name="Jeton",
+            last_name="Test",
+            is_employe=True,
+            is_verified=True,
+        )
+        self.employe = Employe.objects.create(
+            user=self.user,
+            matricule="EMP201",
+            date_embauche=timezone.now().date(),
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_jeton_signe_verifiable_hors_base(self):
+        jeton = generer_jeton(self.employe.id)
+        self.assertLess(len(jeton), 48)
+        self.assertEqual(verifier_jeton(jeton), self.employe.id)
+
+        falsifie = jeton[:-2] + ("AA" if not jeton.endswith("AA") else "BB")
+        self.assertIsNone(verifier_jeton(falsifie))
+
+    def test_jeton_falsifie_rejete_sans_requete(self):
+        jeton = generer_jeton(self.employe.id)
+        falsifie = jeton[:-1] + ("x" if jeton[-1] != "x" else "y")
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(
+                reverse("badgeage-scanner"),
+                {"code_unique": falsifie, "type": "arrivee"},
+                format="json",
+            )
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(any("manage_users_codeqr" in q["sql"] for q in ctx.captured_queries))
+
+    def test_regenerate_emet_un_jeton_compact(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            url = reverse("code-qr-regenerate")
+            premier = self.client.post(url, {"user_id": self.user.id}, format="json")
+            second = self.client.post(url, {"user_id": self.user.id}, format="json")
+
+        self.assertEqual(premier.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertTrue(second.data["code_unique"].startswith("DP1."))
+        self.assertNotEqual(premier.data["code_unique"], second.data["code_unique"])
+
+        resp = self.client.post(
+            reverse("badgeage-scanner"),
+            {"code_unique": premier.data["code_unique"], "type": "arrivee"},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.post(
+            reverse("badgeage-scanner"),
+            {"code_unique": second.data["code_unique"], "type": "arrivee"},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 201)
+
+    def test_code_historique_toujours_accepte(self):
+        CodeQR.objects.create(employe=self.employe, code_unique=CodeQR.generate_unique_code(), actif=True)
+        code = CodeQR.objects.get(employe=self.employe).code_unique
+        self.assertGreater(len(code), 300)
+
+        resp = self.client.post(reverse("badgeage-scanner"), {"code_unique": code, "type": "arrivee"}, format="json")
+        self.assertEqual(resp.status_code, 201)
+
+        with override_settings(CODEQR_CODES_HISTORIQUES_ACCEPTES=False):
+            resp = self.client.post(reverse("badgeage-scanner"), {"code_unique": code, "type": "depart"}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+
+class TestPregenerationQR(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.departement = Departement.objects.create(nom="Accueil")
+        self.poste = Poste.objects.create(titre="Agent", salaire_de_base=1000, departement=self.departement)
+        self.employes = []
+        for i in range(3):
+            user = User.objects.create_user(
+                email=f"pre{i}@example.com",
+                password="pass1234",
+                first_name="Pre",
+                last_name=str(i),
+                is_employe=True,
+            )
+            self.employes.append(Employe.objects.create(
+                user=user,
+                matricule=f"PRE{i}",
+                date_embauche=timezone.now().date(),
+                poste=self.poste,
+            ))
+
+    def test_commande_rend_puis_ignore_les_images_a_jour(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            out = StringIO()
+            call_command(
+                "pregenerer_qr_codes",
+                departement_ids=[self.departement.id],
+                creer_manquants=True,
+                workers=2,
+                stdout=out,
+            )
+            self.assertIn("3 image(s) rendue(s)", out.getvalue())
+
+            codes = CodeQR.objects.filter(employe__in=self.employes)
+            self.assertEqual(codes.count(), 3)
+            for code_qr in codes:
+                self.assertEqual(code_qr.qr_code_image.name, nom_image(code_qr))
+                self.assertTrue(code_qr.qr_code_image.storage.exists(code_qr.qr_code_image.name))
+
+            out = StringIO()
+            call_command("pregenerer_qr_codes", departement_ids=[self.departement.id], stdout=out)
+            self.assertIn("0 image(s) rendue(s)", out.getvalue())
+            self.assertIn("3 déjà à jour", out.getvalue())
+
+    def test_endpoint_admin(self):
+        admin = User.objects.create_user(
+            email="admin.qr@example.com",
+            password="pass1234",
+            first_name="Admin",
+            last_name="Qr",
+            is_employe=False,
+            is_admin=True,
+        )
+        self.client.force_authenticate(user=admin)
+        with override_settings(MEDIA_ROOT=self.media_root):
+            resp = self.client.post(
+                reverse("code-qr-pregenerer"),
+                {"employe_ids": [self.employes[0].id], "creer_manquants": True, "workers": 1},
+                format="json",
+            )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["total"], 1)
+        self.assertEqual(resp.data["rendus"], 1)
+
+
+class TestExportBadges(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.departement = Departement.objects.create(nom="Logistique")
+        poste = Poste.objects.create(titre="Magasinier", salaire_de_base=1000, departement=self.departement)
+        for i in range(14):
+            user = User.objects.create_user(
+                email=f"exp{i}@example.com",
+                password="pass1234",
+                first_name="Exp",
+                last_name=str(i),
+                is_employe=True,
+            )
+            employe = Employe.objects.create(user=user, matricule=f"EXP{i:02d}", date_embauche=timezone.now().date(), poste=poste)
+            # Le dernier employé n'a pas encore de badge
+            if i < 13:
+                CodeQR.objects.create(employe=employe, code_unique=CodeQR.generate_unique_code(employe.id), actif=True)
+        admin = User.objects.create_user(
+            email="admin.export@example.com",
+            password="pass1234",
+            first_name="Admin",
+            last_name="Export",
+            is_employe=False,
+            is_admin=True,
+        )
+        self.client.force_authenticate(user=admin)
+
+    def exporter(self, **params):
+        with override_settings(MEDIA_ROOT=self.media_root, CODEQR_EXPORT_TAILLE_LOT=5):
+            resp = self.client.get(reverse("code-qr-export"), {"departement": self.departement.id, **params})
+            contenu = b"".join(resp.streaming_content) if resp.status_code == 200 else None
+        return resp, contenu
+
+    def test_zip_png_en_lecture_seule(self):
+        resp, contenu = self.exporter()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "application/zip")
+        self.assertEqual(resp["X-Employes-Sans-Code"], "1")
+        with zipfile.ZipFile(BytesIO(contenu)) as archive:
+            noms = archive.namelist()
+            self.assertEqual(len(noms), 13)
+            self.assertTrue(archive.read("badges/EXP00.png").startswith(b"\x89PNG"))
+            self.assertNotIn("badges/EXP13.png", noms)
+
+        # Ni code créé ni image enregistrée par le GET
+        codes = CodeQR.objects.filter(employe__poste__departement=self.departement)
+        self.assertEqual(codes.count(), 13)
+        self.assertFalse(any(c.qr_code_image for c in codes))
+
+    def test_zip_png_reutilise_les_images_pregenerees(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            pregenerer_images(codes_pour(departement_ids=[self.departement.id]), workers=1)
+        code_qr = CodeQR.objects.get(employe__matricule="EXP00")
+        with override_settings(MEDIA_ROOT=self.media_root):
+            with code_qr.qr_code_image.open('rb') as fichier:
+                attendu = fichier.read()
+        resp, contenu = self.exporter()
+        with zipfile.ZipFile(BytesIO(contenu)) as archive:
+            self.assertEqual(archive.read("badges/EXP00.png"), attendu)
+
+    def test_zip_svg(self):
+        resp, contenu = self.exporter(image="svg")
+        self.assertEqual(resp.status_code, 200)
+        with zipfile.ZipFile(BytesIO(contenu)) as archive:
+            self.assertIn(b"<svg", archive.read("badges/EXP12.svg"))
+
+    def test_planche_pdf(self):
+        resp, contenu = self.exporter(sortie="pdf")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(contenu.startswith(b"%PDF-1.4"))
+        self.assertTrue(contenu.rstrip().endswith(b"%%EOF"))
+        self.assertIn(b"/Count 2", contenu)
+
+    def test_parametres_requis(self):
+        resp = self.client.get(reverse("code-qr-export"))
+        self.assertEqual(resp.status_code, 400)
+
+
+class TestRenduSVG(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.user = User.objects.create_user(
+            email="svg@example.com",
+            password="pass1234",
+            first_name="Svg",
+            last_name="Test",
+            is_employe=True,
+            is_verified=True,
+        )
+        self.employe = Employe.objects.create(user=self.user, matricule="EMP300", date_embauche=timezone.now().date())
+        self.code_qr = CodeQR.objects.create(
+            employe=self.employe,
+            code_unique=CodeQR.generate_unique_code(self.employe.id),
+            actif=True,
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_download_svg_sans_png_puis_304(self):
+        url = reverse("code-qr-download")
+        with override_settings(MEDIA_ROOT=self.media_root):
+            resp = self.client.get(url, {"user_id": self.user.id, "image": "svg"})
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp["Content-Type"], "image/svg+xml")
+            self.assertIn(b"<svg", resp.content)
+            self.assertEqual(resp["ETag"], etag_image(self.code_qr.code_unique, "svg"))
+
+            self.code_qr.refresh_from_db()
+            self.assertFalse(self.code_qr.qr_code_image)
+
+            resp = self.client.get(url, {"user_id": self.user.id, "image": "svg"}, HTTP_IF_NONE_MATCH=resp["ETag"])
+            self.assertEqual(resp.status_code, 304)
+
+    def test_etag_png_change_apres_regeneration(self):
+        url = reverse("code-qr-download")
+        with override_settings(MEDIA_ROOT=self.media_root):
+            etag = self.client.get(url, {"user_id": self.user.id})["ETag"]
+            self.client.post(reverse("code-qr-regenerate"), {"user_id": self.user.id}, format="json")
+            resp = self.client.get(url, {"user_id": self.user.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+
+    def test_me_svg_inline(self):
+        resp = self.client.get(reverse("code-qr-me"), {"user_id": self.user.id, "image": "svg"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.data["qr_code_svg"].lstrip().startswith("<?xml"))
+
+    def test_me_svg_etag_suit_le_contenu(self):
+        url = reverse("code-qr-me")
+        params = {"user_id": self.user.id, "image": "svg"}
+        etag = self.client.get(url, params)["ETag"]
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Même code, expiration modifiée : la réponse JSON change, l'ETag aussi
+        CodeQR.objects.filter(pk=self.code_qr.pk).update(date_expiration=timezone.localdate())
+        resp = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+        self.assertEqual(resp.data["date_expiration"], str(timezone.localdate()))
+
+    def test_lru_borne(self):
+        with override_settings(CODEQR_SVG_LRU_TAILLE=2):
+            for i in range(4):
+                svg_pour(f"DP1.{i}.lru.test")
+            self.assertLessEqual(len(_svg_lru), 2)
+            self.assertIs(svg_pour("DP1.3.lru.test"), svg_pour("DP1.3.lru.test"))
@@ -0,0 +1,148 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from manage_users.models import User, Employe, Presence, RapportPresence
+from manage_users.rapports import generer_rapports, verifier_rapports
+
+
+class TestGenerationRapports(APITestCase):
+    def setUp(self):
+        self.employes = []
+        for i in range(3):
+            user = User.objects.create_user(
+                email=f"rap{i}@example.com",
+                password="pass1234",
+                first_name="Rap",
+                last_name=str(i),
+                is_employe=True,
+            )
+            employe = Employe.objects.create(user=user, matricule=f"RAP{i}", date_embauche=datetime.date(2025, 1, 1))
+            self.employes.append(employe)
+            Presence.objects.bulk_create([
+                Presence(employe=employe, date=datetime.date(2026, 3, 2), statut='present',
+                         duree_travail_minutes=480, duree_pauses_minutes=45),
+                Presence(employe=employe, date=datetime.date(2026, 3, 3), statut='retard',
+                         duree_travail_minutes=420, duree_pauses_minutes=30),
+                Presence(employe=employe, date=datetime.date(2026, 3, 4), statut='absent'),
+                Presence(employe=employe, date=datetime.date(2026, 3, 5), statut='conge'),
+                Presence(employe=employe, date=datetime.date(2026, 3, 7), statut='repos'),
+                Presence(employe=employe, date=datetime.date(2026, 4, 1), statut='present',
+                         duree_travail_minutes=480),
+            ])
+
+    def test_un_agregat_et_un_upsert(self):
+        with self.assertNumQueries(2):
+            resultat = generer_rapports(2026, 3)
+        self.assertEqual(resultat['rapports'], 3)
+        self.assertIn('duree_totale_ms', resultat)
+
+        rapport = RapportPresence.objects.get(employe=self.employes[0], annee=2026, mois=3)
+        self.assertEqual(rapport.total_jours_travail, 3)
+        self.assertEqual(rapport.total_jours_present, 1)
+        self.assertEqual(rapport.total_jours_retard, 1)
+        self.assertEqual(rapport.total_jours_absent, 1)
+        self.assertEqual(rapport.total_jours_conge, 1)
+        self.assertEqual(rapport.total_jours_repos, 1)
+        self.assertEqual(rapport.total_heures_travail, Decimal('15.00'))
+        self.assertEqual(rapport.total_heures_pauses, Decimal('1.25'))
+
+    def test_regeneration_met_a_jour_sans_doublon(self):
+        generer_rapports(2026, 3)
+        Presence.objects.filter(employe=self.employes[0], date=datetime.date(2026, 3, 4)).update(statut='present')
+
+        out = StringIO()
+        call_command('generer_rapports_presence', annee=2026, mois=3, employe_ids=[self.employes[0].id], stdout=out)
+        self.assertIn("1 rapport(s) 03/2026", out.getvalue())
+
+        self.assertEqual(RapportPresence.objects.filter(annee=2026, mois=3).count(), 3)
+        rapport = RapportPresence.objects.get(employe=self.employes[0], annee=2026, mois=3)
+        self.assertEqual(rapport.total_jours_present, 2)
+        self.assertEqual(rapport.total_jours_absent, 0)
+
+    def test_endpoint_admin(self):
+        url = reverse("rapport-presence-generer")
+        self.client.force_authenticate(user=self.employes[0].user)
+        self.assertEqual(self.client.post(url, {"annee": 2026, "mois": 4}, format="json").status_code, 403)
+
+        admin = User.objects.create_user(
+            email="admin.rap@example.com",
+            password="pass1234",
+            first_name="Admin",
+            last_name="Rap",
+            is_employe=False,
+            is_admin=True,
+        )
+        self.client.force_authenticate(user=admin)
+        resp = self.client.post(url, {"annee": 2026, "mois": 4}, format="json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["rapports"], 3)
+
+
+class TestRapportsIncrementaux(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="incr@example.com",
+            password="pass1234",
+            first_name="Incr",
+            last_name="Test",
+            is_employe=True,
+            is_verified=True,
+        )
+        self.employe = Employe.objects.create(user=self.user, matricule="INC1", date_embauche=datetime.date(2025, 1, 1))
+
+    def rapport(self, annee=2026, mois=3):
+        return RapportPresence.objects.get(employe=self.employe, annee=annee, mois=mois)
+
+    def test_creation_puis_correction_appliquent_un_delta(self):
+        presence = Presence.objects.create(employe=self.employe, date=datetime.date(2026, 3, 2), statut='absent')
+        self.assertEqual(self.rapport().total_jours_absent, 1)
+
+        presence = Presence.objects.get(pk=presence.pk)
+        presence.statut = 'present'
+        presence.duree_travail_minutes = 475
+        presence.save()
+
+        rapport = self.rapport()
+        self.assertEqual(rapport.total_jours_absent, 0)
+        self.assertEqual(rapport.total_jours_present, 1)
+        self.assertEqual(rapport.total_jours_travail, 1)
+        self.assertEqual(rapport.total_minutes_travail, 475)
+        self.assertEqual(rapport.total_heures_travail, Decimal('7.92'))
+
+        presence.date = datetime.date(2026, 4, 1)
+        presence.save()
+        self.assertEqual(self.rapport().total_jours_present, 0)
+        self.assertEqual(self.rapport(mois=4).total_jours_present, 1)
+
+        presence.delete()
+        self.assertEqual(self.rapport(mois=4).total_jours_present, 0)
+        self.assertEqual(verifier_rapports(2026, 4), [])
+
+    def test_scanner_maintient_le_mois_en_cours(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse("badgeage-scanner")
+        self.assertEqual(self.client.post(url, {"user_id": self.user.id, "type": "arrivee"}, format="json").status_code, 201)
+
+        aujourd_hui = timezone.localdate()
+        rapport = self.rapport(aujourd_hui.year, aujourd_hui.month)
+        self.assertEqual(rapport.total_jours_present, 1)
+        self.assertEqual(rapport.total_jours_absent, 0)
+
+    def test_verification_detecte_et_repare_la_derive(self):
+        Presence.objects.create(employe=self.employe, date=datetime.date(2026, 3, 2), statut='present', duree_travail_minutes=480)
+        # Une mise à jour par queryset contourne les signaux : dérive
+        Presence.objects.filter(employe=self.employe).update(duree_travail_minutes=300)
+
+        out = StringIO()
+        call_command('verifier_rapports_presence', annee=2026, mois=3, stdout=out)
+        self.assertIn("total_minutes_travail: 480 -> 300", out.getvalue())
+
+        call_command('verifier_rapports_presence', annee=2026, mois=3, reparer=True, stdout=StringIO())
+        self.assertEqual(self.rapport().total_minutes_travail, 300)
+        self.assertEqual(verifier_rapports(2026, 3), [])
@@ -0,0 +1,57 @@
+import datetime
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from manage_users.models import DemandeConge, Employe, Notification, User
+from manage_users.retention import limite_retention, purger_notifications
+
+
+@override_settings(NOTIFICATIONS_DIFFUSION_EN_PROCESSUS=False, NOTIFICATIONS_RETENTION_JOURS=30)
+class TestRetentionNotifications(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(email="ret@example.com", password="pass1234", is_employe=True)
+        employe = Employe.objects.create(user=user, matricule="RET1", date_embauche=datetime.date(2024, 1, 1))
+        demande = DemandeConge.objects.create(
+            employe=employe, type_conge='annuel', date_debut=datetime.date(2025, 3, 3), date_fin=datetime.date(2025, 3, 3),
+        )
+        Notification.objects.bulk_create([
+            Notification(demande_conge=demande, destinataire=user, titre=f"N{i}", message="…", lu=i % 4 != 0)
+            for i in range(10)
+        ])
+        # N0..N7 vieilles de 60 jours (N0 et N4 non lues), N8 et N9 récentes
+        anciennes = Notification.objects.filter(titre__in=[f"N{i}" for i in range(8)])
+        anciennes.update(date_envoi=timezone.now() - datetime.timedelta(days=60))
+
+    def test_purge_par_lots_sans_toucher_aux_non_lues(self):
+        limite = limite_retention()
+        self.assertEqual(purger_notifications(limite, simulation=True), 6)
+        self.assertEqual(purger_notifications(limite, taille=2), 6)
+        self.assertEqual(
+            sorted(Notification.objects.values_list('titre', flat=True)),
+            ['N0', 'N4', 'N8', 'N9'],
+        )
+        self.assertEqual(purger_notifications(limite, taille=2), 0)
+
+    def test_commande_avec_archive(self):
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = os.path.join(dossier, "notifications.jsonl")
+            out = StringIO()
+            call_command('purger_notifications', '--archive', chemin, '--taille', '4', stdout=out)
+            self.assertIn("6 notification(s)", out.getvalue())
+            with open(chemin, encoding='utf-8') as archive:
+                lignes = [json.loads(ligne) for ligne in archive]
+        self.assertEqual(sorted(ligne['titre'] for ligne in lignes), ['N1', 'N2', 'N3', 'N5', 'N6', 'N7'])
+        self.assertTrue(all(ligne['lu'] and ligne['destinataire_id'] for ligne in lignes))
+        self.assertEqual(Notification.objects.count(), 4)
+
+        out = StringIO()
+        call_command('purger_notifications', '--jours', '0', '--simulation', stdout=out)
+        self.assertIn("1 notification(s)", out.getvalue())
+        self.assertEqual(Notification.objects.count(), 4)
@@ -0,0 +1,156 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from manage_contrat.models import Contrat
+from manage_users.calendrier import invalider_calendriers
+from manage_users.conges import decider_demandes
+from manage_users.models import DemandeConge, Employe, MouvementConge, SoldeConge, User
+from manage_users.soldes import crediter_conges, reconstruire_soldes, solde_de
+
+
+@override_settings(NOTIFICATIONS_DIFFUSION_EN_PROCESSUS=False)
+class TestRegistreConges(TestCase):
+    def setUp(self):
+        invalider_calendriers()
+        self.addCleanup(invalider_calendriers)
+        self.admin = User.objects.create_user(email="soldes.admin@example.com", password="pass1234", is_admin=True, is_employe=False)
+        user = User.objects.create_user(email="soldes@example.com", password="pass1234", is_employe=True)
+        self.employe = Employe.objects.create(user=user, matricule="SLD1", date_embauche=datetime.date(2024, 1, 1))
+
+    def demande(self, debut, fin, type_conge='annuel'):
+        return DemandeConge.objects.create(employe=self.employe, type_conge=type_conge, date_debut=debut, date_fin=fin)
+
+    def solde(self, annee, type_conge='annuel'):
+        solde = solde_de(self.employe.id, annee, type_conge)
+        return (solde.acquis, solde.consommes, solde.solde)
+
+    def test_approbation_puis_rejet(self):
+        # Lundi 3 au vendredi 7 mars 2025 : cinq jours ouvrés
+        demande = self.demande(datetime.date(2025, 3, 3), datetime.date(2025, 3, 9))
+        self.assertIsNone(solde_de(self.employe.id, 2025))
+
+        demande.approuver(admin=self.admin)
+        self.assertEqual(self.solde(2025), (0, 5, -5))
+
+        DemandeConge.objects.get(pk=demande.pk).rejeter(admin=self.admin)
+        self.assertEqual(self.solde(2025), (0, 0, 0))
+        self.assertEqual(
+            list(MouvementConge.objects.values_list('nature', 'jours')),
+            [('consommation', Decimal('-5')), ('annulation', Decimal('5'))],
+        )
+
+    def test_demande_a_cheval_sur_deux_annees_et_modification(self):
+        demande = self.demande(datetime.date(2025, 12, 29), datetime.date(2026, 1, 2), 'maladie')
+        demande.approuver()
+        self.assertEqual(self.solde(2025, 'maladie')[1], 3)
+        self.assertEqual(self.solde(2026, 'maladie')[1], 2)
+
+        # Dates raccourcies après approbation : seul l'écart est écrit
+        demande.date_fin = datetime.date(2025, 12, 31)
+        demande.save()
+        self.assertEqual(self.solde(2025, 'maladie')[1], 3)
+        self.assertEqual(self.solde(2026, 'maladie')[1], 0)
+        self.assertEqual(MouvementConge.objects.count(), 3)
+
+    def test_suppression_annule_l_imputation(self):
+        demande = self.demande(datetime.date(2025, 3, 3), datetime.date(2025, 3, 4))
+        demande.approuver()
+        demande.delete()
+        self.assertEqual(self.solde(2025)[1], 0)
+        self.assertFalse(MouvementConge.objects.filter(demande_conge__isnull=False).exists())
+
+        # Suppression de l'employé : le registre part en cascade, sans nouvelle écriture
+        self.demande(datetime.date(2025, 4, 7), datetime.date(2025, 4, 7)).approuver()
+        self.employe.delete()
+        self.assertFalse(MouvementConge.objects.exists())
+
+    def test_acquisition_au_prorata_des_contrats(self):
+        Contrat.objects.create(
+            employe=self.employe, reference="C-SLD1", type_contrat="cdi", statut="actif",
+            date_debut=datetime.date(2025, 7, 2), salaire_base=100000, conges_annuels_jours=30,
+        )
+        Contrat.objects.create(
+            employe=self.employe, reference="C-SLD1-B", type_contrat="cdi", statut="brouillon",
+            date_debut=datetime.date(2025, 1, 1), salaire_base=100000,
+        )
+        # 183 jours sur 365 du 2 juillet au 31 décembre
+        self.assertEqual(len(crediter_conges(2025)), 1)
+        self.assertEqual(self.solde(2025), (Decimal('15.04'), 0, Decimal('15.04')))
+        self.assertEqual(crediter_conges(2025), [])
+
+    def test_decision_groupee_et_reconstruction(self):
+        demandes = [
+            self.demande(datetime.date(2025, 3, 3), datetime.date(2025, 3, 5)),
+            self.demande(datetime.date(2025, 6, 2), datetime.date(2025, 6, 2)),
+        ]
+        MouvementConge.objects.create(employe=self.employe, annee=2025, type_conge='annuel', nature='ajustement', jours=10)
+        with patch('manage_users.compteurs.async_to_sync'):
+            decider_demandes([demande.id for demande in demandes], 'approuve', self.admin)
+        # L'ajustement créé hors registre n'est pas encore dans le solde : la reconstruction le reprend
+        self.assertEqual(self.solde(2025), (0, 4, -4))
+
+        out = StringIO()
+        call_command('reconstruire_soldes_conges', '--annee', '2025', stdout=out)
+        self.assertIn("1 solde(s) recalculé(s)", out.getvalue())
+        self.assertEqual(self.solde(2025), (10, 4, 6))
+        self.assertEqual(reconstruire_soldes(), 1)
+
+
+class TestSoldeDemandeAPI(APITestCase):
+    def setUp(self):
+        invalider_calendriers()
+        self.addCleanup(invalider_calendriers)
+        user = User.objects.create_user(email="soldes.api@example.com", password="pass1234", is_employe=True, is_verified=True)
+        self.employe = Employe.objects.create(user=user, matricule="SLD2", date_embauche=datetime.date(2024, 1, 1))
+        SoldeConge.objects.create(employe=self.employe, annee=2025, type_conge='annuel', acquis=3)
+        self.client.force_authenticate(user=user)
+        self.url = reverse("demande-conge-list-create")
+
+    @override_settings(CONGES_CONTROLE_SOLDE=True, NOTIFICATIONS_DIFFUSION_EN_PROCESSUS=False)
+    def test_solde_lu_et_controle(self):
+        resp = self.client.post(self.url, {"type_conge": "annuel", "date_debut": "2025-03-03", "date_fin": "2025-03-07"}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("solde", resp.data)
+
+        resp = self.client.post(self.url, {"type_conge": "annuel", "date_debut": "2025-03-03", "date_fin": "2025-03-05"}, format="json")
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.data["solde"]["solde"], Decimal('3'))
+
+        # Les autres types ne sont pas plafonnés
+        resp = self.client.post(self.url, {"type_conge": "maladie", "date_debut": "2025-03-10", "date_fin": "2025-03-14"}, format="json")
+        self.assertEqual(resp.status_code, 201)
+        self.assertIsNone(resp.data["solde"])
+
+    @override_settings(NOTIFICATIONS_DIFFUSION_EN_PROCESSUS=False)
+    def test_liste_admin_soldes_en_une_requete(self):
+        admin = User.objects.create_user(email="soldes.liste@example.com", password="pass1234", is_admin=True, is_employe=False)
+        autres = []
+        for i in range(4):
+            user = User.objects.create_user(email=f"soldes.liste{i}@example.com", password="pass1234", is_employe=True)
+            autres.append(Employe.objects.create(user=user, matricule=f"SLD3{i}", date_embauche=datetime.date(2024, 1, 1)))
+            SoldeConge.objects.create(employe=autres[-1], annee=2025, type_conge='annuel', acquis=10 + i)
+        for employe in [self.employe] + autres:
+            for mois in (3, 4):
+                DemandeConge.objects.create(
+                    employe=employe, type_conge='annuel',
+                    date_debut=datetime.date(2025, mois, 3), date_fin=datetime.date(2025, mois, 4),
+                )
+        self.client.force_authenticate(user=admin)
+        url = reverse("admin-demandes-list")
+
+        self.client.get(url)  # tables du calendrier chargées une fois par processus
+        # Une requête pour les demandes, une pour tous leurs soldes
+        with self.assertNumQueries(2):
+            resp = self.client.get(url)
+        self.assertEqual(len(resp.data), 10)
+        soldes = {demande["employe"]: demande["solde"]["acquis"] for demande in resp.data}
+        self.assertEqual(soldes[autres[3].id], Decimal('13'))
+        self.assertEqual(soldes[self.employe.id], Decimal('3'))
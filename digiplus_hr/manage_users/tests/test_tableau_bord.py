@@ -0,0 +1,53 @@
+import datetime
+
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from manage_users.models import Departement, Employe, Poste, User
+from manage_users.tableau_bord import CACHE_CLE
+
+
+class TestTableauBordAdmin(APITestCase):
+    def setUp(self):
+        cache.delete(CACHE_CLE)
+        self.addCleanup(cache.delete, CACHE_CLE)
+        self.admin = User.objects.create_user(email="dash@example.com", password="pass1234", is_admin=True, is_employe=False, is_verified=True)
+        user = User.objects.create_user(email="dash.emp@example.com", password="pass1234", is_employe=True)
+        self.employe = Employe.objects.create(user=user, matricule="DSH1", date_embauche=datetime.date(2024, 1, 1))
+        self.client.force_authenticate(user=self.admin)
+        self.url = reverse("admin-dashboard")
+
+    def test_une_requete_par_table_puis_cache(self):
+        with self.assertNumQueries(3):
+            resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["users"], {
+            "total": 2, "superadmins": 0, "admins": 1, "employes": 1, "verified": 1, "unverified": 1,
+        })
+        self.assertEqual(resp.data["employes"], {"total": 1, "actifs": 1, "inactifs": 0})
+        self.assertEqual(resp.data["postes"], 0)
+        self.assertEqual(resp.data["cache_age"], 0)
+
+        with self.assertNumQueries(0):
+            resp = self.client.get(self.url)
+        self.assertIn("cache_age", resp.data)
+
+    def test_invalidation_par_signaux(self):
+        self.client.get(self.url)
+
+        departement = Departement.objects.create(nom="Finance")
+        Poste.objects.create(titre="Comptable", salaire_de_base=100000, departement=departement)
+        self.assertEqual(self.client.get(self.url).data["postes"], 1)
+
+        self.employe.statut = 'inactif'
+        self.employe.save()
+        self.assertEqual(self.client.get(self.url).data["employes"]["inactifs"], 1)
+
+        # Une connexion ne met à jour que last_login : le cache est conservé
+        self.admin.save(update_fields=["last_login"])
+        self.assertIsNotNone(cache.get(CACHE_CLE))
+
+    def test_reserve_aux_admins(self):
+        self.client.force_authenticate(user=self.employe.user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
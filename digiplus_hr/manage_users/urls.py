@@ -10,11 +10,15 @@ router.register(r'admins', views.AdminViewSet, basename='admin')
 router.register(r'employes', views.EmployeViewSet, basename='employe')
 router.register(r'departements', views.DepartementViewSet, basename='departement')
 router.register(r'postes', views.PosteViewSet, basename='poste')
+router.register(r'horaires-travail', views.HoraireTravailViewSet, basename='horaire-travail')
+router.register(r'calendriers-travail', views.CalendrierTravailViewSet, basename='calendrier-travail')
+router.register(r'jours-feries', views.JourFerieViewSet, basename='jour-ferie')
 router.register(r'employe-profiles', views.EmployeProfileViewSet, basename='employe-profile')
 router.register(r'code-qr', views.CodeQRViewSet, basename='code-qr')
 router.register(r'badgeages', views.BadgeageViewSet, basename='badgeage')
 router.register(r'presences', views.PresenceViewSet, basename='presence')
 router.register(r'rapports-presence', views.RapportPresenceViewSet, basename='rapport-presence')
+router.register(r'resumes-presence-departement', views.ResumePresenceDepartementViewSet, basename='resume-presence-departement')
 
 urlpatterns = [
     # Authentification
@@ -38,10 +42,16 @@ urlpatterns = [
     path('leaves/<int:pk>/', views.DemandeCongeDetailView.as_view(), name='demande-conge-detail'),
     path('mes-demandes/', views.EmployeDemandesListView.as_view(), name='employe-demandes-list'),
     path('notifications/', views.NotificationListView.as_view(), name='notifications-list'),
+    path('notifications/non-lues/', views.notifications_non_lues, name='notifications-non-lues'),
+    path('notifications/mark-read/', views.NotificationMarquerLuesView.as_view(), name='notifications-mark-read'),
     path('notifications/<int:pk>/mark-read/', views.NotificationMarkAsReadView.as_view(), name='notification-mark-read'),
 
     # Routes de gestion (incluent les routers)
     path('', include(router.urls)),
     path('demandes/', views.AdminDemandesListView.as_view(), name='admin-demandes-list'),
+    path('demandes/decision-groupee/', views.AdminDecisionGroupeeView.as_view(), name='admin-demandes-decision-groupee'),
     path('audit/', views.AdminAuditListView.as_view(), name='admin-audit-list'),
+    path('dashboard/', views.admin_dashboard_data, name='admin-dashboard'),
+    path('dashboard/compteurs/', views.dashboard_compteurs, name='dashboard-compteurs'),
+    path('dashboard/file-notifications/', views.dashboard_file_notifications, name='dashboard-file-notifications'),
 ]
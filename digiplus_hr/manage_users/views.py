@@ -1,22 +1,19 @@
 from rest_framework import status, generics, viewsets
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model, authenticate
 from django.utils import timezone
-import datetime
+from django.db import transaction
+from django.conf import settings
 import uuid
-import io
-import qrcode
-import hashlib
-from django.core.files.base import ContentFile
-from django.http import FileResponse
-from .models import OTP, Departement, Poste, Employe, DemandeConge, Notification, DemandeCongeAudit, CodeQR, Badgeage, Presence, RapportPresence
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
+from .models import OTP, Departement, Poste, Employe, DemandeConge, Notification, DemandeCongeAudit, CodeQR, Badgeage, Presence, RapportPresence, ResumePresenceDepartement, HoraireTravail, CalendrierTravail, JourFerie
 from rest_framework import generics, permissions
 from .serializers import DemandeCongeSerializer, NotificationSerializer
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 from .serializers import (
     # Authentication
     LoginSerializer, VerifyOTPSerializer, ResendOTPSerializer, ChangePasswordSerializer,
@@ -27,10 +24,36 @@ from .serializers import (
     SuperAdminCreateSerializer, AdminCreateSerializer, EmployeCreateSerializer, UserListSerializer,
     # Postes and Employes
     DepartementSerializer, PosteSerializer, EmployeSerializer, DemandeCongeSerializer, NotificationSerializer,DemandeCongeAuditSerializer,
-    CodeQRSerializer, BadgeageSerializer, PresenceSerializer, RapportPresenceSerializer, BadgeageScannerSerializer
+    CodeQRSerializer, BadgeageSerializer, PresenceSerializer, RapportPresenceSerializer, BadgeageScannerSerializer,
+    BadgeageLotSerializer, BadgeageLotItemSerializer, CodeQRPregenerationSerializer, CodeQRExportSerializer,
+    RapportPresenceGenerationSerializer, ExportPointageSerializer,
+    ResumePresenceDepartementSerializer, PlageResumeSerializer, HoraireTravailSerializer,
+    CalendrierEquipeSerializer, CalendrierTravailSerializer, JourFerieSerializer, PlageJoursOuvresSerializer, TendancesPresenceSerializer,
+    DecisionGroupeeSerializer, MarquageLuSerializer,
 )
+from .pagination import PaginationCurseur
 from .permissions import IsSuperAdmin, IsAdmin, IsAdminOrSuperAdmin, IsVerified
 from .utils import send_otp_email, send_credentials_email
+from .badgeage import (
+    BadgeageRefuse, appliquer_badgeage, ingerer_lot,
+    IDEMPOTENCE_EN_COURS, empreinte_requete, reserver_idempotence, enregistrer_idempotence, liberer_idempotence,
+    reserver_antirebond, liberer_antirebond,
+)
+from .absences import STATUTS_ACTIFS, calendrier_equipe
+from .analytique import tendances_presence
+from .calendrier import jours_ouvres_entre
+from .compteurs import compteurs_instantanes, etat_live, signaler_presences
+from .conges import decider_demandes
+from .diffusion import etat_file, mettre_en_file
+from .non_lues import marquer_lues, non_lues
+from .horaires import horaire_de
+from .tableau_bord import statistiques_admin
+from .qr_utils import (
+    resoudre_code, emettre_code, desactiver_codes, statistiques_cache,
+    assurer_image, codes_pour, employes_cibles, pregenerer_images, lire_png, rendre_svg, svg_pour, etag_image, etag_donnees,
+)
+from .exports import flux_zip, flux_pdf_badges, flux_csv, flux_xlsx
+from .rapports import generer_rapports
 
 User = get_user_model()
 
@@ -40,6 +63,41 @@ def get_request_data(request):
         return request.query_params
     return request.data
 
+
+def export_tableau(request, qs, colonnes, champ_statut, nom_fichier):
+    """
+    Export CSV/XLSX en flux d'un queryset filtré par ?date_debut, ?date_fin, ?departement, ?statut.
+    `colonnes` associe chaque en-tête à un chemin values_list ; aucune instance n'est construite.
+    """
+    serializer = ExportPointageSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+
+    if data.get('date_debut'):
+        qs = qs.filter(date__gte=data['date_debut'])
+    if data.get('date_fin'):
+        qs = qs.filter(date__lte=data['date_fin'])
+    if data.get('departement'):
+        qs = qs.filter(employe__poste__departement_id=data['departement'])
+    if data.get('statut'):
+        qs = qs.filter(**{champ_statut: data['statut']})
+
+    lignes = (
+        qs.order_by('date', 'employe_id', 'id')
+        .values_list(*colonnes.values())
+        .iterator(chunk_size=getattr(settings, 'EXPORT_TAILLE_LOT', 2000))
+    )
+    entetes = list(colonnes)
+    if data['fichier'] == 'xlsx':
+        response = StreamingHttpResponse(
+            flux_xlsx(entetes, lignes, feuille=nom_fichier),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+    else:
+        response = StreamingHttpResponse(flux_csv(entetes, lignes), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nom_fichier}.{data["fichier"]}"'
+    return response
+
 # ==============================
 # AUTHENTICATION VIEWS
 # ==============================
@@ -361,45 +419,44 @@ def change_password_view(request):
 def admin_dashboard_data(request):
     """
     Données pour le dashboard admin
+    Statistiques servies depuis le cache (cache_age : âge en secondes)
     """
-    from django.db.models import Count, Q
-    
-    # Statistiques des utilisateurs
-    total_users = User.objects.count()
-    superadmins_count = User.objects.filter(is_superadmin=True).count()
-    admins_count = User.objects.filter(is_admin=True, is_superadmin=False).count()
-    employes_count = User.objects.filter(is_employe=True).count()
-    verified_users = User.objects.filter(is_verified=True).count()
-    
-    # Statistiques des employés
-    employes_stats = Employe.objects.aggregate(
-        total=Count('id'),
-        actifs=Count('id', filter=Q(statut='actif')),
-        inactifs=Count('id', filter=Q(statut='inactif'))
-    )
-    
-    # Statistiques des postes
-    postes_count = Poste.objects.count()
-    
+    stats, cache_age = statistiques_admin()
+
     data = {
-        'users': {
-            'total': total_users,
-            'superadmins': superadmins_count,
-            'admins': admins_count,
-            'employes': employes_count,
-            'verified': verified_users,
-            'unverified': total_users - verified_users,
-        },
-        'employes': employes_stats,
-        'postes': postes_count,
+        **stats,
         'recent_activity': {
             'last_login': request.user.last_login.strftime('%Y-%m-%d %H:%M:%S') if request.user.last_login else None,
             'current_time': timezone.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
+        },
+        'cache_age': cache_age,
     }
-    
+
     return Response(data)
 
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminOrSuperAdmin])
+def dashboard_compteurs(request):
+    """
+    Compteurs temps réel du jour (présents, en pause, partis, congés en attente)
+    État initial ; les deltas arrivent ensuite sur ws/notifications/ (type "compteurs")
+    """
+    return Response({
+        'date': timezone.localdate(),
+        'compteurs': compteurs_instantanes(),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminOrSuperAdmin])
+def dashboard_file_notifications(request):
+    """
+    Profondeur de la file des notifications temps réel (outbox)
+    Messages en attente, en échec et âge du plus ancien en secondes
+    """
+    return Response(etat_file())
+
 # ==============================
 # SUPER ADMIN MANAGEMENT VIEWS
 # ==============================
@@ -546,6 +603,23 @@ class DepartementViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, IsAdminOrSuperAdmin]
     serializer_class = DepartementSerializer
 
+    @action(detail=True, methods=['get'], url_path='absences')
+    def absences(self, request, pk=None):
+        """Calendrier d'équipe : employés en congé (approuvé ou en attente) jour par jour."""
+        departement = self.get_object()
+        serializer = CalendrierEquipeSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        return Response({
+            'departement': departement.id,
+            'date_debut': data['date_debut'],
+            'date_fin': data['date_fin'],
+            'jours': calendrier_equipe(
+                departement.id, data['date_debut'], data['date_fin'],
+                statuts=[statut for statut in STATUTS_ACTIFS if statut in data['statut']], calendrier_id=departement.calendrier_id,
+            ),
+        })
+
 
 class PosteViewSet(viewsets.ModelViewSet):
     """
@@ -555,6 +629,47 @@ class PosteViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, IsAdminOrSuperAdmin]
     serializer_class = PosteSerializer
 
+
+class HoraireTravailViewSet(viewsets.ModelViewSet):
+    """
+    Gestion des horaires de travail (détection des retards au badgeage)
+    """
+    queryset = HoraireTravail.objects.select_related('poste', 'contrat').all()
+    permission_classes = [IsAuthenticated, IsAdminOrSuperAdmin]
+    serializer_class = HoraireTravailSerializer
+
+
+class CalendrierTravailViewSet(viewsets.ModelViewSet):
+    """
+    Gestion des calendriers de travail (jours de repos par site)
+    """
+    queryset = CalendrierTravail.objects.all()
+    permission_classes = [IsAuthenticated, IsAdminOrSuperAdmin]
+    serializer_class = CalendrierTravailSerializer
+
+    @action(detail=True, methods=['get'], url_path='jours-ouvres')
+    def jours_ouvres(self, request, pk=None):
+        """Nombre de jours ouvrés d'une plage de dates pour ce calendrier."""
+        calendrier = self.get_object()
+        serializer = PlageJoursOuvresSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        debut, fin = serializer.validated_data['date_debut'], serializer.validated_data['date_fin']
+        return Response({
+            'calendrier': calendrier.id,
+            'date_debut': debut,
+            'date_fin': fin,
+            'jours_ouvres': jours_ouvres_entre(debut, fin, calendrier.id),
+        })
+
+
+class JourFerieViewSet(viewsets.ModelViewSet):
+    """
+    Gestion des jours fériés (sans calendrier : communs à tous les calendriers)
+    """
+    queryset = JourFerie.objects.select_related('calendrier').all()
+    permission_classes = [IsAuthenticated, IsAdminOrSuperAdmin]
+    serializer_class = JourFerieSerializer
+
 # ==============================
 # EMPLOYE PROFILES VIEWS
 # ==============================
@@ -609,33 +724,23 @@ class CodeQRViewSet(viewsets.ModelViewSet):
             return employe, True
 
     def _ensure_qr_image(self, code_qr):
-        if code_qr.qr_code_image:
-            return
+        assurer_image(code_qr)
 
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_M,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(code_qr.code_unique)
-        qr.make(fit=True)
+    def _format_image(self, request):
+        return 'svg' if request.query_params.get('image') == 'svg' else 'png'
 
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-
-        code_hash = hashlib.sha256(code_qr.code_unique.encode('utf-8')).hexdigest()[:16]
-        filename = f"qr_{code_qr.employe_id}_{code_hash}.png"
-        code_qr.qr_code_image.save(filename, ContentFile(buffer.read()), save=True)
+    def _non_modifie(self, request, etag):
+        etags = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in etags or '*' in etags:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+        return None
 
     def perform_create(self, serializer):
         code_unique = serializer.validated_data.get('code_unique')
         if not code_unique:
-            code_unique = CodeQR.generate_unique_code()
-            while CodeQR.objects.filter(code_unique=code_unique).exists():
-                code_unique = CodeQR.generate_unique_code()
+            code_unique = CodeQR.generate_unique_code(serializer.validated_data['employe'].id)
         serializer.save(code_unique=code_unique)
 
     @action(detail=False, methods=['get'], url_path='me', permission_classes=[IsAuthenticated])
@@ -659,14 +764,24 @@ class CodeQRViewSet(viewsets.ModelViewSet):
 
         code_qr = CodeQR.objects.filter(employe=employe, actif=True).order_by('-date_generation').first()
         if not code_qr:
-            code_unique = CodeQR.generate_unique_code()
-            while CodeQR.objects.filter(code_unique=code_unique).exists():
-                code_unique = CodeQR.generate_unique_code()
-            code_qr = CodeQR.objects.create(employe=employe, code_unique=code_unique, actif=True)
+            code_qr = emettre_code(employe)
 
-        self._ensure_qr_image(code_qr)
+        # ?image=svg : SVG inline servi depuis le LRU, sans rendu ni fichier PNG
+        format_image = self._format_image(request)
+        if format_image != 'svg':
+            self._ensure_qr_image(code_qr)
 
         data = CodeQRSerializer(code_qr).data
+        etag = None
+        if format_image == 'svg':
+            if not created_profile:
+                # Le SVG dérive du code, déjà présent dans data : l'empreinte de data
+                # couvre aussi actif, les dates et l'image
+                etag = etag_donnees(data, 'svg-json')
+                non_modifie = self._non_modifie(request, etag)
+                if non_modifie:
+                    return non_modifie
+            data['qr_code_svg'] = svg_pour(code_qr.code_unique).decode('utf-8')
         if created_profile and int(target_user.id) == int(request.user.id):
             refresh = RefreshToken.for_user(target_user)
             data = {
@@ -676,7 +791,10 @@ class CodeQRViewSet(viewsets.ModelViewSet):
                     'access': str(refresh.access_token),
                 }
             }
-        return Response(data, status=status.HTTP_200_OK)
+        response = Response(data, status=status.HTTP_200_OK)
+        if etag:
+            response['ETag'] = etag
+        return response
 
     @action(detail=False, methods=['post'], url_path='me/regenerate', permission_classes=[IsAuthenticated])
     def regenerate(self, request):
@@ -697,11 +815,7 @@ class CodeQRViewSet(viewsets.ModelViewSet):
 
         employe, created_profile = self._get_or_create_employe(target_user)
 
-        CodeQR.objects.filter(employe=employe, actif=True).update(actif=False)
-        code_unique = CodeQR.generate_unique_code()
-        while CodeQR.objects.filter(code_unique=code_unique).exists():
-            code_unique = CodeQR.generate_unique_code()
-        code_qr = CodeQR.objects.create(employe=employe, code_unique=code_unique, actif=True)
+        code_qr = emettre_code(employe)
 
         self._ensure_qr_image(code_qr)
 
@@ -732,19 +846,101 @@ class CodeQRViewSet(viewsets.ModelViewSet):
 
         regenerate = bool(request.data.get('regenerate', True))
         if regenerate:
-            CodeQR.objects.filter(employe=employe, actif=True).update(actif=False)
+            desactiver_codes(employe)
 
         code_qr = CodeQR.objects.filter(employe=employe, actif=True).order_by('-date_generation').first()
         if not code_qr:
-            code_unique = CodeQR.generate_unique_code()
-            while CodeQR.objects.filter(code_unique=code_unique).exists():
-                code_unique = CodeQR.generate_unique_code()
-            code_qr = CodeQR.objects.create(employe=employe, code_unique=code_unique, actif=True)
+            code_qr = emettre_code(employe)
 
         self._ensure_qr_image(code_qr)
 
         return Response(CodeQRSerializer(code_qr).data, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=['post'], url_path='pregenerer')
+    def pregenerer(self, request):
+        """
+        Pré-générer les images QR manquantes ou périmées pour des employés ou départements
+        """
+        serializer = CodeQRPregenerationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        codes = codes_pour(
+            employe_ids=data.get('employe_ids'),
+            departement_ids=data.get('departement_ids'),
+            creer_manquants=data.get('creer_manquants', False),
+        )
+        resultat = pregenerer_images(codes, workers=data.get('workers'), force=data.get('force', False))
+        return Response(resultat, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        """
+        Export des badges d'un département ou d'une liste d'employés
+        (?departement=<id> | ?employes=1,2 ; ?sortie=zip|pdf ; ?image=png|svg), émis en flux
+        Lecture seule : les employés sans code actif sont omis (en-tête X-Employes-Sans-Code),
+        les codes manquants se créent par POST pregenerer avec creer_manquants
+        """
+        serializer = CodeQRExportSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        departement = data.get('departement')
+        cibles = {
+            'employe_ids': data.get('employes'),
+            'departement_ids': [departement] if departement else None,
+        }
+        code_ids = list(codes_pour(**cibles).values_list('id', flat=True))
+        sans_code = employes_cibles(**cibles).count() - len(code_ids)
+        if not code_ids:
+            return Response({
+                'error': 'Aucun badge actif pour cet export.',
+                'employes_sans_code': sans_code,
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        taille_lot = getattr(settings, 'CODEQR_EXPORT_TAILLE_LOT', 100)
+
+        def parcourir():
+            # Lots d'identifiants : la mémoire reste bornée par un lot, quel que soit l'effectif
+            for debut in range(0, len(code_ids), taille_lot):
+                lot = (
+                    CodeQR.objects.filter(id__in=code_ids[debut:debut + taille_lot])
+                    .select_related('employe__user')
+                    .order_by('employe_id')
+                )
+                for code_qr in lot:
+                    yield code_qr
+
+        def libelle(code_qr):
+            user = code_qr.employe.user
+            return f"{user.first_name} {user.last_name}".strip() or user.email
+
+        if data['sortie'] == 'pdf':
+            flux = flux_pdf_badges(
+                ((libelle(c), c.employe.matricule, lire_png(c)) for c in parcourir()),
+                titre='Badges DigiPlus HR',
+            )
+            response = StreamingHttpResponse(flux, content_type='application/pdf')
+            response['Content-Disposition'] = 'attachment; filename="badges.pdf"'
+            response['X-Employes-Sans-Code'] = str(sans_code)
+            return response
+
+        if data['image'] == 'svg':
+            fichiers = ((f"badges/{c.employe.matricule}.svg", rendre_svg(c.code_unique)) for c in parcourir())
+        else:
+            fichiers = ((f"badges/{c.employe.matricule}.png", lire_png(c)) for c in parcourir())
+        response = StreamingHttpResponse(flux_zip(fichiers), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="badges.zip"'
+        response['X-Employes-Sans-Code'] = str(sans_code)
+        return response
+
+    @action(detail=False, methods=['get'], url_path='cache-stats')
+    def cache_stats(self, request):
+        """
+        Compteurs hits/misses du cache de résolution des codes QR (processus courant)
+        """
+        return Response(statistiques_cache())
+
     @action(detail=False, methods=['get'], url_path='me/download', permission_classes=[IsAuthenticated])
     def download(self, request):
         user_id = request.query_params.get('user_id')
@@ -765,18 +961,26 @@ class CodeQRViewSet(viewsets.ModelViewSet):
         employe, _created_profile = self._get_or_create_employe(target_user)
         code_qr = CodeQR.objects.filter(employe=employe, actif=True).order_by('-date_generation').first()
         if not code_qr:
-            code_unique = CodeQR.generate_unique_code()
-            while CodeQR.objects.filter(code_unique=code_unique).exists():
-                code_unique = CodeQR.generate_unique_code()
-            code_qr = CodeQR.objects.create(employe=employe, code_unique=code_unique, actif=True)
+            code_qr = emettre_code(employe)
 
-        self._ensure_qr_image(code_qr)
+        format_image = self._format_image(request)
+        etag = etag_image(code_qr.code_unique, format_image)
+        non_modifie = self._non_modifie(request, etag)
+        if non_modifie:
+            return non_modifie
+
+        if format_image == 'svg':
+            response = HttpResponse(svg_pour(code_qr.code_unique), content_type='image/svg+xml')
+        else:
+            self._ensure_qr_image(code_qr)
 
-        if not code_qr.qr_code_image:
-            return Response({'error': "Impossible de générer l'image du QR code."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            if not code_qr.qr_code_image:
+                return Response({'error': "Impossible de générer l'image du QR code."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        response = FileResponse(code_qr.qr_code_image.open('rb'), content_type='image/png')
-        response['Content-Disposition'] = f'attachment; filename="qr_{user_id}.png"'
+            response = FileResponse(code_qr.qr_code_image.open('rb'), content_type='image/png')
+        response['Content-Disposition'] = f'attachment; filename="qr_{user_id}.{format_image}"'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
         return response
 
 
@@ -784,6 +988,8 @@ class BadgeageViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Badgeage.objects.select_related('employe', 'employe__user').all()
     permission_classes = [IsAuthenticated]
     serializer_class = BadgeageSerializer
+    pagination_class = PaginationCurseur
+    ordre_curseur = 'datetime'
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -798,27 +1004,60 @@ class BadgeageViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=False, methods=['post'], url_path='scanner', url_name='scanner')
     def scanner(self, request):
+        return self._avec_idempotence(request, self._scanner)
+
+    def _avec_idempotence(self, request, traitement):
+        """
+        Rejouer la réponse mémorisée si l'en-tête Idempotency-Key a déjà été vu
+        pour cet utilisateur, sans réexécuter le traitement
+        (422 si la clé a servi pour un autre corps de requête)
+        """
+        cle = request.headers.get('Idempotency-Key')
+        if not cle:
+            return traitement(request)
+
+        empreinte = empreinte_requete(request.data)
+        memorise = reserver_idempotence(request.user.id, cle, empreinte)
+        if memorise is not None:
+            empreinte_memorisee, valeur = memorise
+            if empreinte_memorisee != empreinte:
+                return Response({'error': 'Cette clé a déjà servi pour une requête différente.'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if valeur == IDEMPOTENCE_EN_COURS:
+                return Response({'error': 'Une requête avec cette clé est déjà en cours de traitement.'}, status=status.HTTP_409_CONFLICT)
+            status_code, data = valeur
+            response = Response(data, status=status_code)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = traitement(request)
+        except Exception:
+            liberer_idempotence(request.user.id, cle)
+            raise
+        if response.status_code >= 500:
+            liberer_idempotence(request.user.id, cle)
+        else:
+            enregistrer_idempotence(request.user.id, cle, empreinte, response.status_code, response.data)
+        return response
+
+    def _scanner(self, request):
         serializer = BadgeageScannerSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
         badge_type = serializer.validated_data['type']
         user_id = serializer.validated_data.get('user_id')
         code_unique = serializer.validated_data.get('code_unique')
+        return self._enregistrer_scan(request, serializer, badge_type, user_id, code_unique)
 
+    def _enregistrer_scan(self, request, serializer, badge_type, user_id, code_unique):
         if not (getattr(request.user, 'is_employe', False) or getattr(request.user, 'is_admin', False) or getattr(request.user, 'is_superadmin', False)):
             return Response({'error': "Vous n'êtes pas autorisé à pointer."}, status=status.HTTP_403_FORBIDDEN)
 
-        employe = None
-        target_user = None
-
         if code_unique:
-            code_qr = CodeQR.objects.filter(code_unique=code_unique, actif=True).select_related('employe', 'employe__user').first()
-            if not code_qr:
+            cible = resoudre_code(code_unique)
+            if not cible:
                 return Response({'error': 'QR code invalide ou inactif.'}, status=status.HTTP_400_BAD_REQUEST)
-            employe = code_qr.employe
-            target_user = getattr(employe, 'user', None)
-            if not target_user:
-                return Response({'error': 'Utilisateur introuvable pour ce QR.'}, status=status.HTTP_404_NOT_FOUND)
+            employe_id, target_user_id = cible
         else:
             if not user_id:
                 return Response({'error': "Fournir 'code_unique' ou 'user_id'."}, status=status.HTTP_400_BAD_REQUEST)
@@ -827,102 +1066,115 @@ class BadgeageViewSet(viewsets.ReadOnlyModelViewSet):
             except User.DoesNotExist:
                 return Response({'error': 'Utilisateur introuvable.'}, status=status.HTTP_404_NOT_FOUND)
             try:
-                employe = target_user.employe
+                employe_id = target_user.employe.id
             except Employe.DoesNotExist:
                 return Response({'error': 'Profil employé non trouvé.'}, status=status.HTTP_404_NOT_FOUND)
+            target_user_id = target_user.id
 
-        if getattr(request.user, 'is_employe', False) and int(target_user.id) != int(request.user.id):
+        if getattr(request.user, 'is_employe', False) and int(target_user_id) != int(request.user.id):
             return Response({'error': "Vous ne pouvez pointer que pour votre propre compte."}, status=status.HTTP_403_FORBIDDEN)
-        if not ((getattr(request.user, 'is_admin', False) or getattr(request.user, 'is_superadmin', False)) or int(target_user.id) == int(request.user.id)):
+        if not ((getattr(request.user, 'is_admin', False) or getattr(request.user, 'is_superadmin', False)) or int(target_user_id) == int(request.user.id)):
             return Response({'error': "Vous n'êtes pas autorisé à pointer pour cet utilisateur."}, status=status.HTTP_403_FORBIDDEN)
 
-        now = timezone.now()
+        # Double appui / relance de borne : court-circuit avant toute écriture. La
+        # fenêtre n'est posée qu'une fois le scan autorisé et le code résolu.
+        if not reserver_antirebond(badge_type, target_user_id):
+            return Response({'error': 'Scan identique déjà reçu, veuillez patienter quelques secondes.'}, status=status.HTTP_409_CONFLICT)
 
-        todays_badges = Badgeage.objects.filter(employe=employe, date=now.date()).order_by('datetime')
-        has_arrivee = todays_badges.filter(type='arrivee').exists()
-        has_depart = todays_badges.filter(type='depart').exists()
-        pause_debut_count = todays_badges.filter(type='pause_debut').count()
-        pause_fin_count = todays_badges.filter(type='pause_fin').count()
-        pause_in_progress = pause_debut_count > pause_fin_count
-
-        if badge_type == 'arrivee':
-            if has_depart:
-                return Response({'error': "Déjà pointé 'depart' aujourd'hui."}, status=status.HTTP_400_BAD_REQUEST)
-            if has_arrivee:
-                return Response({'error': "Déjà pointé 'arrivee' aujourd'hui."}, status=status.HTTP_400_BAD_REQUEST)
-
-        if badge_type == 'pause_debut':
-            if not has_arrivee:
-                return Response({'error': "Impossible de commencer une pause avant l'arrivée."}, status=status.HTTP_400_BAD_REQUEST)
-            if has_depart:
-                return Response({'error': "Impossible de commencer une pause après le départ."}, status=status.HTTP_400_BAD_REQUEST)
-            if pause_in_progress:
-                return Response({'error': "Une pause est déjà en cours."}, status=status.HTTP_400_BAD_REQUEST)
-
-        if badge_type == 'pause_fin':
-            if not has_arrivee:
-                return Response({'error': "Impossible de terminer une pause avant l'arrivée."}, status=status.HTTP_400_BAD_REQUEST)
-            if has_depart:
-                return Response({'error': "Impossible de terminer une pause après le départ."}, status=status.HTTP_400_BAD_REQUEST)
-            if not pause_in_progress:
-                return Response({'error': "Aucune pause en cours à terminer."}, status=status.HTTP_400_BAD_REQUEST)
-
-        if badge_type == 'depart':
-            if not has_arrivee:
-                return Response({'error': "Impossible de pointer le départ avant l'arrivée."}, status=status.HTTP_400_BAD_REQUEST)
-            if has_depart:
-                return Response({'error': "Déjà pointé 'depart' aujourd'hui."}, status=status.HTTP_400_BAD_REQUEST)
-            if pause_in_progress:
-                return Response({'error': "Impossible de pointer le départ pendant une pause (terminez la pause)."}, status=status.HTTP_400_BAD_REQUEST)
-
-        badgeage = Badgeage.objects.create(
-            employe=employe,
-            type=badge_type,
-            localisation_latitude=serializer.validated_data.get('latitude'),
-            localisation_longitude=serializer.validated_data.get('longitude'),
-            device_info=serializer.validated_data.get('device_info'),
-        )
+        try:
+            response = self._ecrire_scan(serializer, badge_type, employe_id)
+        except Exception:
+            liberer_antirebond(badge_type, target_user_id)
+            raise
+        if response.status_code != status.HTTP_201_CREATED:
+            liberer_antirebond(badge_type, target_user_id)
+        return response
 
-        presence, _ = Presence.objects.get_or_create(
-            employe=employe,
-            date=now.date(),
-            defaults={'statut': 'absent'},
-        )
+    def _ecrire_scan(self, serializer, badge_type, employe_id):
+        now = timezone.now()
+        jour = timezone.localdate(now)
 
-        if badge_type == 'arrivee':
-            if presence.heure_arrivee is None:
-                presence.heure_arrivee = now.time()
-            presence.statut = 'present'
-
-        if badge_type == 'pause_debut':
-            presence.nb_pauses = (presence.nb_pauses or 0) + 1
-
-        if badge_type == 'pause_fin':
-            last_pause_start = Badgeage.objects.filter(
-                employe=employe,
-                date=now.date(),
-                type='pause_debut',
-                datetime__lte=badgeage.datetime,
-            ).order_by('-datetime').first()
-            if last_pause_start:
-                delta = badgeage.datetime - last_pause_start.datetime
-                added_minutes = max(0, int(delta.total_seconds() // 60))
-                presence.duree_pauses_minutes = (presence.duree_pauses_minutes or 0) + added_minutes
-
-        if badge_type == 'depart':
-            presence.heure_depart = now.time()
-            if presence.heure_arrivee is not None:
-                arrivee_dt = timezone.make_aware(datetime.datetime.combine(now.date(), presence.heure_arrivee))
-                depart_dt = timezone.make_aware(datetime.datetime.combine(now.date(), presence.heure_depart))
-                total_minutes = max(0, int((depart_dt - arrivee_dt).total_seconds() // 60))
-                pauses_minutes = int(presence.duree_pauses_minutes or 0)
-                presence.duree_travail_minutes = max(0, total_minutes - pauses_minutes)
-            presence.statut = 'present'
-
-        presence.save()
+        # L'état du jour est porté par Presence : une lecture verrouillée, une écriture.
+        try:
+            with transaction.atomic():
+                presence, _ = Presence.objects.select_for_update().get_or_create(
+                    employe_id=employe_id,
+                    date=jour,
+                    defaults={'statut': 'absent'},
+                )
+                etat_avant = etat_live(presence)
+                appliquer_badgeage(presence, badge_type, now, horaire_de(employe_id, jour))
+
+                badgeage = Badgeage.objects.create(
+                    employe_id=employe_id,
+                    type=badge_type,
+                    datetime=now,
+                    date=jour,
+                    localisation_latitude=serializer.validated_data.get('latitude'),
+                    localisation_longitude=serializer.validated_data.get('longitude'),
+                    device_info=serializer.validated_data.get('device_info'),
+                )
+                presence.save()
+                if presence.date == jour:
+                    signaler_presences([(etat_avant, etat_live(presence))])
+        except BadgeageRefuse as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response(BadgeageSerializer(badgeage).data, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=['post'], url_path='scanner/lot', url_name='scanner-lot')
+    def scanner_lot(self, request):
+        """
+        Rejouer en une requête les scans mis en file par une borne hors ligne
+        """
+        return self._avec_idempotence(request, self._scanner_lot)
+
+    def _scanner_lot(self, request):
+        if not (getattr(request.user, 'is_employe', False) or getattr(request.user, 'is_admin', False) or getattr(request.user, 'is_superadmin', False)):
+            return Response({'error': "Vous n'êtes pas autorisé à pointer."}, status=status.HTTP_403_FORBIDDEN)
+
+        serializer = BadgeageLotSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        resultats = []
+        valides = []
+        for index, item in enumerate(serializer.validated_data['scans']):
+            item_serializer = BadgeageLotItemSerializer(data=item)
+            if item_serializer.is_valid():
+                valides.append((index, item_serializer.validated_data))
+            else:
+                resultats.append({'index': index, 'statut': 'rejete', 'error': item_serializer.errors})
+
+        resultats.extend(ingerer_lot(valides, request.user))
+        resultats.sort(key=lambda resultat: resultat['index'])
+
+        acceptes = sum(1 for resultat in resultats if resultat['statut'] == 'accepte')
+        return Response({
+            'acceptes': acceptes,
+            'rejetes': len(resultats) - acceptes,
+            'resultats': resultats,
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='export', url_name='export')
+    def export(self, request):
+        """
+        Export CSV/XLSX en flux des badgeages (?date_debut, ?date_fin, ?departement, ?statut=<type>, ?fichier)
+        """
+        colonnes = {
+            'id': 'id',
+            'matricule': 'employe__matricule',
+            'nom': 'employe__user__last_name',
+            'prenom': 'employe__user__first_name',
+            'departement': 'employe__poste__departement__nom',
+            'type': 'type',
+            'horodatage': 'datetime',
+            'date': 'date',
+            'latitude': 'localisation_latitude',
+            'longitude': 'localisation_longitude',
+            'appareil': 'device_info',
+        }
+        return export_tableau(request, self.get_queryset(), colonnes, 'type', 'badgeages')
+
     @action(detail=False, methods=['get'], url_path='jour-actuel', url_name='jour-actuel')
     def jour_actuel(self, request):
         today = timezone.now().date()
@@ -937,6 +1189,8 @@ class PresenceViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Presence.objects.select_related('employe', 'employe__user').all()
     permission_classes = [IsAuthenticated]
     serializer_class = PresenceSerializer
+    pagination_class = PaginationCurseur
+    ordre_curseur = 'date'
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -949,6 +1203,46 @@ class PresenceViewSet(viewsets.ReadOnlyModelViewSet):
             return qs
         return qs.none()
 
+    @action(detail=False, methods=['get'], url_path='export', url_name='export')
+    def export(self, request):
+        """
+        Export CSV/XLSX en flux des présences (?date_debut, ?date_fin, ?departement, ?statut, ?fichier)
+        """
+        colonnes = {
+            'matricule': 'employe__matricule',
+            'nom': 'employe__user__last_name',
+            'prenom': 'employe__user__first_name',
+            'departement': 'employe__poste__departement__nom',
+            'date': 'date',
+            'statut': 'statut',
+            'heure_arrivee': 'heure_arrivee',
+            'heure_depart': 'heure_depart',
+            'duree_travail_minutes': 'duree_travail_minutes',
+            'nb_pauses': 'nb_pauses',
+            'duree_pauses_minutes': 'duree_pauses_minutes',
+        }
+        return export_tableau(request, self.get_queryset(), colonnes, 'statut', 'presences')
+
+    @action(detail=False, methods=['get'], url_path='tendances', url_name='tendances',
+            permission_classes=[IsAuthenticated, IsAdminOrSuperAdmin])
+    def tendances(self, request):
+        """
+        Absentéisme, retards et minutes moyennes par période
+        GET ?date_debut&date_fin[&pas=jour|semaine|mois][&groupe=departement|poste][&departement=<id>]
+        """
+        serializer = TendancesPresenceSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        return Response({
+            'date_debut': data['date_debut'],
+            'date_fin': data['date_fin'],
+            'pas': data['pas'],
+            'groupe': data.get('groupe'),
+            'resultats': tendances_presence(
+                data['date_debut'], data['date_fin'], data['pas'], data.get('groupe'), data.get('departement'),
+            ),
+        })
+
 class RapportPresenceViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = RapportPresence.objects.select_related('employe', 'employe__user').all()
     permission_classes = [IsAuthenticated]
@@ -995,8 +1289,45 @@ class RapportPresenceViewSet(viewsets.ReadOnlyModelViewSet):
             return self.get_paginated_response(self.get_serializer(page, many=True).data)
         return Response(self.get_serializer(qs, many=True).data)
 
+    @action(detail=False, methods=['post'], url_path='generer', url_name='generer',
+            permission_classes=[IsAuthenticated, IsAdminOrSuperAdmin])
+    def generer(self, request):
+        """
+        Calculer (ou recalculer) les rapports d'un mois pour tous les employés ou une sélection
+        """
+        serializer = RapportPresenceGenerationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        resultat = generer_rapports(data['annee'], data['mois'], employe_ids=data.get('employe_ids'))
+        return Response(resultat, status=status.HTTP_200_OK)
+
+
+class ResumePresenceDepartementViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Présences par département et par jour, lues depuis le résumé matérialisé
+    GET ?date_debut=AAAA-MM-JJ&date_fin=AAAA-MM-JJ[&departement=<id>][&statut=...]
+    """
+    queryset = ResumePresenceDepartement.objects.select_related('departement').all()
+    permission_classes = [IsAuthenticated, IsAdminOrSuperAdmin]
+    serializer_class = ResumePresenceDepartementSerializer
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action != 'list':
+            return qs
+
+        serializer = PlageResumeSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        qs = qs.filter(date__range=(data['date_debut'], data['date_fin']))
+        if data.get('departement'):
+            qs = qs.filter(departement_id=data['departement'])
+        if data.get('statut'):
+            qs = qs.filter(statut=data['statut'])
+        return qs.order_by('date', 'departement__nom', 'statut')
 
-channel_layer = get_channel_layer()
 
 # ----------------------
 # Vues Demande de congé
@@ -1010,72 +1341,67 @@ class DemandeCongeListCreateView(generics.ListCreateAPIView):
         return DemandeConge.objects.filter(employe__user=self.request.user)
 
     def perform_create(self, serializer):
-        conge = serializer.save(employe=self.request.user.employe)
-        # Envoi notification instantanée à l'admin ou superadmin
-        async_to_sync(channel_layer.group_send)(
-            "admins",  # Groupe admin (on créera le groupe dans le front/consumer)
-            {
-                "type": "send_notification",
-                "content": {
-                    "titre": "Nouvelle demande de congé",
-                    "message": f"{conge.employe.user.get_full_name()} a demandé un {conge.type_conge} du {conge.date_debut} au {conge.date_fin}.",
-                    "demande_id": conge.id,
-                    "statut": conge.statut
-                }
-            }
-        )
+        with transaction.atomic():
+            conge = serializer.save(employe=self.request.user.employe)
+            # Notification instantanée à l'admin ou superadmin, envoyée après validation
+            mettre_en_file("admins", {
+                "titre": "Nouvelle demande de congé",
+                "message": f"{conge.employe.user.get_full_name()} a demandé un {conge.type_conge} du {conge.date_debut} au {conge.date_fin}.",
+                "demande_id": conge.id,
+                "statut": conge.statut
+            })
 
 class DemandeCongeDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = DemandeConge.objects.all()
     serializer_class = DemandeCongeSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-def perform_update(self, serializer):
-        old_instance = self.get_object()
-        new_statut = serializer.validated_data.get('statut', old_instance.statut)
-        
-        # Extraire les champs additionnels modifiés (tous les champs du serializer sauf statut)
-        extra_fields = {k: v for k, v in serializer.validated_data.items() if k != 'statut'}
-        
-        # Si le statut change vers 'approuve' ou 'rejete', utiliser les méthodes du modèle
-        # pour garantir persistance de la Notification et envoi WebSocket cohérents.
-        if old_instance.statut != new_statut:
-            if new_statut == 'approuve':
-                old_instance.approuver(admin=self.request.user, **extra_fields)
-                conge = old_instance
-            elif new_statut == 'rejete':
-                old_instance.rejeter(admin=self.request.user, **extra_fields)
-                conge = old_instance
-            else:
-                # Pour d'autres statuts, sauvegarder normalement et envoyer une notification générique
-                conge = serializer.save()
-                try:
-                    channel_layer = get_channel_layer()
-                    async_to_sync(channel_layer.group_send)(
-                        f"user_{conge.employe.user.id}",
-                        {
-                            "type": "send_notification",
-                            "content": {
-                                "titre": f"Demande {conge.statut}",
-                                "message": f"Votre demande du {conge.date_debut} au {conge.date_fin} a été {conge.statut}.",
-                                "demande_id": conge.id,
-                                "statut": conge.statut,
-                            }
-                        }
-                    )
-                except Exception:
-                    pass
-        else:
-            # Si statut ne change pas, sauvegarder les autres champs normalement
-            conge = serializer.save()
+    def get_queryset(self):
+        # Un employé ne voit et ne modifie que ses propres demandes
+        if self.request.user.is_admin or self.request.user.is_superadmin:
+            return DemandeConge.objects.all()
+        return DemandeConge.objects.filter(employe__user=self.request.user)
+
+    def perform_update(self, serializer):
+        demande = serializer.instance
+        new_statut = serializer.validated_data.pop('statut', demande.statut)
+
+        if demande.statut == new_statut:
+            serializer.save()
+            return
+
+        # Seul un administrateur décide du statut d'une demande
+        if not IsAdminOrSuperAdmin().has_permission(self.request, self):
+            raise PermissionDenied("Seul un administrateur peut changer le statut d'une demande.")
+
+        if new_statut in ('approuve', 'rejete'):
+            # Même chemin que la décision groupée : demande verrouillée, encore en attente
+            with transaction.atomic():
+                serializer.save()
+                traitees, _ = decider_demandes([demande.pk], new_statut, admin=self.request.user)
+                if not traitees:
+                    raise ValidationError({'statut': ["Seule une demande en attente peut être approuvée ou rejetée."]})
+            demande.refresh_from_db()
+            return
+
+        # Pour d'autres statuts, sauvegarder normalement et envoyer une notification générique
+        with transaction.atomic():
+            conge = serializer.save(statut=new_statut)
+            mettre_en_file(f"user_{conge.employe.user_id}", {
+                "titre": f"Demande {conge.statut}",
+                "message": f"Votre demande du {conge.date_debut} au {conge.date_fin} a été {conge.statut}.",
+                "demande_id": conge.id,
+                "statut": conge.statut,
+            })
 
 
 class NotificationListView(generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PaginationCurseur
+    ordre_curseur = 'date_envoi'
 
     def get_queryset(self):
-        return Notification.objects.filter(demande_conge__employe__user=self.request.user).order_by('-date_envoi')
+        return Notification.objects.filter(destinataire=self.request.user).order_by('-date_envoi')
 
 
 class AdminDemandesListView(generics.ListAPIView):
@@ -1099,6 +1425,28 @@ class AdminDemandesListView(generics.ListAPIView):
         return DemandeConge.objects.none()
 
 
+class AdminDecisionGroupeeView(generics.GenericAPIView):
+    """
+    Endpoint pour les admins: approuver ou rejeter plusieurs demandes en une fois
+    POST /api/management/demandes/decision-groupee/
+    {"demande_ids": [...], "decision": "approuve"|"rejete", "raison": "..."}
+    Les demandes qui ne sont plus en attente sont ignorées.
+    """
+    serializer_class = DecisionGroupeeSerializer
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrSuperAdmin]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        traitees, ignorees = decider_demandes(data['demande_ids'], data['decision'], admin=request.user, raison=data['raison'])
+        return Response({
+            'decision': data['decision'],
+            'traitees': traitees,
+            'ignorees': ignorees,
+        })
+
+
 class EmployeDemandesListView(generics.ListAPIView):
     """
     Endpoint pour les employés: voir ses propres demandes de congé
@@ -1125,7 +1473,7 @@ class NotificationMarkAsReadView(generics.UpdateAPIView):
     
     def get_queryset(self):
         # L'utilisateur peut marquer comme lue seulement ses propres notifications
-        return Notification.objects.filter(demande_conge__employe__user=self.request.user)
+        return Notification.objects.filter(destinataire=self.request.user)
     
     def partial_update(self, request, *args, **kwargs):
         notification = self.get_object()
@@ -1136,10 +1484,43 @@ class NotificationMarkAsReadView(generics.UpdateAPIView):
         return Response({
             'status': 'success',
             'message': 'Notification marquée comme lue',
-            'notification': serializer.data
+            'notification': serializer.data,
+            'non_lues': non_lues(request.user.id),
         })
 
 
+class NotificationMarquerLuesView(generics.GenericAPIView):
+    """
+    Endpoint pour marquer plusieurs notifications comme lues en une requête
+    POST /api/notifications/mark-read/
+    {"ids": [...]} ou {"avant": "2025-03-01T00:00:00Z"} (toutes celles envoyées jusqu'à cette date)
+    """
+    serializer_class = MarquageLuSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        marquees = marquer_lues(request.user.id, ids=data.get('ids'), avant=data.get('avant'))
+        return Response({
+            'status': 'success',
+            'message': f'{marquees} notification(s) marquée(s) comme lue(s)',
+            'marquees': marquees,
+            'non_lues': non_lues(request.user.id),
+        })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def notifications_non_lues(request):
+    """
+    Nombre de notifications non lues de l'utilisateur (servi depuis le cache)
+    Les mises à jour arrivent ensuite sur ws/notifications/ (type "non_lues")
+    """
+    return Response({'non_lues': non_lues(request.user.id)})
+
+
 class AdminAuditListView(generics.ListAPIView):
     """
     Endpoint pour voir l'historique des approbations/rejets
@@ -1148,6 +1529,8 @@ class AdminAuditListView(generics.ListAPIView):
    
     serializer_class = DemandeCongeAuditSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PaginationCurseur
+    ordre_curseur = 'date_action'
     
     def get_queryset(self):
         # Seulement les admins peuvent voir l'audit